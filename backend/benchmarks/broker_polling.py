@@ -0,0 +1,166 @@
+"""Benchmark: broker API calls made by polling dashboards, with and without the gateway.
+
+Runs the local broker stub and has many dashboards poll `/api/trade/account`,
+`/positions` and `/orders` (in-process) once per interval:
+
+  * direct: every request makes its own broker round trip, as the routes
+    used to;
+  * gateway: requests are served from `BrokerGateway` snapshots.
+
+Then checks that an order submitted through `/api/trade/trade` shows up in
+the very next `/positions` read, and that a burst of orders against a
+stub with a tight rate limit is absorbed by backoff instead of failing.
+
+    python benchmarks/broker_polling.py --dashboards 50 --duration 10
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import subprocess
+
+import httpx
+import numpy as np
+from fastapi import FastAPI
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+os.environ.setdefault('ALPACA_KEY', 'stub-key')
+os.environ.setdefault('ALPACA_SECRET', 'stub-secret')
+
+from utils.broker import BrokerGateway
+
+PATHS = ('/api/trade/account', '/api/trade/positions', '/api/trade/orders')
+
+
+class Direct:
+    """The previous behaviour: one upstream round trip per request."""
+
+    def __init__(self, base_url):
+        self.client = BrokerGateway(base_url=base_url).client
+
+    def account(self, max_age=None):
+        return self.client.get_account()
+
+    def positions(self, max_age=None):
+        return self.client.list_positions()
+
+    def orders(self, status='all', limit=50, max_age=None):
+        return self.client.list_orders(status=status, limit=limit)
+
+
+def start_stub(port, latency, rate_limit=0, rate_window=60):
+    stub = subprocess.Popen([
+        sys.executable, os.path.join(BACKEND_DIR, 'stubs', 'broker.py'), '--port', str(port),
+        '--latency', str(latency), '--rate-limit', str(rate_limit), '--rate-window', str(rate_window)
+    ])
+    deadline = time.time() + 30
+    while True:
+        try:
+            httpx.get(f'http://127.0.0.1:{port}/stats')
+            return stub
+        except httpx.HTTPError:
+            if time.time() > deadline:
+                stub.terminate()
+                raise
+            time.sleep(0.2)
+
+
+async def dashboard(client, interval, samples, stop, offset):
+    await asyncio.sleep(offset)
+    while not stop.is_set():
+        for path in PATHS:
+            started = time.perf_counter()
+            response = await client.get(path)
+            assert response.status_code == 200, response.text[:200]
+            samples.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+
+
+async def poll(app, dashboards, interval, duration):
+    samples, stop = [], asyncio.Event()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://bench', timeout=60) as client:
+        tasks = [asyncio.create_task(dashboard(client, interval, samples, stop, interval * i / dashboards))
+                 for i in range(dashboards)]
+        await asyncio.sleep(duration)
+        stop.set()
+        await asyncio.gather(*tasks)
+    return samples
+
+
+async def submit_then_read(app):
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://bench', timeout=60) as client:
+        await client.get('/api/trade/positions')
+        response = await client.post('/api/trade/trade', json={'symbol': 'NVDA', 'signal': 'Buy', 'confidence': 80})
+        assert response.status_code == 200, response.text
+        positions = (await client.get('/api/trade/positions')).json()
+    return any(position['symbol'] == 'NVDA' for position in positions)
+
+
+def burst(gateway, orders):
+    from concurrent.futures import ThreadPoolExecutor
+
+    def one(i):
+        return gateway.submit_order(symbol=f'SYM{i}', qty=1, side='buy', type='market', time_in_force='gtc')
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        filled = list(pool.map(one, range(orders)))
+    return len(filled), time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8782)
+    parser.add_argument('--dashboards', type=int, default=50)
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between a dashboard\'s polls')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--latency', type=float, default=0.05, help='simulated broker round trip (s)')
+    parser.add_argument('--burst', type=int, default=60, help='orders in the rate limit check')
+    args = parser.parse_args()
+
+    from routes import trade
+    app = FastAPI()
+    app.include_router(trade.router, prefix='/api/trade')
+    base_url = f'http://127.0.0.1:{args.port}'
+
+    stub = start_stub(args.port, args.latency)
+    try:
+        print(f"{args.dashboards} dashboards polling {len(PATHS)} endpoints every {args.interval}s "
+              f"for {args.duration}s, broker latency {args.latency * 1000:.0f} ms")
+        for name, broker in (('direct', Direct(base_url)), ('gateway', BrokerGateway(base_url=base_url))):
+            trade.broker = broker
+            httpx.post(f'{base_url}/stats/reset')
+            samples = asyncio.run(poll(app, args.dashboards, args.interval, args.duration))
+            upstream = httpx.get(f'{base_url}/stats').json()
+            ms = np.array(samples) * 1000
+            print(f"  {name:8s} {len(samples):6d} requests  {upstream['requests']:6d} broker calls "
+                  f"({upstream['requests'] / args.duration:6.1f}/s)  connections={upstream['connections']:3d}  "
+                  f"p50={np.percentile(ms, 50):6.1f}ms  p95={np.percentile(ms, 95):6.1f}ms")
+        print(f"  gateway: {trade.broker.stats()}")
+        assert asyncio.run(submit_then_read(app)), 'order missing from the next positions read'
+        print("  order submitted through /trade is visible in the next /positions read")
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    # A stub allowing 20 requests per 2s; the gateway either budgets for it or learns it from 429s
+    stub = start_stub(args.port, args.latency, rate_limit=20, rate_window=2)
+    try:
+        for name, limit in (('budgeted', 20), ('over budget', 200)):
+            httpx.post(f'{base_url}/stats/reset', params={'clear_state': True})
+            gateway = BrokerGateway(base_url=base_url, rate_limit=limit, rate_window=2)
+            filled, elapsed = burst(gateway, args.burst)
+            upstream = httpx.get(f'{base_url}/stats').json()
+            assert filled == upstream['orders'] == args.burst, (filled, upstream)
+            print(f"  {name:11s} {args.burst} orders filled in {elapsed:5.1f}s  "
+                  f"429s={upstream['rate_limited']}  retries={gateway.stats()['retries']}")
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == '__main__':
+    main()
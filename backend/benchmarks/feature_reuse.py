@@ -0,0 +1,91 @@
+"""Benchmark: recomputing features per call vs reading them from the feature store.
+
+Fills a temporary bar store with synthetic 15m bars, then times a series of
+prediction batches where one new bar arrives per symbol before each batch:
+
+  * recompute: indicators and normalization over the whole lookback window,
+    as every prediction (and every training run) used to do;
+  * store: sync the one new bar into the feature store and read the latest
+    row as a view, normalized with fixed statistics.
+
+    python benchmarks/feature_reuse.py --symbols 100 --batches 20
+"""
+import os
+import sys
+import time
+import shutil
+import string
+import argparse
+import tempfile
+import itertools
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ml'))
+
+from bar_store import BarStore, SyntheticFetcher
+from feature_store import FeatureStore, feature_matrix, normalize, window_stats
+from train_model import FEATURES, calculate_technical_indicators, prepare_features
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--symbols', type=int, default=100)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--batches', type=int, default=20)
+    args = parser.parse_args()
+
+    symbols = [''.join(p) for p in itertools.islice(itertools.product(string.ascii_uppercase, repeat=3), args.symbols)]
+    fetcher = SyntheticFetcher()
+    end = np.datetime64('2026-06-01T00:00')
+    start = end - np.timedelta64(args.days, 'D')
+    full = {symbol: fetcher(symbol, str(start), str(end + np.timedelta64(15 * args.batches, 'm')), '15m')
+            for symbol in symbols}
+    root = tempfile.mkdtemp(prefix='bars-')
+    try:
+        bar_store = BarStore(root=root, fetcher=fetcher)
+        for symbol, df in full.items():
+            bar_store.append(symbol, df.iloc[:-args.batches], '15m')
+        store = FeatureStore(bar_store)
+
+        started = time.perf_counter()
+        for symbol in symbols:
+            store.sync(symbol)
+        materialize = time.perf_counter() - started
+        stats = {symbol: window_stats(feature_matrix(store.window_arrays(symbol))) for symbol in symbols}
+        print(f"{args.symbols} symbols x {len(full[symbols[0]]) - args.batches} bars; "
+              f"one-time materialization {materialize:.2f}s")
+
+        recompute, stored, recompute_cpu, stored_cpu = [], [], [], []
+        for batch in range(args.batches):
+            for symbol, df in full.items():
+                bar_store.append(symbol, df.iloc[len(df) - args.batches + batch:][:1], '15m')
+
+            started, cpu = time.perf_counter(), time.process_time()
+            rows = []
+            for symbol in symbols:
+                df = calculate_technical_indicators(bar_store.window(symbol).copy())
+                rows.append(prepare_features(df).iloc[-1].to_numpy())
+            recompute.append(time.perf_counter() - started)
+            recompute_cpu.append(time.process_time() - cpu)
+
+            started, cpu = time.perf_counter(), time.process_time()
+            raw = np.empty((len(symbols), len(FEATURES)))
+            for i, symbol in enumerate(symbols):
+                store.sync(symbol)
+                features = store.window_arrays(symbol)
+                raw[i] = [features[name][-1] for name in FEATURES]
+            normalize(raw, {'mean': np.array([stats[s]['mean'] for s in symbols]),
+                            'std': np.array([stats[s]['std'] for s in symbols])})
+            stored.append(time.perf_counter() - started)
+            stored_cpu.append(time.process_time() - cpu)
+
+        for name, wall, cpu in (('recompute', recompute, recompute_cpu), ('store', stored, stored_cpu)):
+            print(f"  {name:10s} {np.median(wall) * 1000:8.1f} ms wall  {np.median(cpu) * 1000:8.1f} ms CPU per batch")
+        print(f"  CPU per batch reduced {np.median(recompute_cpu) / np.median(stored_cpu):.1f}x")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,128 @@
+"""Benchmark: pooled AISuggestionGenerator vs a new HTTP client per call.
+
+Runs the local OpenRouter stub (over TLS when `openssl` is available, so
+handshakes cost what they do in production) and generates suggestions for
+a batch of predictions both ways.
+
+    python benchmarks/llm_fanout.py --suggestions 200 --concurrency 100
+"""
+import os
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+import httpx
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+
+def make_certificate(directory):
+    key = os.path.join(directory, 'key.pem')
+    cert = os.path.join(directory, 'cert.pem')
+    subprocess.run(
+        ['openssl', 'req', '-x509', '-newkey', 'rsa:2048', '-nodes', '-keyout', key, '-out', cert,
+         '-days', '1', '-subj', '/CN=127.0.0.1'],
+        check=True, capture_output=True
+    )
+    return key, cert
+
+
+def predictions(n):
+    signals = ['Buy', 'Sell', 'Hold']
+    return [{
+        'symbol': f'SYM{i}', 'signal': signals[i % 3], 'confidence': 60 + i % 40,
+        'rsi': 30 + i % 50, 'macd': (i % 7) - 3
+    } for i in range(n)]
+
+
+async def per_call_client(api_url, batch, concurrency):
+    """Previous behaviour: every suggestion opens (and closes) its own client."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(prediction):
+        async with semaphore:
+            async with httpx.AsyncClient(verify=False) as client:
+                response = await client.post(api_url, json={
+                    'model': 'grok-1',
+                    'messages': [{'role': 'user', 'content': f"Based on technical analysis for {prediction['symbol']}"}]
+                }, timeout=30.0)
+                return response.json()['choices'][0]['message']['content']
+
+    return await asyncio.gather(*(one(p) for p in batch))
+
+
+async def run(base_url, api_url, n, concurrency):
+    from utils.ai_suggestions import AISuggestionGenerator
+
+    batch = predictions(n)
+    generator = AISuggestionGenerator(verify=False)
+    await generator.start()
+    jobs = (
+        ('new client per call', lambda: per_call_client(api_url, batch, concurrency)),
+        # The app keeps one generator for its lifetime, so later batches reuse warm connections
+        ('shared client (cold)', lambda: generator.generate_suggestions(batch, concurrency=concurrency)),
+        ('shared client (warm)', lambda: generator.generate_suggestions(batch, concurrency=concurrency)),
+    )
+    try:
+        async with httpx.AsyncClient(base_url=base_url, verify=False) as admin:
+            for name, job in jobs:
+                await admin.post('/stats/reset')
+                started = time.perf_counter()
+                results = await job()
+                elapsed = time.perf_counter() - started
+                stats = (await admin.get('/stats')).json()
+                assert len(results) == n
+                print(f"{name:22s} {elapsed * 1000:8.1f} ms  {n / elapsed:8.1f} req/s  "
+                      f"connections used={stats['connections']}")
+    finally:
+        await generator.aclose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8781)
+    parser.add_argument('--suggestions', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=100)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--no-tls', action='store_true')
+    args = parser.parse_args()
+
+    tls = not args.no_tls and shutil.which('openssl') is not None
+    command = [sys.executable, os.path.join(BACKEND_DIR, 'stubs', 'openrouter.py'),
+               '--port', str(args.port), '--latency', str(args.latency)]
+    if tls:
+        key, cert = make_certificate(tempfile.mkdtemp(prefix='stub-tls-'))
+        command += ['--ssl-keyfile', key, '--ssl-certfile', cert]
+    scheme = 'https' if tls else 'http'
+    base_url = f'{scheme}://127.0.0.1:{args.port}'
+    api_url = f'{base_url}/api/v1/chat/completions'
+    os.environ['OPENROUTER_API_URL'] = api_url
+    os.environ['LLM_MAX_CONNECTIONS'] = str(args.concurrency)
+    os.environ['LLM_MAX_KEEPALIVE'] = str(args.concurrency)
+
+    stub = subprocess.Popen(command)
+    try:
+        deadline = time.time() + 30
+        while True:
+            try:
+                httpx.get(f'{base_url}/stats', verify=False)
+                break
+            except httpx.HTTPError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.2)
+        print(f"{args.suggestions} suggestions, concurrency {args.concurrency}, "
+              f"{'TLS' if tls else 'plain HTTP'}, stub latency {args.latency * 1000:.0f} ms")
+        asyncio.run(run(base_url, api_url, args.suggestions, args.concurrency))
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""Benchmark: time to first token of /api/ml/suggest/stream vs /api/ml/suggest.
+
+Starts the local OpenRouter stub in streaming mode and the API pointed at
+it, then measures how long the chat page waits for the first visible text
+on each route. Also checks that closing a stream early cancels the upstream
+generation. Exits non-zero if the median streamed TTFT exceeds --max-ttft-ms.
+
+    python benchmarks/llm_ttft.py --requests 20 --latency 0.15 --token-delay 0.04
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import subprocess
+
+import httpx
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def wait_ready(url, timeout=60):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            httpx.get(url)
+            return
+        except httpx.HTTPError:
+            if time.time() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+async def full_response(client, prompt):
+    started = time.perf_counter()
+    response = await client.post('/api/ml/suggest', json={'prompt': prompt})
+    response.raise_for_status()
+    elapsed = time.perf_counter() - started
+    return elapsed, elapsed
+
+
+async def streamed_response(client, prompt, stop_after_first=False):
+    started = time.perf_counter()
+    first = None
+    async with client.stream('POST', '/api/ml/suggest/stream', json={'prompt': prompt}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line == 'event: token' and first is None:
+                first = time.perf_counter() - started
+                if stop_after_first:
+                    break
+    return first, time.perf_counter() - started
+
+
+async def run(api_base, stub_base, n):
+    async with httpx.AsyncClient(base_url=api_base, timeout=60) as client:
+        for name, call in (('/suggest', full_response), ('/suggest/stream', streamed_response)):
+            first, total = zip(*[await call(client, f'What is the outlook for request {i}?') for i in range(n)])
+            print(f"{name:16s} first text p50={np.median(first) * 1000:7.1f}ms  "
+                  f"p95={np.percentile(first, 95) * 1000:7.1f}ms   complete p50={np.median(total) * 1000:7.1f}ms")
+            if name == '/suggest/stream':
+                streamed_ttft = np.median(first)
+
+        async with httpx.AsyncClient(base_url=stub_base) as stub:
+            await stub.post('/stats/reset')
+            await streamed_response(client, 'Disconnect after the first token', stop_after_first=True)
+            await asyncio.sleep(0.5)
+            stats = (await stub.get('/stats')).json()
+        print(f"early disconnect: upstream streams completed={stats['streams_completed']} "
+              f"cancelled={stats['streams_cancelled']}")
+    return streamed_ttft, stats['streams_cancelled'] == 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8797)
+    parser.add_argument('--stub-port', type=int, default=8782)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--latency', type=float, default=0.15, help='stub time to first token (s)')
+    parser.add_argument('--token-delay', type=float, default=0.04, help='stub seconds per following word')
+    parser.add_argument('--tokens', type=int, default=60, help='words per stub response')
+    parser.add_argument('--max-ttft-ms', type=float, default=300)
+    args = parser.parse_args()
+
+    stub_base = f'http://127.0.0.1:{args.stub_port}'
+    api_base = f'http://127.0.0.1:{args.port}'
+    env = dict(
+        os.environ,
+        OPENROUTER_API_URL=f'{stub_base}/api/v1/chat/completions',
+        LLM_CACHE_ENABLED='false',
+        SIGNAL_SCHEDULER_ENABLED='false',
+        BAR_FETCHER='synthetic',
+        BAR_STORE_DIR=tempfile.mkdtemp(prefix='bars-'),
+    )
+    stub = subprocess.Popen(
+        [sys.executable, os.path.join(BACKEND_DIR, 'stubs', 'openrouter.py'), '--port', str(args.stub_port),
+         '--latency', str(args.latency), '--token-delay', str(args.token_delay), '--tokens', str(args.tokens)]
+    )
+    server = subprocess.Popen(
+        [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(args.port),
+         '--log-level', 'warning', '--ws', 'none'],
+        cwd=BACKEND_DIR, env=env
+    )
+    try:
+        wait_ready(f'{stub_base}/stats')
+        wait_ready(f'{api_base}/health')
+        print(f"{args.requests} requests, stub TTFT {args.latency * 1000:.0f} ms, "
+              f"{args.tokens} words at {args.token_delay * 1000:.0f} ms each")
+        ttft, cancelled = asyncio.run(run(api_base, stub_base, args.requests))
+    finally:
+        server.terminate()
+        stub.terminate()
+        server.wait()
+        stub.wait()
+
+    ok = ttft * 1000 <= args.max_ttft_ms and cancelled
+    print(f"{'PASS' if ok else 'FAIL'}: streamed TTFT p50 {ttft * 1000:.1f} ms (limit {args.max_ttft_ms:.0f} ms), "
+          f"upstream cancelled on disconnect: {cancelled}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
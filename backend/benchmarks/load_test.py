@@ -0,0 +1,158 @@
+"""Load test: /health and /api/trade/account latency while predictions are saturated.
+
+Starts the API in a subprocess with synthetic market data and a fake Alpaca
+client that sleeps like a network call, then measures probe latency first
+on an idle server and again while many concurrent prediction requests run.
+
+    python benchmarks/load_test.py --concurrency 32 --duration 10
+"""
+import os
+import sys
+import time
+import random
+import string
+import asyncio
+import argparse
+import warnings
+import tempfile
+import subprocess
+from types import SimpleNamespace
+
+import httpx
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class SlowAlpaca:
+    """Stand-in for alpaca_trade_api.REST whose calls block like a round trip."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def get_account(self):
+        time.sleep(self.latency)
+        return SimpleNamespace(
+            portfolio_value='100000', buying_power='200000', cash='100000',
+            equity='100000', last_equity='99000', status='ACTIVE'
+        )
+
+
+def serve(port, fetch_delay, alpaca_latency):
+    sys.path.insert(0, BACKEND_DIR)
+    import uvicorn
+    from sklearn.ensemble import RandomForestClassifier
+    from main import app
+    from routes import ml, trade
+    from bar_store import SyntheticFetcher
+
+    synthetic = SyntheticFetcher()
+
+    def slow_fetcher(symbol, start, end, interval):
+        time.sleep(fetch_delay)
+        return synthetic(symbol, start, end, interval)
+
+    ml.predictor.bar_store.fetcher = slow_fetcher
+    ml.predictor.bar_store.refresh_seconds = 0
+    if ml.predictor.scorer is None:
+        # Same shape and hyperparameters as the real model
+        warnings.filterwarnings('ignore', message='X has feature names')
+        rng = np.random.default_rng(0)
+        X = rng.normal(size=(2000, 12))
+        y = rng.integers(-1, 2, size=2000)
+        model = RandomForestClassifier(n_estimators=100, max_depth=10, random_state=42).fit(X, y)
+        ml.predictor.set_model(model, 'load-test')
+    trade.broker.set_client(SlowAlpaca(alpaca_latency))
+    # Every probe still makes the simulated round trip instead of reading a snapshot
+    trade.broker.snapshot_seconds = 0
+    uvicorn.run(app, host='127.0.0.1', port=port, log_level='warning', ws='none')
+
+
+def summarize(samples):
+    if not samples:
+        return 'no samples'
+    ms = np.array(samples) * 1000
+    return (f"n={len(ms):5d}  p50={np.percentile(ms, 50):7.1f}ms  p95={np.percentile(ms, 95):7.1f}ms  "
+            f"p99={np.percentile(ms, 99):7.1f}ms  max={ms.max():7.1f}ms")
+
+
+async def probe(client, path, samples, stop, interval=0.05):
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get(path)
+        response.raise_for_status()
+        samples.append(time.perf_counter() - started)
+        await asyncio.sleep(interval)
+
+
+async def hammer(client, samples, stop):
+    while not stop.is_set():
+        # Unique symbols bypass the prediction cache so every request does real work
+        symbol = 'Z' + ''.join(random.choices(string.ascii_uppercase, k=5))
+        started = time.perf_counter()
+        await client.get(f'/api/ml/predictions/{symbol}', timeout=120)
+        samples.append(time.perf_counter() - started)
+
+
+async def phase(base_url, duration, concurrency):
+    stop = asyncio.Event()
+    results = {'/health': [], '/api/trade/account': [], 'predictions': []}
+    limits = httpx.Limits(max_connections=concurrency + 10)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        tasks = [asyncio.create_task(probe(client, path, results[path], stop)) for path in ('/health', '/api/trade/account')]
+        tasks += [asyncio.create_task(hammer(client, results['predictions'], stop)) for _ in range(concurrency)]
+        await asyncio.sleep(duration)
+        stop.set()
+        await asyncio.gather(*tasks)
+    return results
+
+
+async def wait_ready(base_url, timeout=60):
+    deadline = time.time() + timeout
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        while time.time() < deadline:
+            try:
+                if (await client.get('/health')).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError('Server did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8799)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--fetch-delay', type=float, default=0.3, help='simulated upstream bar download time (s)')
+    parser.add_argument('--alpaca-latency', type=float, default=0.05, help='simulated Alpaca round trip (s)')
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.port, args.fetch_delay, args.alpaca_latency)
+        return
+
+    env = dict(os.environ, BAR_STORE_DIR=tempfile.mkdtemp(prefix='bars-'), SIGNAL_SCHEDULER_ENABLED='false')
+    server = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', '--port', str(args.port),
+         '--fetch-delay', str(args.fetch_delay), '--alpaca-latency', str(args.alpaca_latency)],
+        cwd=BACKEND_DIR, env=env
+    )
+    base_url = f'http://127.0.0.1:{args.port}'
+    try:
+        asyncio.run(wait_ready(base_url))
+        for name, concurrency in (('idle', 0), (f'saturated x{args.concurrency}', args.concurrency)):
+            results = asyncio.run(phase(base_url, args.duration, concurrency))
+            print(f"\n[{name}]")
+            for path, samples in results.items():
+                if samples:
+                    print(f"  {path:20s} {summarize(samples)}")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,236 @@
+"""Replay a trading day through the whole backend at N times real time.
+
+Trains a model on the replay source as of the session open, then starts the
+broker and LLM stubs and the API (`BAR_FETCHER=replay`) on one shared replay
+clock. After every replayed 15m bar close it runs the predict -> suggest ->
+trade path over HTTP:
+
+    GET /api/ml/signals -> GET /api/ml/suggestions -> POST /api/trade/basket
+
+while dashboard pollers keep loading the API. Reports per-stage and
+end-to-end latency, throughput, and a digest of every signal and fill, which
+is the same on every run with the same settings.
+
+    python benchmarks/replay_day.py --date 2026-06-01 --speed 1800 --pollers 8
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import asyncio
+import hashlib
+import argparse
+import tempfile
+import subprocess
+
+import httpx
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'ml'))
+
+from bar_store import INTERVAL_SECONDS, BarStore
+from model_registry import ModelRegistry
+from replay import ReplayClock, ReplayFetcher, get_source
+from training_pipeline import STOCKS, TrainingPipeline
+
+BAR_SECONDS = INTERVAL_SECONDS['15m']
+POLLED = ('/api/ml/predictions', '/api/ml/signals', '/api/trade/account', '/api/trade/positions', '/api/trade/orders')
+
+
+def session(date):
+    """Replay epoch seconds of the session open and of every 15m bar close."""
+    open_ = pd.Timestamp(f'{date} 09:30', tz='America/New_York').tz_convert('UTC')
+    close = pd.Timestamp(f'{date} 16:00', tz='America/New_York').tz_convert('UTC')
+    return open_, list(range(int(open_.timestamp()) + BAR_SECONDS, int(close.timestamp()) + 1, BAR_SECONDS))
+
+
+def train(root, source, open_, lookback_days):
+    """Fit and register a model, as `training_pipeline.py` does, on the source's bars before the open."""
+    frozen = ReplayFetcher(source, ReplayClock(open_, speed=0))
+    pipeline = TrainingPipeline(bar_store=BarStore(root=os.path.join(root, 'train_bars'), fetcher=frozen),
+                                process_workers=1, lookback_days=lookback_days)
+    registry = ModelRegistry(os.path.join(root, 'registry'))
+    pipeline.run(STOCKS, model_path=os.path.join(root, 'model.pkl'),
+                 forest_path=os.path.join(root, 'model_forest'), registry=registry)
+    return registry.root
+
+
+def seed(root, source, open_):
+    """Store the 60 days of 15m bars before the open the backend would fetch on its first refresh.
+
+    Indicators such as the EMAs depend on where a bar series starts; seeding
+    pins that start, instead of it following the moment the backend starts.
+    """
+    store = BarStore(root=root, fetcher=ReplayFetcher(source, ReplayClock(open_, speed=0)))
+    for symbol in STOCKS:
+        store.refresh(symbol, '15m', lookback_days=60)
+
+
+def start(command, env, url):
+    process = subprocess.Popen(command, cwd=BACKEND_DIR, env=env)
+    deadline = time.time() + 60
+    while True:
+        try:
+            httpx.get(url)
+            return process
+        except httpx.HTTPError:
+            if time.time() > deadline or process.poll() is not None:
+                process.terminate()
+                raise RuntimeError(f"{command[1]} did not start")
+            time.sleep(0.2)
+
+
+async def poller(client, samples, stop, rng):
+    while not stop.is_set():
+        path = rng.choice(POLLED)
+        started = time.perf_counter()
+        response = await client.get(path)
+        if response.status_code == 200:
+            samples.append(time.perf_counter() - started)
+        await asyncio.sleep(0.02)
+
+
+async def run_day(base_url, clock, closes, args, source):
+    timings = {'signals': [], 'suggestions': [], 'basket': [], 'end_to_end': []}
+    poll_samples, stop = [], asyncio.Event()
+    digest = hashlib.sha256()
+    overruns = stale = orders = 0
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        polling = time.time()
+        pollers = [asyncio.create_task(poller(client, poll_samples, stop, random.Random(i))) for i in range(args.pollers)]
+        for close in closes:
+            # Act a fixed fraction into the next bar, so every run sees the same closed bars
+            await asyncio.sleep(max(0.0, clock.wall_time(close + args.step_offset * BAR_SECONDS) - time.time()))
+            step = time.perf_counter()
+            signals = (await client.get('/api/ml/signals', params={'confidence_threshold': args.confidence})).json()
+            timings['signals'].append(time.perf_counter() - step)
+
+            stage = time.perf_counter()
+            response = await client.get('/api/ml/suggestions', params={'confidence_threshold': args.confidence})
+            assert response.status_code == 200, response.text[:200]
+            timings['suggestions'].append(time.perf_counter() - stage)
+
+            stage = time.perf_counter()
+            response = await client.post('/api/trade/basket', json={'signals': signals, 'basket_id': f'replay-{close}'})
+            assert response.status_code == 200, response.text[:200]
+            basket = response.json()
+            timings['basket'].append(time.perf_counter() - stage)
+            timings['end_to_end'].append(time.perf_counter() - step)
+            orders += basket['submitted']
+
+            if time.time() > clock.wall_time(close + BAR_SECONDS):
+                overruns += 1
+            bar = pd.Timestamp(close - BAR_SECONDS, unit='s')
+            for signal in signals:
+                expected = source(signal['symbol'], bar, bar, '15m')['Close'].iloc[-1]
+                stale += abs(signal['current_price'] - expected) > 1e-6 * expected
+                digest.update(f"{close} {signal['symbol']} {signal['signal']} {signal['confidence']}\n".encode())
+            for leg in basket['legs']:
+                digest.update(f"{close} {leg['symbol']} {leg['status']} {leg.get('action')} {leg.get('price')}\n".encode())
+        elapsed = time.time() - clock.anchor
+        stop.set()
+        await asyncio.gather(*pollers)
+        extra = {
+            'poll_rate': len(poll_samples) / (time.time() - polling),
+            'trades': len((await client.get('/api/trade/trades', params={'limit': 100000})).json()),
+            'broker': (await client.get('/api/trade/broker/stats')).json(),
+            'cache': (await client.get('/api/ml/cache/stats')).json(),
+        }
+    return timings, poll_samples, elapsed, orders, overruns, stale, digest.hexdigest()[:16], extra
+
+
+def summarize(name, samples):
+    ms = np.array(samples) * 1000
+    return (f"  {name:12s} n={len(ms):5d}  p50={np.percentile(ms, 50):7.1f}ms  p95={np.percentile(ms, 95):7.1f}ms  "
+            f"p99={np.percentile(ms, 99):7.1f}ms  max={ms.max():7.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--date', default='2026-06-01', help='trading day to replay')
+    parser.add_argument('--speed', type=float, default=1800, help='replay seconds per wall second')
+    parser.add_argument('--source', default='synthetic', help="'synthetic' or a recorded bar store directory")
+    parser.add_argument('--pollers', type=int, default=8, help='concurrent dashboard pollers')
+    parser.add_argument('--confidence', type=float, default=50, help='signal confidence threshold')
+    parser.add_argument('--step-offset', type=float, default=0.2, help='fraction of a bar after its close to act')
+    parser.add_argument('--lookback-days', type=int, default=180, help='training window before the replayed day')
+    parser.add_argument('--broker-latency', type=float, default=0.05)
+    parser.add_argument('--llm-latency', type=float, default=0.05)
+    parser.add_argument('--warmup', type=float, default=20, help='wall seconds before the session opens')
+    parser.add_argument('--scheduler', action='store_true',
+                        help='also run the background signal scheduler (its timing can make runs differ)')
+    parser.add_argument('--port', type=int, default=8784)
+    args = parser.parse_args()
+
+    open_, closes = session(args.date)
+    source = get_source(args.source)
+    root = tempfile.mkdtemp(prefix='replay-')
+    processes = []
+    try:
+        started = time.perf_counter()
+        registry = train(root, source, open_, args.lookback_days)
+        print(f"trained on {args.lookback_days} days before {open_} in {time.perf_counter() - started:.1f}s")
+
+        seed(os.path.join(root, 'bars'), source, open_)
+        anchor = time.time() + args.warmup
+        ports = {'api': args.port, 'broker': args.port + 1, 'llm': args.port + 2}
+        replay_env = {
+            'REPLAY_START': open_.isoformat(), 'REPLAY_SPEED': str(args.speed),
+            'REPLAY_ANCHOR': str(anchor), 'REPLAY_SOURCE': args.source,
+        }
+        # Broker budgets are per minute of replay time
+        rate_limit = str(int(200 * args.speed))
+        env = dict(os.environ, **replay_env)
+        processes.append(start(
+            [sys.executable, 'stubs/broker.py', '--port', str(ports['broker']), '--latency', str(args.broker_latency),
+             '--rate-limit', rate_limit], env, f"http://127.0.0.1:{ports['broker']}/stats"))
+        processes.append(start(
+            [sys.executable, 'stubs/openrouter.py', '--port', str(ports['llm']), '--latency', str(args.llm_latency)],
+            env, f"http://127.0.0.1:{ports['llm']}/stats"))
+        env.update({
+            'BAR_FETCHER': 'replay', 'BAR_STORE_DIR': os.path.join(root, 'bars'), 'BAR_REFRESH_SECONDS': '0',
+            'MODEL_REGISTRY_DIR': registry, 'TRADE_JOURNAL_PATH': os.path.join(root, 'journal.sqlite'),
+            'LLM_CACHE_PATH': os.path.join(root, 'llm_cache.sqlite'),
+            'OPENROUTER_API_URL': f"http://127.0.0.1:{ports['llm']}/api/v1/chat/completions",
+            'OPENROUTER_API_KEY': 'stub', 'ALPACA_KEY': 'stub', 'ALPACA_SECRET': 'stub',
+            'ALPACA_BASE_URL': f"http://127.0.0.1:{ports['broker']}", 'BROKER_RATE_LIMIT': rate_limit,
+            'SIGNAL_SCHEDULER_ENABLED': 'true' if args.scheduler else 'false',
+        })
+        base_url = f"http://127.0.0.1:{ports['api']}"
+        processes.append(start(
+            [sys.executable, '-m', 'uvicorn', 'main:app', '--host', '127.0.0.1', '--port', str(ports['api']),
+             '--log-level', 'warning', '--ws', 'none'], env, f'{base_url}/health'))
+
+        # Materialize bars and features for the lookback window before the open
+        started = time.perf_counter()
+        httpx.get(f'{base_url}/api/ml/predictions', timeout=300).raise_for_status()
+        print(f"warmed up in {time.perf_counter() - started:.1f}s")
+        if time.time() > anchor:
+            raise RuntimeError('Warm-up ran past the session open; raise --warmup')
+
+        clock = ReplayClock(open_, args.speed, anchor)
+        print(f"replaying {args.date} ({len(closes)} bars) at {args.speed:g}x: "
+              f"{len(closes) * BAR_SECONDS / args.speed:.1f}s of wall time, {args.pollers} pollers")
+        timings, polls, elapsed, orders, overruns, stale, digest, extra = asyncio.run(
+            run_day(base_url, clock, closes, args, source))
+        for name, samples in timings.items():
+            print(summarize(name, samples))
+        if polls:
+            print(summarize('pollers', polls))
+        print(f"  {len(closes)} bars in {elapsed:.1f}s from the open ({len(closes) / elapsed:.2f} bars/s), {orders} orders, "
+              f"{extra['trades']} trades journaled, {extra['poll_rate']:.0f} poller req/s")
+        print(f"  broker calls: {sum(extra['broker']['upstream_calls'].values())}  "
+              f"prediction cache hit rate: {extra['cache']['hit_rate']}")
+        print(f"  steps past their bar: {overruns}  stale predictions: {stale}  decision digest: {digest}")
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""Benchmark: encoding the prediction snapshot, and polling /api/ml/predictions.
+
+Builds a snapshot of N synthetic predictions (the predictor's fields) and
+compares, per size:
+
+  * encode: FastAPI's default path in the pinned release (jsonable_encoder,
+    then json.dumps as JSONResponse renders it) against orjson rows, columnar JSON and
+    columnar MessagePack, in time and in bytes raw and gzipped;
+  * poll: in-process GET latency of a route returning the list with a
+    response_model (the old endpoint, with the installed FastAPI) against the real endpoint serving
+    the scheduler's snapshot, first poll, repeat poll, and a revalidation
+    with If-None-Match that gets a 304.
+
+    python benchmarks/serialization.py --symbols 10,500,5000
+"""
+import os
+import sys
+import json
+import gzip
+import time
+import string
+import asyncio
+import argparse
+import tempfile
+import itertools
+from typing import Any, Dict, List
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+FORMATS = {
+    'json': 'application/json',
+    'columnar': 'application/vnd.stockgenie.columnar+json',
+    'msgpack': 'application/msgpack',
+}
+
+
+def snapshot(n, seed=0):
+    """`n` predictions shaped like `StockPredictor.predict_batch` output."""
+    rng = np.random.default_rng(seed)
+    names = [''.join(p) for p in itertools.islice(itertools.product(string.ascii_uppercase, repeat=4), n)]
+    return [{
+        'symbol': symbol,
+        'signal': ('Buy', 'Sell', 'Hold')[int(rng.integers(3))],
+        'confidence': round(float(rng.uniform(34, 100)), 2),
+        'timestamp': '2026-06-01T14:30:00',
+        'current_price': float(rng.uniform(5, 900)),
+        'volume': float(rng.integers(1_000, 5_000_000)),
+        'rsi': float(rng.uniform(0, 100)),
+        'macd': float(rng.normal()),
+        'model_version': '20260601-143000-ab12cd34',
+    } for symbol in names]
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return float(np.median(samples)) * 1000, result
+
+
+def encode_table(rows, repeat):
+    from fastapi.encoders import jsonable_encoder
+    from utils import serialization
+
+    cases = {'fastapi': lambda: json.dumps(jsonable_encoder(rows), ensure_ascii=False, allow_nan=False,
+                                           indent=None, separators=(',', ':')).encode()}
+    for fmt in FORMATS:
+        if fmt != 'msgpack' or serialization.msgpack is not None:
+            cases[fmt] = lambda fmt=fmt: serialization.encode(rows, fmt)
+    results = {}
+    for name, fn in cases.items():
+        ms, body = timed(fn, repeat)
+        results[name] = (ms, len(body), len(gzip.compress(body, 6)))
+    return results
+
+
+async def poll_table(rows, repeat):
+    import httpx
+    from fastapi import FastAPI
+    from main import app
+    from routes import ml
+
+    ml.scheduler.by_symbol = {pred['symbol']: pred for pred in rows}
+    ml.scheduler.predictions = rows
+    ml.scheduler.version += 1
+
+    old = FastAPI()
+
+    @old.get('/predictions', response_model=List[Dict[str, Any]])
+    async def old_predictions():
+        return ml.scheduler.predictions
+
+    async def latency(client, path, headers=None, fresh=None):
+        samples, response = [], None
+        for _ in range(repeat):
+            if fresh is not None:
+                fresh()
+            started = time.perf_counter()
+            response = await client.get(path, headers=headers)
+            samples.append(time.perf_counter() - started)
+        return float(np.median(samples)) * 1000, response
+
+    def new_snapshot():
+        # A new snapshot object, as each scheduler refresh swaps in
+        ml.scheduler.predictions = list(rows)
+
+    results = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=old), base_url='http://test') as client:
+        results['old'] = await latency(client, '/predictions')
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://test') as client:
+        results['first'] = await latency(client, '/api/ml/predictions', fresh=new_snapshot)
+        results['repeat'] = await latency(client, '/api/ml/predictions')
+        etag = results['repeat'][1].headers['etag']
+        results['304'] = await latency(client, '/api/ml/predictions', headers={'If-None-Match': etag})
+        results['columnar'] = await latency(client, '/api/ml/predictions', headers={'Accept': FORMATS['columnar']})
+    assert results['304'][1].status_code == 304
+    assert results['repeat'][1].json() == results['old'][1].json()
+    return {name: (ms, len(response.content)) for name, (ms, response) in results.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--symbols', default='10,500,5000')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix='serialization-')
+    os.environ.setdefault('BAR_FETCHER', 'synthetic')
+    os.environ.setdefault('BAR_STORE_DIR', os.path.join(root, 'bars'))
+    os.environ.setdefault('MODEL_REGISTRY_DIR', os.path.join(root, 'models'))
+    os.environ.setdefault('TRADE_JOURNAL_PATH', os.path.join(root, 'journal.jsonl'))
+    os.environ.setdefault('LLM_CACHE_PATH', os.path.join(root, 'llm_cache.jsonl'))
+    os.environ['SIGNAL_SCHEDULER_ENABLED'] = 'false'
+
+    for n in [int(size) for size in args.symbols.split(',')]:
+        rows = snapshot(n)
+        print(f"\n{n} symbols")
+        print(f"  {'encode':10s} {'ms':>8s} {'bytes':>10s} {'gzip':>9s}")
+        encoded = encode_table(rows, args.repeat)
+        for name, (ms, raw, packed) in encoded.items():
+            print(f"  {name:10s} {ms:8.3f} {raw:10d} {packed:9d}")
+        print(f"  {'GET':10s} {'ms':>8s} {'bytes':>10s}")
+        for name, (ms, size) in asyncio.run(poll_table(rows, args.repeat)).items():
+            print(f"  {name:10s} {ms:8.3f} {size:10d}")
+
+
+if __name__ == '__main__':
+    main()
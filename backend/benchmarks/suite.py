@@ -0,0 +1,681 @@
+"""Benchmark suite: hot functions and API endpoints at several sizes, with a results history.
+
+Cases, each run at every size of its ladder on synthetic data:
+
+  indicators      calculate_technical_indicators on N bars
+  features        prepare_features (fitted statistics) on N bars
+  feature_sync    FeatureStore.sync materializing N new bars
+  resample        15m, 1h, 1d and 1wk bars from N 1m bars, and keeping all four
+                  derived series current in a bar store as one 1m bar arrives
+  forest          CompiledForest.predict_proba on a batch of N rows against sklearn's,
+                  checking that probabilities and classes match
+  predict_single  StockPredictor.predict_single_stock, one new bar per call, N bars stored
+  predict_batch   StockPredictor.predict_batch over N symbols, one new bar each
+  screener        StockPredictor.screen ranking N symbols from one panel of
+                  their last 1,100 15m bars (60 trading days), one new bar each,
+                  with the per-symbol pandas indicators over the same bars for reference
+  chart_history   ChartHistory.query of N stored 15m bars at 300 points: whole-range
+                  candles and LTTB line from the min/max pyramid, a zoomed-in range,
+                  pyramid build and one-new-bar update, payload bytes, and the same
+                  candles and line computed from every bar for reference
+  trade_history   get_trade_history (/api/trade/trades) over a journal of N trades
+  endpoints       in-process throughput and latency of the API endpoints at N
+                  concurrent clients, with a fake broker and synthetic bars
+  startup         cold import of the API, time until N uvicorn workers serve,
+                  and their memory (RSS, PSS, and the PSS of the mapped model)
+
+Every run appends one JSON line per case and size to a history file
+(`BENCHMARK_HISTORY`, default `data/benchmark_history.jsonl`) tagged with the
+git commit, so results can be compared across commits:
+
+    python benchmarks/suite.py                      # quick ladder
+    python benchmarks/suite.py --ladder full        # up to 10M bars and 5,000 symbols
+    python benchmarks/suite.py --only indicators,predict_batch
+    python benchmarks/suite.py --compare HEAD~1     # this run vs the last run of a commit
+    python benchmarks/suite.py --compare HEAD~1 --no-run
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import string
+import socket
+import asyncio
+import argparse
+import platform
+import tempfile
+import warnings
+import itertools
+import subprocess
+from datetime import datetime
+from types import SimpleNamespace
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.join(BACKEND_DIR, 'ml'))
+
+# Everything the suite writes, including the stores the API opens at import
+ROOT = tempfile.mkdtemp(prefix='suite-')
+os.environ.update(
+    BAR_STORE_DIR=os.path.join(ROOT, 'bars'), BAR_FETCHER='synthetic', SIGNAL_SCHEDULER_ENABLED='false',
+    MODEL_REGISTRY_DIR=os.path.join(ROOT, 'registry'), TRADE_JOURNAL_PATH=os.path.join(ROOT, 'journal.sqlite'),
+    LLM_CACHE_PATH=os.path.join(ROOT, 'llm_cache.sqlite'),
+)
+os.environ.setdefault('ALPACA_KEY', 'stub-key')
+os.environ.setdefault('ALPACA_SECRET', 'stub-secret')
+
+import httpx
+import numpy as np
+import pandas as pd
+
+from bar_store import BarStore, SyntheticFetcher
+from feature_store import FeatureStore
+from replay import ReplayFetcher
+from resample import resample
+from train_model import FEATURES, calculate_technical_indicators, normalization_stats, prepare_features
+
+HISTORY_PATH = os.getenv('BENCHMARK_HISTORY', os.path.join(BACKEND_DIR, 'data', 'benchmark_history.jsonl'))
+
+LADDERS = {
+    'quick': {'bars': [1_000, 10_000, 100_000], 'history': [1_000, 10_000], 'symbols': [10, 100],
+              'rows': [1, 100, 1_000], 'trades': [10_000, 100_000], 'clients': [1, 16], 'workers': [1, 4]},
+    'full': {'bars': [1_000, 10_000, 100_000, 1_000_000, 10_000_000], 'history': [1_000, 10_000, 100_000],
+             'symbols': [10, 100, 1_000, 5_000], 'rows': [1, 10, 100, 1_000, 10_000],
+             'trades': [10_000, 100_000, 1_000_000], 'clients': [1, 16, 64], 'workers': [1, 4, 8]},
+}
+ENDPOINTS = (
+    '/health', '/api/ml/predictions', '/api/ml/predictions/AAPL', '/api/ml/signals?confidence_threshold=0',
+    '/api/trade/account', '/api/trade/positions', '/api/trade/orders', '/api/trade/trades?limit=50',
+)
+
+
+def synthetic_ohlcv(n, seed=0, start='2000-01-03', freq='1min'):
+    """`n` bars of a seeded random walk with consistent OHLC and volume."""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.001, n)))
+    open_ = np.concatenate(([100.0], close[:-1]))
+    spread = np.abs(rng.normal(0, 0.0005, n)) * close
+    return pd.DataFrame({
+        'Open': open_, 'High': np.maximum(open_, close) + spread, 'Low': np.minimum(open_, close) - spread,
+        'Close': close, 'Volume': rng.integers(1_000, 100_000, n).astype(np.float64),
+    }, index=pd.date_range(start, periods=n, freq=freq))
+
+
+def symbols(count):
+    return [''.join(p) for p in itertools.islice(itertools.product(string.ascii_uppercase, repeat=4), count)]
+
+
+class ManualClock:
+    """Epoch seconds that only move when told to, so each step reveals exactly one bar."""
+
+    def __init__(self, now):
+        self.now = float(now)
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+class FakeBroker:
+    """Stand-in for alpaca_trade_api.REST with a fixed book of positions and orders."""
+
+    def __init__(self, positions=10, orders=50):
+        self._positions = [SimpleNamespace(
+            symbol=symbol, qty='10', avg_entry_price='100', current_price='101', market_value='1010',
+            unrealized_pl='10', unrealized_plpc='0.01') for symbol in symbols(positions)]
+        filled = datetime(2026, 1, 2, 15, 0)
+        self._orders = [SimpleNamespace(
+            id=str(i), symbol=self._positions[i % positions].symbol, side='buy', qty='1', filled_qty='1',
+            type='market', status='filled', submitted_at=filled, filled_at=filled, filled_avg_price='100')
+            for i in range(orders)]
+
+    def get_account(self):
+        return SimpleNamespace(portfolio_value='100000', buying_power='200000', cash='90000',
+                               equity='100000', last_equity='99000', status='ACTIVE')
+
+    def list_positions(self):
+        return self._positions
+
+    def list_orders(self, status=None, limit=50):
+        return self._orders[:limit]
+
+
+def fake_model(rows=2000):
+    """A forest of the served model's shape, fitted on random features."""
+    from sklearn.ensemble import RandomForestClassifier
+    warnings.filterwarnings('ignore', message='X has feature names')
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.normal(size=(rows, len(FEATURES))), columns=FEATURES)
+    return RandomForestClassifier(n_estimators=100, max_depth=10, random_state=42).fit(X, rng.integers(-1, 2, rows))
+
+
+def measure(fn, repeat, setup=None, min_repeat=3, budget=10.0):
+    """Time `fn` `repeat` times (fewer once `budget` seconds are spent, but at least `min_repeat`)."""
+    samples = []
+    deadline = time.perf_counter() + budget
+    while len(samples) < repeat and (len(samples) < min_repeat or time.perf_counter() < deadline):
+        if setup is not None:
+            setup()
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def timing_metrics(samples, items=None):
+    ms = np.array(samples) * 1000
+    metrics = {'median_ms': float(np.median(ms)), 'p95_ms': float(np.percentile(ms, 95)),
+               'min_ms': float(ms.min()), 'repeats': len(ms)}
+    if items:
+        metrics['items_per_s'] = items / (metrics['median_ms'] / 1000)
+    return metrics
+
+
+def case_indicators(n, repeat):
+    df = synthetic_ohlcv(n)
+    return timing_metrics(measure(lambda: calculate_technical_indicators(df.copy()), repeat), n)
+
+
+def case_features(n, repeat):
+    df = calculate_technical_indicators(synthetic_ohlcv(n))
+    df['Price_to_SMA20'] = df['Close'] / df['SMA_20']
+    df['Price_to_SMA50'] = df['Close'] / df['SMA_50']
+    stats = normalization_stats(df.dropna())
+    return timing_metrics(measure(lambda: prepare_features(df, stats=stats), repeat), n)
+
+
+def case_feature_sync(n, repeat):
+    bars = synthetic_ohlcv(n)
+    root = tempfile.mkdtemp(dir=ROOT)
+    bar_store = BarStore(root=root, fetcher=SyntheticFetcher())
+    bar_store.append('SYNC', bars, '1m')
+    state = {}
+
+    def fresh():
+        shutil.rmtree(os.path.join(root, 'features'), ignore_errors=True)
+        state['store'] = FeatureStore(bar_store)
+
+    samples = measure(lambda: state['store'].sync('SYNC', '1m'), repeat, setup=fresh)
+    shutil.rmtree(root, ignore_errors=True)
+    return timing_metrics(samples, n)
+
+
+def case_resample(n, repeat):
+    intervals = ('15m', '1h', '1d', '1wk')
+    bars = synthetic_ohlcv(n + repeat)
+    history, arriving = bars.iloc[:n], iter(range(n, n + repeat))
+    metrics = timing_metrics(measure(lambda: [resample(history, interval) for interval in intervals], repeat), n)
+
+    root = tempfile.mkdtemp(dir=ROOT)
+    bar_store = BarStore(root=root, fetcher=SyntheticFetcher(), base_interval='1m')
+    bar_store.append('SYNC', history, '1m')
+    for interval in intervals:
+        bar_store._derive('SYNC', interval)
+
+    def arrive():
+        i = next(arriving)
+        bar_store.append('SYNC', bars.iloc[i:i + 1], '1m')
+
+    samples = measure(lambda: [bar_store._derive('SYNC', interval) for interval in intervals], repeat, setup=arrive)
+    shutil.rmtree(root, ignore_errors=True)
+    metrics['update_ms'] = float(np.median(samples) * 1000)
+    return metrics
+
+
+def stepped_predictor(names, bars):
+    """A predictor over a fresh bar store holding `bars` 15m bars of every symbol."""
+    from predict import StockPredictor
+    clock = ManualClock(pd.Timestamp('2026-01-05').timestamp())
+    fetcher = ReplayFetcher(SyntheticFetcher(), clock)
+    bar_store = BarStore(root=tempfile.mkdtemp(dir=ROOT), fetcher=fetcher, refresh_seconds=0)
+    start = pd.Timestamp(clock(), unit='s') - pd.Timedelta(minutes=15 * bars)
+    for symbol in names:
+        bar_store.append(symbol, fetcher(symbol, start, pd.Timestamp(clock(), unit='s'), '15m'), '15m')
+    predictor = StockPredictor(model_path=os.path.join(ROOT, 'none.pkl'), bar_store=bar_store)
+    predictor.set_model(fake_model(), 'suite')
+    # Materialize history up front; the cases time steady state
+    predictor.predict_batch(names)
+    return predictor, clock
+
+
+def case_predict_single(n, repeat):
+    predictor, clock = stepped_predictor(['AAPL'], n)
+    samples = measure(lambda: predictor.predict_single_stock('AAPL'), repeat, setup=lambda: clock.advance(900))
+    shutil.rmtree(predictor.bar_store.root, ignore_errors=True)
+    return timing_metrics(samples)
+
+
+def case_forest(n, repeat):
+    from forest_engine import CompiledForest
+    model = fake_model()
+    compiled = CompiledForest.from_model(model)
+    X = pd.DataFrame(np.random.default_rng(1).normal(size=(n, len(FEATURES))), columns=FEATURES)
+    expected = model.predict_proba(X)
+    np.testing.assert_allclose(compiled.predict_proba(X), expected, rtol=0, atol=1e-12,
+                               err_msg="Probabilities differ from sklearn")
+    assert (compiled.predict(X) == model.predict(X)).all(), "Classes differ from sklearn"
+    for bad in (X.iloc[:, :-1], X.replace(X.iat[0, 0], np.inf)):
+        try:
+            compiled.predict_proba(bad)
+        except ValueError:
+            continue
+        raise AssertionError("Invalid input was scored")
+    metrics = timing_metrics(measure(lambda: compiled.predict_proba(X), repeat), n)
+    metrics['sklearn_ms'] = float(np.median(measure(lambda: model.predict_proba(X), repeat)) * 1000)
+    return metrics
+
+
+def case_predict_batch(n, repeat):
+    names = symbols(n)
+    predictor, clock = stepped_predictor(names, 1_000)
+    stages = []
+
+    def batch():
+        predictions = predictor.predict_batch(names)
+        assert len(predictions) == n, len(predictions)
+        stages.append(predictor.last_timings)
+
+    samples = measure(batch, repeat, setup=lambda: clock.advance(900))
+    shutil.rmtree(predictor.bar_store.root, ignore_errors=True)
+    metrics = timing_metrics(samples, n)
+    metrics.update({f'{stage}_ms': float(np.median([t[stage] for t in stages]) * 1000)
+                    for stage in ('fetch', 'features', 'inference')})
+    return metrics
+
+
+def case_screener(n, repeat):
+    names = symbols(n)
+    predictor, clock = stepped_predictor(names, 1_100)
+    stages = []
+
+    def scan():
+        ranked = predictor.screen(names)
+        assert len(ranked) == n, len(ranked)
+        stages.append(predictor.last_screen_timings)
+
+    samples = measure(scan, repeat, setup=lambda: clock.advance(900))
+    metrics = timing_metrics(samples, n)
+    metrics.update({f'{stage}_ms': float(np.median([t[stage] for t in stages]) * 1000)
+                    for stage in ('refresh', 'panel', 'features', 'inference')})
+    if n <= 1_000:
+        frames = [predictor.bar_store.window(name, '15m') for name in names]
+        pandas = measure(lambda: [calculate_technical_indicators(df.copy()) for df in frames], 3, min_repeat=1)
+        metrics['pandas_indicators_ms'] = float(np.median(pandas) * 1000)
+    shutil.rmtree(predictor.bar_store.root, ignore_errors=True)
+    return metrics
+
+
+def case_chart_history(n, repeat):
+    import gzip
+    from history import ChartHistory, MinMaxPyramid, lttb
+    from utils import serialization
+    bars = synthetic_ohlcv(n + repeat + 3, start='2020-01-01', freq='15min')
+    bar_store = BarStore(root=tempfile.mkdtemp(dir=ROOT), fetcher=SyntheticFetcher())
+    bar_store.append('CHART', bars.iloc[:n])
+    history = ChartHistory(bar_store)
+    start, end = bars.index[0], bars.index[n - 1]
+    metrics = timing_metrics(measure(lambda: history.query('CHART', start=start, end=end, fetch=False), repeat))
+    candles, _ = history.query('CHART', start=start, end=end, fetch=False)
+    line, _ = history.query('CHART', start=start, end=end, style='line', fetch=False)
+    zoom = bars.index[n - 1 - n // 20]
+    metrics.update({
+        'line_ms': float(np.median(measure(
+            lambda: history.query('CHART', start=start, end=end, style='line', fetch=False), repeat)) * 1000),
+        'zoom_ms': float(np.median(measure(
+            lambda: history.query('CHART', start=zoom, end=end, fetch=False), repeat)) * 1000),
+        'build_ms': float(np.median(measure(
+            lambda: MinMaxPyramid(bar_store.window_arrays('CHART')), 3, min_repeat=1)) * 1000),
+        'points': candles['points'],
+        'candles_bytes': len(serialization.encode(candles)),
+        'candles_gzip_bytes': len(gzip.compress(serialization.encode(candles))),
+        'line_bytes': len(serialization.encode(line)),
+    })
+    arriving = iter(range(n, n + repeat + 3))
+    metrics['update_ms'] = float(np.median(measure(
+        lambda: history.pyramid('CHART'), repeat,
+        setup=lambda: bar_store.append('CHART', bars.iloc[next(arriving):][:1]))) * 1000)
+    if n <= 1_000_000:
+        df = bar_store.window('CHART', end=end)
+        buckets = np.arange(len(df)) // -(-len(df) // candles['points'])
+        aggregate = {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}
+        metrics['naive_candles_ms'] = float(np.median(measure(
+            lambda: df.groupby(buckets).agg(aggregate), 3, min_repeat=1)) * 1000)
+        seconds = (df.index.values.astype(np.int64) - df.index.values[0].astype(np.int64)) / 1e9
+        metrics['naive_line_ms'] = float(np.median(measure(
+            lambda: lttb(seconds, df['Close'].to_numpy(), 300), 3, min_repeat=1)) * 1000)
+    shutil.rmtree(bar_store.root, ignore_errors=True)
+    return metrics
+
+
+def case_trade_history(n, repeat):
+    from routes import trade
+    from trade_journal import trades
+    from utils.trade_journal import TradeJournal
+    journal = TradeJournal(os.path.join(tempfile.mkdtemp(dir=ROOT), 'journal.sqlite'))
+    for chunk in range(0, n, 100_000):
+        journal.append_many(list(trades(chunk, min(100_000, n - chunk))))
+    previous, trade.journal = trade.journal, journal
+    queries = {'tail': {}, 'symbol': {'symbol': 'NVDA'}, 'action': {'action': 'sell'}}
+
+    async def run():
+        results = {}
+        for name, filters in queries.items():
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                rows = await trade.get_trade_history(limit=50, **filters)
+                samples.append(time.perf_counter() - started)
+                assert len(rows) == 50
+            results[name] = samples
+        return results
+
+    try:
+        results = asyncio.run(run())
+    finally:
+        trade.journal = previous
+        journal.close()
+    metrics = timing_metrics(results.pop('tail'))
+    metrics.update({f'{name}_median_ms': float(np.median(samples) * 1000) for name, samples in results.items()})
+    return metrics
+
+
+async def load(client, path, clients, duration):
+    samples, errors, stop = [], [], asyncio.Event()
+
+    async def worker():
+        while not stop.is_set():
+            started = time.perf_counter()
+            response = await client.get(path)
+            (samples if response.status_code == 200 else errors).append(time.perf_counter() - started)
+            # In-process requests that never wait on I/O would otherwise starve the timer
+            await asyncio.sleep(0)
+
+    tasks = [asyncio.create_task(worker()) for _ in range(clients)]
+    await asyncio.sleep(duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return samples, len(errors)
+
+
+def case_endpoints(clients, repeat, duration=1.0):
+    from main import app
+    from routes import ml, trade
+    from trade_journal import trades
+    ml.predictor.set_model(fake_model(), 'suite')
+    trade.broker.set_client(FakeBroker())
+    if trade.journal.count() == 0:
+        trade.journal.append_many(list(trades(0, 100_000)))
+
+    async def run():
+        results = {}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://bench',
+                                     timeout=120) as client:
+            for path in ENDPOINTS:
+                # Warm caches and snapshots the way a running server has them
+                assert (await client.get(path)).status_code == 200, path
+                results[path] = await load(client, path, clients, duration)
+        return results
+
+    metrics = {}
+    for path, (samples, errors) in asyncio.run(run()).items():
+        ms = np.array(samples) * 1000
+        metrics[path] = {'rps': len(ms) / duration, 'p50_ms': float(np.percentile(ms, 50)),
+                         'p95_ms': float(np.percentile(ms, 95)), 'p99_ms': float(np.percentile(ms, 99)),
+                         'errors': errors}
+    return metrics
+
+
+# Run in a fresh interpreter: how long importing the API takes and what it pulls in
+IMPORT_PROBE = '''
+import json, sys, time
+started = time.perf_counter()
+import main
+elapsed = time.perf_counter() - started
+rss = next(int(line.split()[1]) for line in open('/proc/self/status') if line.startswith('VmRSS'))
+print(json.dumps({'seconds': elapsed, 'rss_kb': rss, 'sklearn': 'sklearn' in sys.modules}))
+'''
+
+
+def memory(pid, model_dir):
+    """(RSS, PSS, PSS of files under `model_dir`) of a process in MB, from /proc."""
+    with open(f'/proc/{pid}/smaps_rollup') as f:
+        rollup = {line.split(':')[0]: int(line.split()[1]) for line in f if line.split()[-1] == 'kB'}
+    model, mapped = 0, None
+    with open(f'/proc/{pid}/smaps') as f:
+        for line in f:
+            fields = line.split()
+            if not line[0].isupper() and len(fields) >= 5:
+                # Mapping header: address perms offset dev inode [path]
+                mapped = fields[5] if len(fields) > 5 else None
+            elif fields[0] == 'Pss:' and mapped and mapped.startswith(model_dir):
+                model += int(fields[1])
+    return rollup['Rss'] / 1024, rollup['Pss'] / 1024, model / 1024
+
+
+def case_startup(workers, repeat):
+    from model_registry import ModelRegistry
+    registry = ModelRegistry()
+    if registry.current() is None:
+        registry.register(fake_model(rows=50_000))
+
+    probes = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', IMPORT_PROBE], cwd=BACKEND_DIR, capture_output=True,
+                                text=True, check=True).stdout
+        probes.append(json.loads(output.splitlines()[-1]))
+
+    ready, usage = [], []
+    for _ in range(repeat):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        started = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'main:app', '--port', str(port), '--workers', str(workers),
+             '--ws', 'none', '--no-access-log'],
+            cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        try:
+            serving = 0
+            for line in server.stderr:
+                serving += 'Application startup complete' in line
+                if serving == workers:
+                    break
+            ready.append(time.perf_counter() - started)
+            # Score on the workers, so the model's pages are touched
+            for _ in range(2 * workers):
+                httpx.get(f'http://127.0.0.1:{port}/api/ml/predictions', timeout=300).raise_for_status()
+            with open(f'/proc/{server.pid}/task/{server.pid}/children') as f:
+                pids = [int(pid) for pid in f.read().split()] or [server.pid]
+            usage.append([memory(pid, registry.root) for pid in pids])
+        finally:
+            server.terminate()
+            server.wait()
+
+    metrics = timing_metrics(ready)
+    metrics.update({
+        'import_ms': float(np.median([p['seconds'] for p in probes]) * 1000),
+        'import_rss_mb': float(np.median([p['rss_kb'] for p in probes]) / 1024),
+        'imports_sklearn': any(p['sklearn'] for p in probes),
+        # Per worker, then the model's mapped pages summed over all workers
+        'rss_mb': float(np.median([rss for run in usage for rss, _, _ in run])),
+        'pss_mb': float(np.median([pss for run in usage for _, pss, _ in run])),
+        'model_pss_mb': float(np.median([sum(model for _, _, model in run) for run in usage])),
+    })
+    return metrics
+
+
+# name: (function, ladder, unit, repeats)
+CASES = {
+    'indicators': (case_indicators, 'bars', 'bars', 20),
+    'features': (case_features, 'bars', 'bars', 20),
+    'feature_sync': (case_feature_sync, 'bars', 'bars', 5),
+    'resample': (case_resample, 'bars', 'bars', 20),
+    'forest': (case_forest, 'rows', 'rows', 50),
+    'predict_single': (case_predict_single, 'history', 'bars stored', 50),
+    'predict_batch': (case_predict_batch, 'symbols', 'symbols', 20),
+    'screener': (case_screener, 'symbols', 'symbols', 10),
+    'chart_history': (case_chart_history, 'bars', 'bars', 50),
+    'trade_history': (case_trade_history, 'trades', 'trades', 50),
+    'endpoints': (case_endpoints, 'clients', 'clients', 1),
+    'startup': (case_startup, 'workers', 'workers', 3),
+}
+
+
+def git(*args):
+    try:
+        return subprocess.run(['git', *args], cwd=BACKEND_DIR, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    return {
+        'commit': git('rev-parse', 'HEAD'), 'dirty': bool(git('status', '--porcelain', '--untracked-files=no')),
+        'python': platform.python_version(), 'machine': platform.machine(), 'cpus': os.cpu_count(),
+        'numpy': np.__version__, 'pandas': pd.__version__,
+    }
+
+
+def read_history(path=HISTORY_PATH):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def flatten(metrics, prefix=''):
+    """Metric name -> value, with nested endpoint metrics as 'path:metric'."""
+    flat = {}
+    for name, value in metrics.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{prefix}{name}:'))
+        else:
+            flat[f'{prefix}{name}'] = value
+    return flat
+
+
+def latest_run(history, commit, exclude=None):
+    """Records of the newest run made at `commit` (a full hash or a prefix), other than `exclude`."""
+    runs = [record['run'] for record in history
+            if (record.get('commit') or '').startswith(commit) and record['run'] != exclude]
+    return [record for record in history if runs and record['run'] == runs[-1]]
+
+
+def compare(baseline, current, threshold):
+    """Print latency and throughput changes; return the number of regressions."""
+    before = {(r['case'], r['size']): flatten(r['metrics']) for r in baseline}
+    regressions = 0
+    print(f"\n{'case':15s} {'size':>10s}  {'metric':42s} {'before':>10s} {'after':>10s} {'change':>8s}")
+    for record in current:
+        old = before.get((record['case'], record['size']))
+        if old is None:
+            continue
+        for name, value in flatten(record['metrics']).items():
+            metric = name.split(':')[-1]
+            # Medians for functions; percentiles and rates under load for endpoints
+            if not old.get(name) or not (metric in ('median_ms', 'items_per_s', 'p50_ms', 'rps', 'import_ms', 'pss_mb')
+                                         or metric.endswith('_median_ms') or (metric == 'p95_ms' and ':' in name)):
+                continue
+            change = value / old[name] - 1
+            # Lower is better for times and memory, higher for rates
+            worse = change > threshold if name.endswith(('_ms', '_mb')) else change < -threshold
+            regressions += worse
+            print(f"{record['case']:15s} {record['size']:10d}  {name:42s} {old[name]:10.4g} {value:10.4g} "
+                  f"{change:+7.1%}{'  REGRESSION' if worse else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--ladder', choices=sorted(LADDERS), default='quick')
+    parser.add_argument('--only', help='comma-separated cases (default: all)')
+    parser.add_argument('--sizes', help='comma-separated sizes overriding the ladder of every selected case')
+    parser.add_argument('--repeat', type=int, help='timed repeats per size (default per case)')
+    parser.add_argument('--history', default=HISTORY_PATH, help='JSON lines file results are appended to')
+    parser.add_argument('--compare', metavar='COMMIT', help='compare with the latest recorded run of a commit')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative change reported as a regression')
+    parser.add_argument('--no-run', action='store_true', help='only compare the latest run at HEAD')
+    args = parser.parse_args()
+
+    selected = args.only.split(',') if args.only else list(CASES)
+    unknown = [name for name in selected if name not in CASES]
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(unknown)}")
+
+    history = read_history(args.history)
+    try:
+        if args.no_run:
+            current = latest_run(history, git('rev-parse', 'HEAD') or '')
+        else:
+            current = []
+            env = environment()
+            run = datetime.now().strftime('%Y%m%dT%H%M%S')
+            print(f"commit {(env['commit'] or 'unknown')[:12]}{' (dirty)' if env['dirty'] else ''}, "
+                  f"python {env['python']}, {env['cpus']} cpus, ladder {args.ladder}")
+            for name in selected:
+                fn, ladder, unit, repeat = CASES[name]
+                sizes = [int(size) for size in args.sizes.split(',')] if args.sizes else LADDERS[args.ladder][ladder]
+                for size in sizes:
+                    started = time.perf_counter()
+                    metrics = fn(size, args.repeat or repeat)
+                    record = {'run': run, 'time': datetime.now().isoformat(timespec='seconds'), **env,
+                              'ladder': args.ladder, 'case': name, 'size': size, 'unit': unit, 'metrics': metrics}
+                    current.append(record)
+                    os.makedirs(os.path.dirname(os.path.abspath(args.history)), exist_ok=True)
+                    with open(args.history, 'a') as f:
+                        f.write(json.dumps(record) + '\n')
+                    if name == 'endpoints':
+                        for path, m in metrics.items():
+                            print(f"  {name:15s} {size:>10,} {unit:12s} {path:42s} {m['rps']:8.0f} req/s  "
+                                  f"p50={m['p50_ms']:7.2f}ms  p95={m['p95_ms']:7.2f}ms  p99={m['p99_ms']:7.2f}ms")
+                    elif name == 'screener':
+                        pandas = (f"  per-symbol pandas indicators={metrics['pandas_indicators_ms']:.0f}ms"
+                                  if 'pandas_indicators_ms' in metrics else '')
+                        print(f"  {name:15s} {size:>10,} {unit:12s} median={metrics['median_ms']:9.3f}ms  "
+                              f"refresh={metrics['refresh_ms']:.0f}ms panel={metrics['panel_ms']:.0f}ms "
+                              f"features={metrics['features_ms']:.0f}ms inference={metrics['inference_ms']:.0f}ms{pandas}")
+                    elif name == 'chart_history':
+                        naive = (f"  from every bar: candles={metrics['naive_candles_ms']:.1f}ms "
+                                 f"line={metrics['naive_line_ms']:.1f}ms" if 'naive_candles_ms' in metrics else '')
+                        print(f"  {name:15s} {size:>10,} {unit:12s} candles={metrics['median_ms']:7.3f}ms  "
+                              f"line={metrics['line_ms']:7.3f}ms  zoom={metrics['zoom_ms']:7.3f}ms  "
+                              f"build={metrics['build_ms']:.1f}ms  new bar={metrics['update_ms']:.3f}ms  "
+                              f"{metrics['points']} candles={metrics['candles_bytes']:,}B "
+                              f"({metrics['candles_gzip_bytes']:,}B gzip)  line={metrics['line_bytes']:,}B{naive}")
+                    elif name == 'forest':
+                        print(f"  {name:15s} {size:>10,} {unit:12s} median={metrics['median_ms']:9.3f}ms  "
+                              f"sklearn={metrics['sklearn_ms']:9.3f}ms  "
+                              f"{metrics['sklearn_ms'] / metrics['median_ms']:.1f}x, probabilities match")
+                    elif name == 'resample':
+                        print(f"  {name:15s} {size:>10,} {unit:12s} median={metrics['median_ms']:9.3f}ms  "
+                              f"{metrics['items_per_s']:12,.0f} bars/s  one new bar, all timeframes: "
+                              f"{metrics['update_ms']:.3f}ms")
+                    elif name == 'startup':
+                        print(f"  {name:15s} {size:>10,} {unit:12s} ready={metrics['median_ms']:7.0f}ms  "
+                              f"import={metrics['import_ms']:5.0f}ms ({metrics['import_rss_mb']:.0f}MB"
+                              f"{', sklearn' if metrics['imports_sklearn'] else ''})  per worker: "
+                              f"rss={metrics['rss_mb']:.0f}MB pss={metrics['pss_mb']:.0f}MB  "
+                              f"model pss over all workers={metrics['model_pss_mb']:.1f}MB")
+                    else:
+                        rate = f"  {metrics['items_per_s']:12,.0f} {unit.split()[0]}/s" if 'items_per_s' in metrics else ''
+                        print(f"  {name:15s} {size:>10,} {unit:12s} median={metrics['median_ms']:9.3f}ms  "
+                              f"p95={metrics['p95_ms']:9.3f}ms{rate}  ({time.perf_counter() - started:.1f}s)")
+        if args.compare:
+            commit = git('rev-parse', args.compare) or args.compare
+            baseline = latest_run(history, commit, exclude=current[0]['run'] if current else None)
+            if not baseline:
+                print(f"no recorded run for {args.compare} in {args.history}")
+                sys.exit(2)
+            regressions = compare(baseline, current, args.threshold)
+            print(f"\n{regressions} regression(s) beyond {args.threshold:.0%} vs {commit[:12]}")
+            sys.exit(1 if regressions else 0)
+    finally:
+        shutil.rmtree(ROOT, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+"""Benchmark: /api/trade/trades latency as the trade log grows to millions of rows.
+
+Grows a CSV trade log and a trade journal side by side and, at each size,
+times the previous CSV tail read and the `/api/trade/trades` endpoint
+(in-process) for the newest trades, a symbol, an action and a time range.
+Also imports a CSV with the one-shot importer and checks that several
+processes appending at once lose no trades.
+
+    python benchmarks/trade_journal.py --sizes 10000,100000,1000000,3000000
+"""
+import os
+import csv
+import sys
+import time
+import shutil
+import asyncio
+import argparse
+import tempfile
+import multiprocessing
+from datetime import datetime, timedelta
+
+import httpx
+import numpy as np
+from fastapi import FastAPI
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+from utils.trade_journal import FIELDS, TradeJournal
+
+SYMBOLS = ['AAPL', 'MSFT', 'TSLA', 'AMZN', 'GOOGL', 'NVDA', 'META', 'NFLX', 'AMD', 'BABA']
+EPOCH = datetime(2020, 1, 1)
+
+
+def trades(start, count):
+    """Deterministic synthetic trades numbered from `start`, one minute apart."""
+    for i in range(start, start + count):
+        yield {
+            'timestamp': (EPOCH + timedelta(minutes=i)).isoformat(),
+            'symbol': SYMBOLS[i % len(SYMBOLS)],
+            'action': 'buy' if i % 2 == 0 else 'sell',
+            'quantity': 1,
+            'price': round(100 + (i % 1000) / 10, 2),
+            'signal_confidence': 70 + i % 30,
+        }
+
+
+def read_csv_tail(path, limit):
+    """The previous `read_trade_log`: parse the whole file, keep the last rows."""
+    with open(path, 'r') as f:
+        return list(csv.DictReader(f))[-limit:]
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return np.median(samples) * 1000
+
+
+def append_worker(path, worker, count):
+    journal = TradeJournal(path)
+    for trade in trades(10**9 + worker * count, count):
+        journal.append(trade)
+    journal.close()
+
+
+async def endpoint_latencies(app, size, repeat):
+    middle = (EPOCH + timedelta(minutes=size // 2)).isoformat()
+    until = (EPOCH + timedelta(minutes=size // 2 + 60)).isoformat()
+    queries = {
+        'tail': '/api/trade/trades?limit=50',
+        'symbol': '/api/trade/trades?limit=50&symbol=NVDA',
+        'action': '/api/trade/trades?limit=50&action=sell',
+        'range': f'/api/trade/trades?limit=50&start={middle}&end={until}',
+    }
+    results = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url='http://bench') as client:
+        for name, url in queries.items():
+            samples = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                response = await client.get(url)
+                samples.append(time.perf_counter() - started)
+                assert response.status_code == 200 and len(response.json()) == 50, (url, response.text[:200])
+            results[name] = np.median(samples) * 1000
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,100000,1000000,3000000')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--csv-max', type=int, default=1000000, help='largest log to time the CSV read on')
+    parser.add_argument('--writers', type=int, default=4)
+    args = parser.parse_args()
+    sizes = sorted(int(size) for size in args.sizes.split(','))
+
+    root = tempfile.mkdtemp(prefix='journal-')
+    try:
+        from routes import trade
+        trade.journal = journal = TradeJournal(os.path.join(root, 'journal.sqlite'))
+        app = FastAPI()
+        app.include_router(trade.router, prefix='/api/trade')
+
+        csv_path = os.path.join(root, 'trade_log.csv')
+        with open(csv_path, 'w', newline='') as f:
+            csv.DictWriter(f, fieldnames=FIELDS).writeheader()
+
+        print(f"{'rows':>9}  {'csv tail':>9}  {'tail':>7}  {'symbol':>7}  {'action':>7}  {'range':>7}  (median ms)")
+        size = 0
+        for target in sizes:
+            for chunk in range(size, target, 100000):
+                batch = list(trades(chunk, min(100000, target - chunk)))
+                if target <= args.csv_max:
+                    with open(csv_path, 'a', newline='') as f:
+                        csv.DictWriter(f, fieldnames=FIELDS).writerows(batch)
+                journal.append_many(batch)
+            size = target
+            csv_ms = timed(lambda: read_csv_tail(csv_path, 50), 3) if size <= args.csv_max else None
+            endpoint = asyncio.run(endpoint_latencies(app, size, args.repeat))
+            print(f"{size:9d}  {f'{csv_ms:9.1f}' if csv_ms is not None else '        -'}  "
+                  + '  '.join(f"{endpoint[name]:7.2f}" for name in ('tail', 'symbol', 'action', 'range')))
+
+        # One-shot import of the legacy CSV
+        imported = TradeJournal(os.path.join(root, 'imported.sqlite'))
+        started = time.perf_counter()
+        rows = imported.import_csv(csv_path)
+        elapsed = time.perf_counter() - started
+        assert imported.import_csv(csv_path) == 0
+        assert imported.query(1)[0]['timestamp'] == read_csv_tail(csv_path, 1)[0]['timestamp']
+        print(f"imported {rows} CSV rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s); re-import skipped")
+        imported.close()
+
+        # Concurrent appends from several processes, as from uvicorn workers
+        path = os.path.join(root, 'shared.sqlite')
+        count = 500
+        started = time.perf_counter()
+        workers = [multiprocessing.Process(target=append_worker, args=(path, w, count)) for w in range(args.writers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        shared = TradeJournal(path)
+        total = shared.count()
+        assert total == args.writers * count, total
+        print(f"{args.writers} processes appended {total} trades one at a time in "
+              f"{time.perf_counter() - started:.1f}s, none lost")
+        shared.close()
+        journal.close()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Benchmark: TrainingPipeline vs the previous one-symbol-at-a-time training loop.
+
+Both build the training set for the same synthetic universe from an empty
+bar store, with a simulated per-download latency, and fit the same forest.
+
+    python benchmarks/train_scale.py --symbols 200 --fetch-delay 0.3
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import itertools
+import string
+
+import pandas as pd
+from sklearn.ensemble import RandomForestClassifier
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ml'))
+
+from bar_store import BarStore, SyntheticFetcher
+from train_model import calculate_technical_indicators, create_labels, prepare_features
+from training_pipeline import TrainingPipeline
+
+
+class SlowFetcher:
+    """Synthetic bars behind a fixed download latency; picklable for worker processes."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.synthetic = SyntheticFetcher()
+
+    def __call__(self, symbol, start, end, interval):
+        time.sleep(self.delay)
+        return self.synthetic(symbol, start, end, interval)
+
+
+def sequential(symbols, store):
+    """The previous train_model loop: fetch, featurize and concat one symbol at a time."""
+    timings = {}
+    started = time.perf_counter()
+    all_features, all_labels = [], []
+    for symbol in symbols:
+        df = store.load(symbol, interval='1d', lookback_days=180)
+        df = create_labels(calculate_technical_indicators(df))
+        X = prepare_features(df)
+        y = df['Label']
+        valid_idx = ~(X.isna().any(axis=1) | y.isna())
+        all_features.append(X[valid_idx])
+        all_labels.append(y[valid_idx])
+    X = pd.concat(all_features)
+    y = pd.concat(all_labels)
+    timings['dataset'] = time.perf_counter() - started
+    started = time.perf_counter()
+    RandomForestClassifier(n_estimators=100, max_depth=10, random_state=42).fit(X, y)
+    timings['fit'] = time.perf_counter() - started
+    return timings, len(y)
+
+
+def pipelined(symbols, store, process_workers):
+    pipeline = TrainingPipeline(bar_store=store, process_workers=process_workers)
+    timings = {}
+    started = time.perf_counter()
+    X, y, features = pipeline.build_dataset(symbols)
+    timings['dataset'] = time.perf_counter() - started
+    started = time.perf_counter()
+    RandomForestClassifier(n_estimators=100, max_depth=10, random_state=42, n_jobs=-1).fit(
+        pd.DataFrame(X, columns=features, copy=False), y
+    )
+    timings['fit'] = time.perf_counter() - started
+    return timings, len(y)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--symbols', type=int, default=200)
+    parser.add_argument('--fetch-delay', type=float, default=0.3, help='simulated download time per symbol (s)')
+    parser.add_argument('--process-workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    symbols = [''.join(p) for p in itertools.islice(itertools.product(string.ascii_uppercase, repeat=3), args.symbols)]
+    print(f"{args.symbols} symbols, {args.fetch_delay * 1000:.0f} ms per download, "
+          f"{os.cpu_count()} cores, {args.process_workers} worker processes")
+    for name, run in (('sequential', lambda store: sequential(symbols, store)),
+                      ('pipeline', lambda store: pipelined(symbols, store, args.process_workers))):
+        root = tempfile.mkdtemp(prefix='bars-')
+        try:
+            store = BarStore(root=root, fetcher=SlowFetcher(args.fetch_delay), fetch_concurrency=16)
+            timings, rows = run(store)
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+        print(f"  {name:10s} dataset={timings['dataset']:7.2f}s  fit={timings['fit']:7.2f}s  "
+              f"total={sum(timings.values()):7.2f}s  rows={rows}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,11 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from routes import ml, trade, settings
+from utils import executor, metrics, profiler
+from utils.executor import run_blocking
 from dotenv import load_dotenv
+import time
 import os
 
 # Load environment variables
@@ -21,6 +25,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],  # Lets the frontend revalidate polls with If-None-Match
 )
 
 # Include routers
@@ -28,11 +33,79 @@ app.include_router(ml.router, prefix="/api/ml", tags=["ML Predictions"])
 app.include_router(trade.router, prefix="/api/trade", tags=["Paper Trading"])
 app.include_router(settings.router, prefix="/api/settings", tags=["Settings"])
 
+# Path template of each route by endpoint, built on first use once every router is included
+_templates = {}
+
+def route_template(scope) -> str:
+    """Path template of the route that served a request, e.g. /api/ml/predictions/{symbol}.
+
+    Taken from the matched route itself (this Starlette leaves only its
+    endpoint in the scope), so every symbol shares one label.
+    """
+    if 'endpoint' not in scope:
+        return 'unmatched'
+    if 'route' in scope:
+        return scope['route'].path
+    if not _templates:
+        _templates.update((route.endpoint, route.path) for route in app.routes if hasattr(route, 'endpoint'))
+    return _templates.get(scope['endpoint'], 'unmatched')
+
+class RequestMetrics:
+    """Latency histogram per route, requests in flight, and opt-in profiles of slow requests.
+
+    Plain ASGI middleware: `@app.middleware("http")` would add a task and a
+    copy of the response stream to every request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+        method = scope['method']
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message['type'] == 'http.response.start':
+                status = message['status']
+            await send(message)
+
+        sampler = profiler.profile_request()
+        metrics.HTTP_IN_FLIGHT.inc(method=method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            # Routing has run by now and left the matched route in the scope
+            route = route_template(scope)
+            metrics.HTTP_IN_FLIGHT.dec(method=method)
+            metrics.HTTP_SECONDS.observe(elapsed, method=method, route=route, status=str(status))
+            if sampler is not None:
+                await run_blocking(profiler.finish_request, sampler, elapsed, method, route)
+
+app.add_middleware(RequestMetrics)
+
+def executor_metrics():
+    """Calls in flight per upstream concurrency limit of the shared executor."""
+    upstreams = executor.stats()['upstreams']
+    return [('stockgenie_executor_in_flight', 'gauge', 'Blocking calls in flight per upstream limit',
+             [({'upstream': name}, u['limit'] - u['available']) for name, u in upstreams.items()])]
+
+metrics.registry.add_collector(executor_metrics)
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "message": "TradeGenie API is running"}
 
+@app.get("/metrics")
+async def get_metrics():
+    """Latency histograms, cache counters, in-flight gauges and upstream errors (Prometheus text format)."""
+    return Response(metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 # Verify API keys on startup
 @app.on_event("startup")
 async def startup_event():
@@ -46,6 +119,33 @@ async def startup_event():
     
     if missing_vars:
         print(f"Warning: Missing environment variables: {', '.join(missing_vars)}")
+    
+    # One pooled HTTP client for all LLM calls
+    await ml.ai.start()
+    
+    # Recompute signals on every bar close off the request path
+    if os.getenv('SIGNAL_SCHEDULER_ENABLED', 'true').lower() == 'true':
+        ml.scheduler.start()
+    
+    # Hot-swap newly promoted model versions without a restart
+    ml.start_model_watcher()
+    
+    # One-shot migration of the old CSV trade log into the journal
+    try:
+        await run_blocking(trade.import_legacy_log)
+    except Exception as e:
+        print(f"Trade log import failed: {str(e)}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await ml.scheduler.stop()
+    await ml.stop_model_watcher()
+    await ml.ai.aclose()
+    if ml.llm_cache is not None:
+        ml.llm_cache.close()
+    trade.journal.close()
+    trade.broker.close()
+    executor.shutdown()
 
 if __name__ == "__main__":
     import uvicorn
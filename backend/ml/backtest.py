@@ -0,0 +1,441 @@
+import os
+import json
+import time
+import shutil
+import argparse
+import itertools
+import tempfile
+import multiprocessing
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.ensemble import RandomForestClassifier
+from bar_store import BarStore
+from feature_store import FeatureStore, normalize
+from train_model import STOCKS, FEATURES, LABEL_HORIZON, label_threshold as interval_label_threshold
+
+# Worker processes for panel building and parameter sweeps (default: one per core)
+BACKTEST_WORKERS = int(os.getenv('BACKTEST_WORKERS', str(os.cpu_count() or 1)))
+
+# Parameters that change the walk-forward predictions; the rest only change trading
+MODEL_PARAMS = ('label_threshold', 'train_days', 'retrain_days', 'n_estimators', 'max_depth', 'max_train_rows')
+
+DEFAULT_PARAMS = {
+    # None: label_threshold() of the panel's interval, as training uses
+    'label_threshold': None,
+    'train_days': 60,
+    'retrain_days': 10,
+    'n_estimators': 100,
+    'max_depth': 10,
+    'max_train_rows': 50000,
+    'confidence_threshold': 70,
+    'fill': 'next_open',
+    'slippage_bps': 0.0,
+}
+
+_DAY_NS = 86400 * 10**9
+_PANEL_ARRAYS = ('symbol', 'time', 'open', 'close', 'features', 'forward_return', 'label_time', 'ready')
+
+
+def symbol_panel(feature_store, symbol, interval='15m', start=None, end=None):
+    """Raw features and label inputs for one symbol, as views of the stores.
+
+    Features are materialized for any bars the feature store has not seen;
+    rows are `ready` once every indicator has enough history.
+    """
+    feature_store.sync(symbol, interval)
+    features = feature_store.window_arrays(symbol, interval, start=start, end=end)
+    times = features['index']
+    bars = feature_store.bar_store.window_arrays(symbol, interval, start=start, end=end)
+    if not np.array_equal(bars['index'], times):
+        raise ValueError(f"Bars for {symbol} changed while reading features")
+    close = bars['Close']
+    forward_return = np.full(len(times), np.nan, dtype=np.float32)
+    forward_return[:-LABEL_HORIZON] = close[LABEL_HORIZON:] / close[:-LABEL_HORIZON] - 1
+    label_time = np.full(len(times), -1, dtype=np.int64)
+    label_time[:-LABEL_HORIZON] = times[LABEL_HORIZON:]
+    ready = np.ones(len(times), dtype=bool)
+    for name in FEATURES:
+        ready &= ~np.isnan(features[name])
+    return {
+        'time': times,
+        'open': bars['Open'],
+        'close': close,
+        'features': features,
+        'forward_return': forward_return,
+        'label_time': label_time,
+        'ready': ready,
+    }
+
+
+def symbol_stats(features, symbol, rows, n_symbols):
+    """Per-symbol mean and std (ddof=1, NaNs skipped) of raw features over `rows`.
+
+    The walk-forward counterpart of the statistics training fits for each
+    symbol; returns two (n_symbols, n_features) arrays.
+    """
+    X = np.asarray(features[rows], dtype=np.float64)
+    groups = symbol[rows]
+    valid = ~np.isnan(X)
+    X = np.where(valid, X, 0.0)
+    mean = np.empty((n_symbols, X.shape[1]))
+    std = np.empty((n_symbols, X.shape[1]))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for j in range(X.shape[1]):
+            count = np.bincount(groups, weights=valid[:, j], minlength=n_symbols)
+            mean[:, j] = np.bincount(groups, weights=X[:, j], minlength=n_symbols) / count
+            deviation = np.where(valid[:, j], X[:, j] - mean[groups, j], 0.0)
+            std[:, j] = np.sqrt(np.bincount(groups, weights=deviation ** 2, minlength=n_symbols) / (count - 1))
+    return mean, std
+
+
+class Panel:
+    """Bars, raw features and label inputs for many symbols in flat arrays.
+
+    Rows are grouped by symbol and sorted by time within each symbol, so
+    every step of the backtest is a whole-array NumPy operation.
+    """
+
+    def __init__(self, arrays, symbols, interval):
+        for name in _PANEL_ARRAYS:
+            setattr(self, name, arrays[name])
+        self.symbols = list(symbols)
+        self.interval = interval
+        # First row of each symbol's block
+        self.starts = np.r_[True, self.symbol[1:] != self.symbol[:-1]] if len(self.symbol) else np.zeros(0, bool)
+
+    def __len__(self):
+        return len(self.time)
+
+    @classmethod
+    def build(cls, symbols, bar_store=None, interval='15m', start=None, end=None, workers=None, feature_store=None):
+        """Read stored bars (no network) and their materialized features for every symbol.
+
+        Only bars the feature store has not seen yet are featurized, across
+        `workers` processes; everything else is read from the mappings.
+        """
+        feature_store = feature_store or FeatureStore(bar_store or BarStore())
+        workers = BACKTEST_WORKERS if workers is None else workers
+        names = []
+        for symbol in symbols:
+            if len(feature_store.bar_store.window_arrays(symbol, interval, start=start, end=end)['index']) > LABEL_HORIZON:
+                names.append(symbol.upper())
+            else:
+                print(f"No stored {interval} bars for {symbol}, skipping")
+        if not names:
+            raise ValueError('No stored bars for any symbol')
+        if workers > 1 and len(names) > 1:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+                list(pool.map(feature_store.sync, names, [interval] * len(names)))
+        parts = {symbol: symbol_panel(feature_store, symbol, interval, start, end) for symbol in names}
+
+        # One preallocated array per field, filled symbol by symbol straight from the views
+        total = sum(len(part['time']) for part in parts.values())
+        first = next(iter(parts.values()))
+        arrays = {'symbol': np.empty(total, dtype=np.int32),
+                  'features': np.empty((total, len(FEATURES)), dtype=np.float32)}
+        for name, arr in first.items():
+            if name != 'features':
+                arrays[name] = np.empty(total, dtype=arr.dtype)
+        offset = 0
+        for i, part in enumerate(parts.values()):
+            n = len(part['time'])
+            arrays['symbol'][offset:offset + n] = i
+            for name, arr in part.items():
+                if name == 'features':
+                    for j, feature in enumerate(FEATURES):
+                        arrays['features'][offset:offset + n, j] = arr[feature]
+                else:
+                    arrays[name][offset:offset + n] = arr
+            offset += n
+        return cls(arrays, parts.keys(), interval)
+
+    def save(self, path):
+        os.makedirs(path, exist_ok=True)
+        for name in _PANEL_ARRAYS:
+            np.save(os.path.join(path, f'{name}.npy'), getattr(self, name))
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump({'symbols': self.symbols, 'interval': self.interval}, f)
+
+    @classmethod
+    def load(cls, path):
+        """Open a saved panel with every array memory-mapped read-only."""
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in _PANEL_ARRAYS}
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        return cls(arrays, meta['symbols'], meta['interval'])
+
+    def shift(self, values, fill=0):
+        """Previous row's value within each symbol (`fill` on a symbol's first row)."""
+        previous = np.empty_like(values)
+        previous[1:] = values[:-1]
+        previous[self.starts] = fill
+        return previous
+
+
+def walk_forward(panel, label_threshold=None, train_days=60, retrain_days=10, n_estimators=100,
+                 max_depth=10, max_train_rows=50000, seed=42, n_jobs=-1):
+    """Out-of-sample signals from a model retrained every `retrain_days`.
+
+    Each fold fits the live model on the preceding `train_days` of rows
+    whose label horizon ends before the fold starts, then scores every row
+    in the fold in one call. As in training, each symbol's features are
+    normalized with statistics fitted on its training rows only. Returns
+    (signal, confidence, folds); rows without a prediction are Hold with
+    zero confidence. `label_threshold` defaults to the one training uses for
+    the panel's interval.
+    """
+    if label_threshold is None:
+        label_threshold = interval_label_threshold(panel.interval)
+    labels = np.where(panel.forward_return > label_threshold, 1,
+                      np.where(panel.forward_return < -label_threshold, -1, 0)).astype(np.int8)
+    signal = np.zeros(len(panel), dtype=np.int8)
+    confidence = np.zeros(len(panel), dtype=np.float32)
+    ready = np.asarray(panel.ready)
+    if not ready.any():
+        return signal, confidence, 0
+    times = np.asarray(panel.time)
+    label_time = np.asarray(panel.label_time)
+    train_ns, step_ns = int(train_days * _DAY_NS), int(retrain_days * _DAY_NS)
+    rng = np.random.default_rng(seed)
+    fold_start = times[ready].min() + train_ns
+    last = times.max()
+    folds = 0
+    while fold_start <= last:
+        test = np.flatnonzero(ready & (times >= fold_start) & (times < fold_start + step_ns))
+        train = np.flatnonzero(ready & (times >= fold_start - train_ns) & (label_time >= 0) & (label_time < fold_start))
+        if len(test) and len(train) and len(np.unique(labels[train])) > 1:
+            mean, std = symbol_stats(panel.features, panel.symbol, train, len(panel.symbols))
+            if len(train) > max_train_rows:
+                train = np.sort(rng.choice(train, max_train_rows, replace=False))
+            model = RandomForestClassifier(
+                n_estimators=n_estimators, max_depth=max_depth, random_state=42, n_jobs=n_jobs
+            )
+            model.fit(_normalized(panel, train, mean, std), labels[train])
+            probabilities = model.predict_proba(_normalized(panel, test, mean, std))
+            signal[test] = model.classes_[probabilities.argmax(axis=1)]
+            confidence[test] = probabilities.max(axis=1) * 100
+            folds += 1
+        fold_start += step_ns
+    return signal, confidence, folds
+
+
+def _normalized(panel, rows, mean, std):
+    groups = panel.symbol[rows]
+    return normalize(panel.features[rows], {'mean': mean[groups], 'std': std[groups]})
+
+
+def simulate(panel, signal, confidence, confidence_threshold=70, fill='next_open',
+             slippage_bps=0.0, quantity=1, initial_capital=100000.0):
+    """Apply the paper-trading rules to every symbol and bar at once.
+
+    Same rules as `routes/trade.py`: a qualifying Buy opens `quantity`
+    shares when flat, a qualifying Sell closes the whole position when
+    held, anything else keeps the position. The position is therefore the
+    last qualifying action carried forward within each symbol. Orders fill
+    at the next bar's open (`fill='next_open'`) or at the signal bar's close.
+    """
+    qualifies = confidence >= confidence_threshold
+    action = np.where(qualifies & (signal == 1), 1, np.where(qualifies & (signal == -1), 0, -1)).astype(np.int8)
+
+    # Forward fill the last action within each symbol, starting flat
+    marked = (action >= 0) | panel.starts
+    last_marked = np.maximum.accumulate(np.where(marked, np.arange(len(action)), 0))
+    position = np.maximum(action, 0)[last_marked]
+
+    close = np.asarray(panel.close)
+    open_ = np.asarray(panel.open)
+    previous_close = panel.shift(close, fill=np.nan)
+    if fill == 'next_open':
+        held = panel.shift(position)
+        was_held = panel.shift(held)
+        pnl = np.where(was_held == 1, open_ - previous_close, 0.0) + held * (close - open_)
+        fill_price = open_
+    elif fill == 'close':
+        held = position
+        was_held = panel.shift(held)
+        pnl = np.where(was_held == 1, close - previous_close, 0.0)
+        fill_price = close
+    else:
+        raise ValueError(f"Unknown fill: {fill}")
+
+    change = held.astype(np.int8) - was_held
+    entries = np.flatnonzero(change == 1)
+    exits = np.flatnonzero(change == -1)
+    # Positions still open at a symbol's last bar are marked at its close
+    ends = np.r_[np.flatnonzero(panel.starts)[1:] - 1, len(held) - 1] if len(held) else np.zeros(0, int)
+    still_open = ends[held[ends] == 1]
+
+    pnl = pnl * quantity
+    trade_cost = fill_price * quantity * slippage_bps / 1e4
+    pnl[entries] -= trade_cost[entries]
+    pnl[exits] -= trade_cost[exits]
+
+    # Portfolio equity per timestamp across all symbols
+    times, inverse = np.unique(panel.time, return_inverse=True)
+    equity = initial_capital + np.cumsum(np.bincount(inverse, weights=pnl, minlength=len(times)))
+
+    exit_rows = np.sort(np.r_[exits, still_open])
+    closed = np.isin(exit_rows, exits)
+    exit_prices = np.where(closed, fill_price[exit_rows], close[exit_rows])
+    entry_prices = fill_price[entries]
+    trade_pnl = ((exit_prices - entry_prices) * quantity
+                 - trade_cost[entries] - np.where(closed, trade_cost[exit_rows], 0.0))
+    # A row holding a signal issues the order; with next-open fills that is the bar before
+    signal_rows = entries - 1 if fill == 'next_open' else entries
+    trades = pd.DataFrame({
+        'symbol': np.asarray(panel.symbols, dtype=object)[panel.symbol[entries]],
+        'entry_time': pd.to_datetime(panel.time[entries]),
+        'entry_price': entry_prices,
+        'exit_time': pd.to_datetime(panel.time[exit_rows]),
+        'exit_price': exit_prices,
+        'quantity': quantity,
+        'pnl': trade_pnl,
+        'return_pct': (exit_prices / entry_prices - 1) * 100,
+        'bars_held': exit_rows - entries,
+        'signal_confidence': confidence[signal_rows],
+        'open': ~closed,
+    })
+    equity_curve = pd.Series(equity, index=pd.to_datetime(times), name='equity')
+    return {'stats': summarize(equity_curve, trades, held, initial_capital), 'equity': equity_curve, 'trades': trades}
+
+
+def summarize(equity, trades, held, initial_capital):
+    values = equity.to_numpy()
+    returns = np.diff(values) / values[:-1] if len(values) > 1 else np.zeros(0)
+    years = (equity.index[-1] - equity.index[0]).total_seconds() / (365.25 * 86400) if len(values) > 1 else 0
+    periods_per_year = len(returns) / years if years else 0
+    drawdown = values / np.maximum.accumulate(values) - 1 if len(values) else np.zeros(0)
+    wins = trades['pnl'][trades['pnl'] > 0].sum()
+    losses = -trades['pnl'][trades['pnl'] < 0].sum()
+    return {
+        'final_equity': round(float(values[-1]), 2) if len(values) else initial_capital,
+        'net_pnl': round(float(values[-1] - initial_capital), 2) if len(values) else 0.0,
+        'total_return_pct': round(float(values[-1] / initial_capital - 1) * 100, 4) if len(values) else 0.0,
+        'sharpe': round(float(returns.mean() / returns.std() * np.sqrt(periods_per_year)), 4)
+        if len(returns) > 1 and returns.std() > 0 else 0.0,
+        'max_drawdown_pct': round(float(drawdown.min()) * 100, 4) if len(drawdown) else 0.0,
+        'trades': int(len(trades)),
+        'win_rate_pct': round(float((trades['pnl'] > 0).mean()) * 100, 2) if len(trades) else 0.0,
+        'avg_trade_pnl': round(float(trades['pnl'].mean()), 4) if len(trades) else 0.0,
+        'profit_factor': round(float(wins / losses), 4) if losses > 0 else None,
+        'avg_bars_held': round(float(trades['bars_held'].mean()), 2) if len(trades) else 0.0,
+        'exposure_pct': round(float(held.mean()) * 100, 2) if len(held) else 0.0,
+    }
+
+
+def _run_group(panel, model_params, trade_param_sets, n_jobs):
+    if isinstance(panel, str):
+        panel = Panel.load(panel)
+    started = time.perf_counter()
+    signal, confidence, folds = walk_forward(panel, n_jobs=n_jobs, **model_params)
+    walk_seconds = time.perf_counter() - started
+    results = []
+    for trade_params in trade_param_sets:
+        started = time.perf_counter()
+        result = simulate(panel, signal, confidence, **trade_params)
+        result['params'] = dict(model_params, **trade_params)
+        result['folds'] = folds
+        result['timings'] = {'walk_forward': round(walk_seconds, 3), 'simulate': round(time.perf_counter() - started, 3)}
+        results.append(result)
+    return results
+
+
+def default_params(interval):
+    """DEFAULT_PARAMS with the label threshold resolved for `interval` bars."""
+    params = dict(DEFAULT_PARAMS)
+    if params['label_threshold'] is None:
+        params['label_threshold'] = round(float(interval_label_threshold(interval)), 6)
+    return params
+
+
+def run_backtests(panel, param_sets, workers=None):
+    """Backtest every parameter set, in parallel across processes.
+
+    Sets that share model parameters share one walk-forward run and only
+    differ in the (cheap) trading simulation.
+    """
+    workers = BACKTEST_WORKERS if workers is None else workers
+    groups = {}
+    for params in param_sets:
+        params = dict(default_params(panel.interval), **params)
+        model_params = tuple((name, params[name]) for name in MODEL_PARAMS)
+        groups.setdefault(model_params, []).append({k: v for k, v in params.items() if k not in MODEL_PARAMS})
+
+    if workers <= 1 or len(groups) == 1:
+        return [result for model_params, trades in groups.items()
+                for result in _run_group(panel, dict(model_params), trades, n_jobs=-1)]
+
+    # Workers map the panel from disk instead of each receiving a pickled copy
+    path = tempfile.mkdtemp(prefix='panel-')
+    try:
+        panel.save(path)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            jobs = [pool.submit(_run_group, path, dict(model_params), trades, 1) for model_params, trades in groups.items()]
+            return [result for job in jobs for result in job.result()]
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def parameter_grid(**options):
+    """Cartesian product of comma-separated option values."""
+    names = [name for name, values in options.items() if values]
+    values = [options[name] for name in names]
+    return [dict(zip(names, combo)) for combo in itertools.product(*values)]
+
+
+def main():
+    from training_pipeline import load_universe
+
+    def floats(text):
+        return [float(v) for v in text.split(',')] if text else None
+
+    def ints(text):
+        return [int(v) for v in text.split(',')] if text else None
+
+    parser = argparse.ArgumentParser(description='Walk-forward backtest of the live signals on locally stored bars.')
+    parser.add_argument('--universe', help='text/CSV file of tickers (default: the built-in watch list)')
+    parser.add_argument('--interval', default='15m')
+    parser.add_argument('--start')
+    parser.add_argument('--end')
+    parser.add_argument('--confidence', type=floats, help='e.g. 60,70,80')
+    parser.add_argument('--label-threshold', type=floats)
+    parser.add_argument('--train-days', type=floats)
+    parser.add_argument('--retrain-days', type=floats)
+    parser.add_argument('--fill', choices=['next_open', 'close'])
+    parser.add_argument('--slippage-bps', type=floats)
+    parser.add_argument('--max-train-rows', type=ints)
+    parser.add_argument('--workers', type=int, default=BACKTEST_WORKERS)
+    parser.add_argument('--save', help='directory for per-run stats, equity and trades')
+    args = parser.parse_args()
+
+    symbols = load_universe(args.universe) if args.universe else STOCKS
+    started = time.perf_counter()
+    panel = Panel.build(symbols, interval=args.interval, start=args.start, end=args.end, workers=args.workers)
+    print(f"Panel: {len(panel)} bars, {len(panel.symbols)} symbols, built in {time.perf_counter() - started:.2f}s")
+
+    grid = parameter_grid(
+        confidence_threshold=args.confidence, label_threshold=args.label_threshold,
+        train_days=args.train_days, retrain_days=args.retrain_days,
+        fill=[args.fill] if args.fill else None, slippage_bps=args.slippage_bps,
+        max_train_rows=args.max_train_rows
+    ) or [{}]
+    started = time.perf_counter()
+    results = run_backtests(panel, grid, workers=args.workers)
+    defaults = default_params(args.interval)
+    print(f"{len(results)} backtests in {time.perf_counter() - started:.2f}s\n")
+    for i, result in enumerate(results):
+        changed = {k: v for k, v in result['params'].items() if v != defaults.get(k)}
+        print(f"[{i}] {changed or 'defaults'}  folds={result['folds']}")
+        print('    ' + '  '.join(f"{k}={v}" for k, v in result['stats'].items()))
+        if args.save:
+            run_dir = os.path.join(args.save, f'run_{i}')
+            os.makedirs(run_dir, exist_ok=True)
+            with open(os.path.join(run_dir, 'stats.json'), 'w') as f:
+                json.dump({'params': result['params'], 'stats': result['stats']}, f, indent=2)
+            result['equity'].to_csv(os.path.join(run_dir, 'equity.csv'))
+            result['trades'].to_csv(os.path.join(run_dir, 'trades.csv'), index=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,498 @@
+import os
+import json
+import time
+import zlib
+import threading
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta, timezone
+
+# OHLCV columns kept per symbol, in the same naming yfinance uses
+COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+DEFAULT_STORE_DIR = os.getenv(
+    'BAR_STORE_DIR', os.path.join(os.path.dirname(__file__), 'data', 'bars')
+)
+
+# Minimum age of the last fetch before hitting the network again
+DEFAULT_REFRESH_SECONDS = int(os.getenv('BAR_REFRESH_SECONDS', '60'))
+
+# Concurrent upstream fetches allowed per process
+DEFAULT_FETCH_CONCURRENCY = int(os.getenv('BAR_FETCH_CONCURRENCY', '4'))
+
+# The one feed fetched upstream per symbol; coarser intervals that are whole
+# multiples of it (1h, 1d, 1wk from 15m) are resampled from it locally.
+# 'none' fetches every interval separately.
+DEFAULT_BASE_INTERVAL = os.getenv('BAR_BASE_INTERVAL', '15m')
+
+INTERVAL_SECONDS = {
+    '1m': 60, '5m': 300, '15m': 900, '30m': 1800,
+    '1h': 3600, '60m': 3600, '1d': 86400, '1wk': 604800,
+}
+
+# Furthest back (days) Yahoo Finance serves each intraday interval
+YFINANCE_MAX_DAYS = {'1m': 7, '5m': 59, '15m': 59, '30m': 59, '1h': 729, '60m': 729}
+
+_INITIAL_CAPACITY = 4096
+
+
+def normalize_bars(df):
+    """Return an OHLCV frame with flat columns and a tz-naive UTC index."""
+    if df is None or df.empty:
+        return pd.DataFrame(columns=COLUMNS, dtype='float64')
+    if isinstance(df.columns, pd.MultiIndex):
+        # yfinance returns (field, ticker) columns for some versions
+        df = df.copy()
+        df.columns = df.columns.get_level_values(0)
+    df = df[COLUMNS].astype('float64')
+    index = pd.DatetimeIndex(df.index)
+    if index.tz is not None:
+        index = index.tz_convert('UTC').tz_localize(None)
+    df.index = index
+    return df[~df.index.duplicated(keep='last')].sort_index()
+
+
+def yfinance_fetcher(symbol, start, end, interval):
+    """Download bars from Yahoo Finance.
+
+    Uses `Ticker.history` rather than `yf.download`, whose module-level
+    result buffers are not safe to share between threads. Intraday
+    requests are clipped to the history Yahoo keeps for the interval.
+    """
+    import yfinance as yf
+    if interval in YFINANCE_MAX_DAYS:
+        start = pd.Timestamp(start)
+        start = start if start.tzinfo is not None else start.tz_localize('UTC')
+        start = max(start, pd.Timestamp.now(tz='UTC') - timedelta(days=YFINANCE_MAX_DAYS[interval]))
+    df = yf.Ticker(symbol).history(start=start, end=end, interval=interval, auto_adjust=False)
+    return normalize_bars(df)
+
+
+def alpaca_fetcher(symbol, start, end, interval):
+    """Download bars from Alpaca's market data API, which keeps years of intraday history.
+
+    Goes through the shared data client in `utils.alpaca_client`, so it
+    needs ALPACA_KEY/ALPACA_SECRET and the backend directory on the path.
+    """
+    from alpaca.data.timeframe import TimeFrame, TimeFrameUnit
+    from utils.alpaca_client import get_historical_bars
+    step = INTERVAL_SECONDS[interval]
+    if step >= 604800:
+        timeframe = TimeFrame(step // 604800, TimeFrameUnit.Week)
+    elif step >= 86400:
+        timeframe = TimeFrame(step // 86400, TimeFrameUnit.Day)
+    elif step >= 3600:
+        timeframe = TimeFrame(step // 3600, TimeFrameUnit.Hour)
+    else:
+        timeframe = TimeFrame(step // 60, TimeFrameUnit.Minute)
+    df = get_historical_bars(symbol, start, end, timeframe).df
+    if df.empty:
+        return normalize_bars(None)
+    if isinstance(df.index, pd.MultiIndex):
+        df = df.xs(symbol, level='symbol')
+    return normalize_bars(df.rename(columns={col.lower(): col for col in COLUMNS}))
+
+
+class SyntheticFetcher:
+    """Deterministic synthetic bars that stand in for the network.
+
+    The same (symbol, timestamp) always produces the same bar, so repeated
+    refreshes behave like a real upstream that only grows at the tail.
+    """
+
+    def __init__(self, start_price=100.0, volatility=0.002, seed=0):
+        self.start_price = start_price
+        self.volatility = volatility
+        self.seed = seed
+
+    def __call__(self, symbol, start, end, interval):
+        step = INTERVAL_SECONDS[interval]
+        start_ts = int(pd.Timestamp(start).timestamp()) // step * step
+        end_ts = int(pd.Timestamp(end).timestamp()) // step * step
+        if end_ts < start_ts:
+            return normalize_bars(None)
+        slots = np.arange(start_ts, end_ts + step, step, dtype=np.int64) // step
+        base = zlib.crc32(f"{self.seed}:{symbol}".encode())
+        # Per-slot noise derived from a hash of the slot number keeps bars stable
+        noise = ((slots * 2654435761 + base) % 1000003) / 1000003.0 - 0.5
+        # Smooth cycles measured in days, so every interval samples the same curve
+        days = slots * step / 86400.0
+        phase = (base % 1000) / 1000.0 * 2 * np.pi
+        level = (np.log(self.start_price)
+                 + 0.15 * np.sin(2 * np.pi * days / 60.0 + phase)
+                 + 0.05 * np.sin(2 * np.pi * days / 9.0 + phase)
+                 + 0.015 * np.sin(2 * np.pi * days / 1.3 + phase))
+        scale = self.volatility * np.sqrt(step / 900.0) * 3
+        close = np.exp(level + scale * noise)
+        open_ = np.exp(level + scale * np.roll(noise, 1))
+        spread = np.abs(noise) * self.volatility * close
+        df = pd.DataFrame({
+            'Open': open_,
+            'High': np.maximum(open_, close) + spread,
+            'Low': np.minimum(open_, close) - spread,
+            'Close': close,
+            'Volume': 1e5 + (slots * 7919 + base) % 50000,
+        }, index=pd.to_datetime(slots * step, unit='s'))
+        return normalize_bars(df)
+
+
+def get_fetcher(name=None):
+    """Resolve a fetcher by name (`BAR_FETCHER` env var by default)."""
+    name = (name or os.getenv('BAR_FETCHER', 'yfinance')).lower()
+    if name == 'yfinance':
+        return yfinance_fetcher
+    if name == 'synthetic':
+        return SyntheticFetcher()
+    if name == 'alpaca':
+        return alpaca_fetcher
+    if name == 'replay':
+        from replay import ReplayFetcher
+        return ReplayFetcher.from_env()
+    raise ValueError(f"Unknown bar fetcher: {name}")
+
+
+def _frame(arrays):
+    """OHLCV DataFrame over `_Series.views` arrays, without copying them."""
+    arrays = dict(arrays)
+    index = pd.DatetimeIndex(arrays.pop('index').view('datetime64[ns]'))
+    return pd.DataFrame(arrays, index=index, copy=False)
+
+
+class _Series:
+    """Memory-mapped columns for one (symbol, interval) pair."""
+
+    def __init__(self, path, names=COLUMNS, dtype=np.float64):
+        self.path = path
+        self.names = list(names)
+        self.dtype = dtype
+        self.meta_path = os.path.join(path, 'meta.json')
+        self.meta_mtime = None
+        self.length = 0
+        self.capacity = 0
+        self.fetched_at = None
+        # For a derived series: the base series' meta mtime it was last resampled from
+        self.derived_from = None
+        # Earliest start (epoch seconds) history was requested from, whether or not the feed had it
+        self.backfilled_from = None
+        # Bumped whenever the column files are replaced, so other processes reopen them
+        self.generation = 0
+        self.index = None
+        self.columns = {}
+        # Guards the mappings and length against a concurrent swap; unlike the
+        # store's key lock it is never held across a fetch
+        self._lock = threading.Lock()
+
+    def load(self):
+        """(Re)open the memmaps if another writer changed the metadata."""
+        with self._lock:
+            try:
+                mtime = os.stat(self.meta_path).st_mtime_ns
+            except FileNotFoundError:
+                return
+            if mtime == self.meta_mtime:
+                return
+            with open(self.meta_path) as f:
+                meta = json.load(f)
+            generation = meta.get('generation', 0)
+            if meta['capacity'] != self.capacity or generation != self.generation or self.index is None:
+                self.index = np.load(os.path.join(self.path, 'index.npy'), mmap_mode='r+')
+                self.columns = {
+                    col: np.load(os.path.join(self.path, f'{col}.npy'), mmap_mode='r+')
+                    for col in self.names
+                }
+            self.length = meta['length']
+            self.capacity = meta['capacity']
+            self.generation = generation
+            self.fetched_at = meta.get('fetched_at')
+            self.backfilled_from = meta.get('backfilled_from')
+            self.meta_mtime = mtime
+
+    def _allocate(self, capacity, source=None, length=None):
+        """Create columns with room for `capacity` bars in new files and swap them in.
+
+        The first `length` rows of `source` ({name: array}, by default the
+        stored bars) are copied over. Readers holding the old mapping keep
+        a valid view of the old inode.
+        """
+        if source is None:
+            source, length = dict(self.columns, index=self.index), self.length
+        os.makedirs(self.path, exist_ok=True)
+        new = {}
+        for name, dtype in [('index', np.int64)] + [(col, self.dtype) for col in self.names]:
+            tmp = os.path.join(self.path, f'{name}.npy.tmp')
+            arr = np.lib.format.open_memmap(tmp, mode='w+', dtype=dtype, shape=(capacity,))
+            old = source.get(name)
+            if old is not None and length:
+                arr[:length] = old[:length]
+            arr.flush()
+            del arr
+            os.replace(tmp, os.path.join(self.path, f'{name}.npy'))
+            new[name] = np.load(os.path.join(self.path, f'{name}.npy'), mmap_mode='r+')
+        with self._lock:
+            self.index = new.pop('index')
+            self.columns = new
+            self.capacity = capacity
+            self.length = length
+            self.generation += 1
+
+    def _capacity(self, needed):
+        capacity = max(_INITIAL_CAPACITY, self.capacity)
+        while capacity < needed:
+            capacity *= 2
+        return capacity
+
+    def write_meta(self):
+        tmp = self.meta_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump({
+                'length': self.length,
+                'capacity': self.capacity,
+                'fetched_at': self.fetched_at,
+                'backfilled_from': self.backfilled_from,
+                'generation': self.generation,
+            }, f)
+        os.replace(tmp, self.meta_path)
+        self.meta_mtime = os.stat(self.meta_path).st_mtime_ns
+
+    def append(self, bars):
+        """Write bars at their position, overwriting any stored bar at or after the first new timestamp."""
+        ts = bars.index.values.astype('datetime64[ns]').astype(np.int64)
+        pos = int(np.searchsorted(self.index[:self.length], ts[0])) if self.length else 0
+        needed = pos + len(ts)
+        if needed > self.capacity:
+            self._allocate(self._capacity(needed))
+        self.index[pos:needed] = ts
+        for col in self.names:
+            self.columns[col][pos:needed] = bars[col].values
+        self.index.flush()
+        for col in self.names:
+            self.columns[col].flush()
+        with self._lock:
+            self.length = needed
+
+    def rewrite(self, bars):
+        """Replace every stored bar with `bars`, in new files, e.g. after older bars were prepended.
+
+        Unlike `append`, no stored row is written in place, so views taken
+        before the rewrite never see rows shift under them.
+        """
+        source = {col: bars[col].values for col in self.names}
+        source['index'] = bars.index.values.astype('datetime64[ns]').astype(np.int64)
+        self._allocate(self._capacity(len(bars)), source, len(bars))
+
+    def views(self, start=None, end=None):
+        """Read-only views of the index and columns between `start` and `end`."""
+        self.load()
+        with self._lock:
+            length, index, columns = self.length, self.index, self.columns
+        index = index[:length] if length else np.empty(0, dtype=np.int64)
+        lo = int(np.searchsorted(index, pd.Timestamp(start).value)) if start is not None else 0
+        hi = int(np.searchsorted(index, pd.Timestamp(end).value, side='right')) if end is not None else len(index)
+        arrays = {'index': index[lo:hi]}
+        for col in self.names:
+            arrays[col] = columns[col][lo:hi] if length else np.empty(0, dtype=self.dtype)
+        for name, arr in arrays.items():
+            # Read-only views so callers cannot write through to disk
+            arr = arr.view(np.ndarray)
+            arr.flags.writeable = False
+            arrays[name] = arr
+        return arrays
+
+
+class BarStore:
+    """Persistent per-symbol OHLCV store with tail-only refreshes.
+
+    Each (symbol, interval) series lives in its own directory as one
+    memory-mapped `.npy` file per column plus an int64 nanosecond time
+    index. Reads return views into the mappings, so windows are served
+    without copying or touching the network. Only `base_interval` is
+    fetched upstream for intervals that can be derived from it; those are
+    stored as well and kept up to date by resampling the base feed's new
+    bars. `clock` (epoch seconds, like `time.time`) decides what "now" is;
+    it defaults to the fetcher's own clock when it has one, as a replay does.
+    """
+
+    def __init__(self, root=None, fetcher=None, refresh_seconds=None, fetch_concurrency=None, clock=None,
+                 base_interval=None):
+        self.root = root or DEFAULT_STORE_DIR
+        self.fetcher = fetcher or get_fetcher()
+        base_interval = DEFAULT_BASE_INTERVAL if base_interval is None else base_interval
+        self.base_interval = base_interval if base_interval.lower() not in ('', 'none') else None
+        self.clock = clock or getattr(self.fetcher, 'clock', None) or time.time
+        self.refresh_seconds = DEFAULT_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        self._fetch_slots = threading.BoundedSemaphore(fetch_concurrency or DEFAULT_FETCH_CONCURRENCY)
+        self._series = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def __getstate__(self):
+        # Worker processes get their own handles on the same directory
+        state = {k: v for k, v in self.__dict__.items() if k not in ('_fetch_slots', '_series', '_locks', '_guard')}
+        state['fetch_concurrency'] = self._fetch_slots._initial_value
+        return state
+
+    def __setstate__(self, state):
+        self._fetch_slots = threading.BoundedSemaphore(state.pop('fetch_concurrency'))
+        self.__dict__.update(state)
+        self._series = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def _key_lock(self, key):
+        with self._guard:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+                self._series[key] = _Series(os.path.join(self.root, key[1], key[0]))
+            return self._locks[key], self._series[key]
+
+    def now(self):
+        """Current time (UTC) by the store's clock."""
+        return datetime.fromtimestamp(self.clock(), timezone.utc)
+
+    def derives(self, interval):
+        """Whether `interval` is resampled from the base feed instead of fetched."""
+        from resample import can_derive
+        return self.base_interval is not None and can_derive(interval, self.base_interval)
+
+    def feed_interval(self, interval):
+        """Interval fetched upstream for `interval`, i.e. how often its newest bar changes."""
+        return self.base_interval if self.derives(interval) else interval
+
+    def last_timestamp(self, symbol, interval='15m'):
+        """Timestamp of the newest stored bar, or None if the series is empty."""
+        _, series = self._key_lock((symbol.upper(), interval))
+        index = series.views()['index']
+        if not len(index):
+            return None
+        return pd.Timestamp(int(index[-1]))
+
+    def append(self, symbol, bars, interval='15m'):
+        """Merge already-fetched bars into the store."""
+        bars = normalize_bars(bars)
+        if bars.empty:
+            return 0
+        lock, series = self._key_lock((symbol.upper(), interval))
+        with lock:
+            series.load()
+            series.append(bars)
+            series.write_meta()
+        return len(bars)
+
+    def refresh(self, symbol, interval='15m', lookback_days=60, force=False):
+        """Fetch only the bars missing since the last stored timestamp.
+
+        The last stored bar is re-fetched as well because it may still
+        have been forming when it was written. Derived intervals refresh
+        the base feed, one fetch shared by every timeframe, and resample it.
+        """
+        symbol = symbol.upper()
+        if self.derives(interval):
+            fetched = self.refresh(symbol, self.base_interval, lookback_days, force)
+            self._derive(symbol, interval)
+            return fetched
+        lock, series = self._key_lock((symbol, interval))
+        with lock:
+            series.load()
+            now = self.now()
+            if (not force and series.fetched_at is not None
+                    and now.timestamp() - series.fetched_at < self.refresh_seconds):
+                return 0
+            if series.length:
+                start = pd.Timestamp(int(series.index[series.length - 1]), tz='UTC').to_pydatetime()
+            else:
+                start = now - timedelta(days=lookback_days)
+                series.backfilled_from = start.timestamp()
+            with self._fetch_slots:
+                bars = normalize_bars(self.fetcher(symbol, start, now, interval))
+            if not bars.empty:
+                series.append(bars)
+            elif not series.length:
+                raise ValueError(f"No data available for {symbol}")
+            series.fetched_at = now.timestamp()
+            series.write_meta()
+            return len(bars)
+
+    def backfill(self, symbol, interval='15m', start=None):
+        """Extend stored history back to `start`, fetching only bars older than the first stored one.
+
+        Call after `refresh`. Each start is only requested once, so a feed
+        that keeps less history (Yahoo serves 59 days of 15m bars) is not
+        asked again on every call. Derived intervals backfill the base
+        feed and are resampled from scratch when it gained bars.
+        """
+        symbol = symbol.upper()
+        start = pd.Timestamp(start)
+        if start.tzinfo is not None:
+            start = start.tz_convert('UTC').tz_localize(None)
+        if self.derives(interval):
+            fetched = self.backfill(symbol, self.base_interval, start)
+            if fetched:
+                self._derive(symbol, interval, rebuild=True)
+            return fetched
+        lock, series = self._key_lock((symbol, interval))
+        with lock:
+            series.load()
+            requested = start.tz_localize('UTC').timestamp()
+            if (not series.length or int(series.index[0]) <= start.value
+                    or (series.backfilled_from is not None and series.backfilled_from <= requested)):
+                return 0
+            first = pd.Timestamp(int(series.index[0]))
+            with self._fetch_slots:
+                older = normalize_bars(self.fetcher(
+                    symbol, start.tz_localize('UTC').to_pydatetime(), first.tz_localize('UTC').to_pydatetime(), interval
+                ))
+            older = older[older.index < first]
+            if not older.empty:
+                series.rewrite(pd.concat([older, _frame(series.views())]))
+            series.backfilled_from = requested
+            series.write_meta()
+            return len(older)
+
+    def _derive(self, symbol, interval, rebuild=False):
+        """Bring a derived series up to date with the base feed.
+
+        Only base bars from the newest derived bar on are resampled: that
+        bar may still be open and is overwritten in place, and any later
+        ones are appended. The whole base feed is resampled into new files
+        with `rebuild`, or when it starts before the derived series, i.e.
+        after it was backfilled.
+        """
+        from resample import resample
+        lock, series = self._key_lock((symbol, interval))
+        base_lock, base = self._key_lock((symbol, self.base_interval))
+        with lock:
+            series.load()
+            with base_lock:
+                base.load()
+                if not rebuild and series.length and series.derived_from == base.meta_mtime:
+                    return 0
+                # The base feed was backfilled past our first bar (e.g. through its own interval)
+                rebuild = rebuild or bool(series.length and base.length and base.index[0] < series.index[0])
+                start = pd.Timestamp(int(series.index[series.length - 1])) if series.length and not rebuild else None
+                bars = resample(_frame(base.views(start=start)), interval)
+                series.derived_from = base.meta_mtime
+                series.fetched_at = base.fetched_at
+            if rebuild:
+                series.rewrite(bars)
+            elif not bars.empty:
+                series.append(bars)
+            series.write_meta()
+            return len(bars)
+
+    def window_arrays(self, symbol, interval='15m', start=None, end=None):
+        """Zero-copy views of the stored columns between `start` and `end`."""
+        _, series = self._key_lock((symbol.upper(), interval))
+        return series.views(start, end)
+
+    def window(self, symbol, interval='15m', start=None, end=None):
+        """Stored bars between `start` and `end` as an OHLCV DataFrame."""
+        return _frame(self.window_arrays(symbol, interval, start, end))
+
+    def load(self, symbol, interval='15m', lookback_days=60):
+        """Refresh the tail and return the last `lookback_days` of bars."""
+        self.refresh(symbol, interval, lookback_days)
+        start = self.now().replace(tzinfo=None) - timedelta(days=lookback_days)
+        df = self.window(symbol, interval, start=start)
+        if df.empty:
+            raise ValueError(f"No data available for {symbol}")
+        return df
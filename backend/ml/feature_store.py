@@ -0,0 +1,223 @@
+import os
+import math
+import pickle
+import warnings
+import threading
+from contextlib import contextmanager
+import numpy as np
+import pandas as pd
+from bar_store import BarStore, _Series
+from indicators import IndicatorEngine
+from train_model import FEATURES
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are only serialized within a process
+    fcntl = None
+
+# Defaults to a `features/` directory inside the bar store it is built from
+DEFAULT_FEATURE_DIR = os.getenv('FEATURE_STORE_DIR')
+
+
+def _feature_row(values, close):
+    """Unnormalized model features for one bar from its indicator values."""
+    sma_20, sma_50 = values['SMA_20'], values['SMA_50']
+    return [values[name] for name in FEATURES[:-2]] + [
+        close / sma_20 if sma_20 else math.nan,
+        close / sma_50 if sma_50 else math.nan,
+    ]
+
+
+def feature_matrix(arrays):
+    """Stack feature columns (as returned by `FeatureStore.window_arrays`) into rows."""
+    return np.column_stack([arrays[name] for name in FEATURES])
+
+
+def normalize(raw, stats):
+    """Apply fitted `{'mean', 'std'}` statistics; missing values become 0 as in `prepare_features`."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (np.asarray(raw, dtype=np.float64) - np.asarray(stats['mean'])) / np.asarray(stats['std'])
+    return np.where(np.isnan(z), 0, z).astype(np.float32)
+
+
+def window_stats(raw):
+    """Statistics over a window of raw features, for symbols without fitted ones."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        raw = np.asarray(raw, dtype=np.float64)
+        return {'mean': np.nanmean(raw, axis=0), 'std': np.nanstd(raw, axis=0, ddof=1)}
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive lock shared with other processes syncing the same series."""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, '.lock'), 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+class FeatureStore:
+    """Materialized raw model features per (symbol, interval).
+
+    Uses the bar store's layout: one memory-mapped float32 `.npy` file per
+    feature plus the int64 time index. `sync` feeds only bars newer than
+    the last materialized one through a streaming `IndicatorEngine`, whose
+    state is pickled next to the columns so restarts and other processes
+    continue where it stopped. Reads are views into the mappings, and
+    normalization is applied by the caller with fitted statistics.
+    """
+
+    def __init__(self, bar_store=None, root=None):
+        self.bar_store = bar_store or BarStore()
+        self.root = root or DEFAULT_FEATURE_DIR or os.path.join(self.bar_store.root, 'features')
+        self._series = {}
+        self._locks = {}
+        self._engines = {}
+        self._guard = threading.Lock()
+
+    def __getstate__(self):
+        return {'bar_store': self.bar_store, 'root': self.root}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    def _key_lock(self, key):
+        with self._guard:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+                self._series[key] = _Series(os.path.join(self.root, key[1], key[0]), FEATURES, np.float32)
+            return self._locks[key], self._series[key]
+
+    def _engine_path(self, series):
+        return os.path.join(series.path, 'engine.pkl')
+
+    def _engine_state(self, key, series):
+        """(engine, last bar) matching the series' newest row, or None to rebuild."""
+        if not series.length:
+            return None
+        last = int(series.index[series.length - 1])
+        state = self._engines.get(key)
+        if state is None or state[0].last_timestamp != last:
+            try:
+                with open(self._engine_path(series), 'rb') as f:
+                    state = pickle.load(f)
+            except (OSError, pickle.UnpicklingError, EOFError) as e:
+                print(f"Rebuilding features for {key[0]} {key[1]}: {e}")
+                return None
+            if state[0].last_timestamp != last:
+                return None
+            self._engines[key] = state
+        return state
+
+    def sync(self, symbol, interval='15m'):
+        """Materialize features for stored bars the series does not have yet.
+
+        The newest materialized bar is recomputed when its close or volume
+        changed, since it may still have been forming. Returns the number
+        of rows written.
+        """
+        key = (symbol.upper(), interval)
+        lock, series = self._key_lock(key)
+        with lock, _file_lock(series.path):
+            series.load()
+            bars = self.bar_store.window_arrays(key[0], interval)
+            index, close, volume = bars['index'], bars['Close'], bars['Volume']
+            if not len(index):
+                return 0
+            state = self._engine_state(key, series)
+            start, revise = 0, False
+            if state is not None:
+                engine, last_bar = state
+                start = int(np.searchsorted(index, engine.last_timestamp))
+                if start == len(index) or index[start] != engine.last_timestamp or index[0] != series.index[0]:
+                    # Stored bars were rewritten before our newest row, or backfilled before our first
+                    state, start = None, 0
+                elif (float(close[start]), float(volume[start])) != last_bar:
+                    revise = True
+                elif start == len(index) - 1:
+                    return 0
+                else:
+                    start += 1
+            if state is None:
+                engine = IndicatorEngine()
+
+            rows = np.empty((len(index) - start, len(FEATURES)))
+            last = len(index) - 1
+            for n, i in enumerate(range(start, len(index))):
+                c, v, t = float(close[i]), float(volume[i]), int(index[i])
+                if n == 0 and revise:
+                    values = engine.revise(c, v, t)
+                else:
+                    values = engine.update(c, v, t, checkpoint=i == last)
+                rows[n] = _feature_row(values, c)
+            frame = pd.DataFrame(rows, columns=FEATURES, index=pd.DatetimeIndex(index[start:].view('datetime64[ns]')))
+            if state is None and series.length:
+                # A rebuild goes to new files, so views of the old rows never shift
+                series.rewrite(frame)
+            else:
+                series.append(frame)
+
+            state = (engine, (float(close[last]), float(volume[last])))
+            tmp = self._engine_path(series) + '.tmp'
+            with open(tmp, 'wb') as f:
+                pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self._engine_path(series))
+            self._engines[key] = state
+            # The metadata write publishes the new rows to readers
+            series.write_meta()
+            return len(rows)
+
+    def window_arrays(self, symbol, interval='15m', start=None, end=None):
+        """Zero-copy, read-only views of the feature columns between `start` and `end`."""
+        _, series = self._key_lock((symbol.upper(), interval))
+        return series.views(start, end)
+
+    def window(self, symbol, interval='15m', start=None, end=None):
+        """Materialized features between `start` and `end` as a DataFrame over the mappings."""
+        arrays = self.window_arrays(symbol, interval, start, end)
+        index = pd.DatetimeIndex(arrays.pop('index').view('datetime64[ns]'))
+        return pd.DataFrame(arrays, index=index, copy=False)
+
+
+if __name__ == '__main__':
+    # Verify incremental syncs against the pandas implementation on synthetic bars
+    import time
+    import shutil
+    import tempfile
+    from bar_store import SyntheticFetcher
+    from train_model import calculate_technical_indicators
+
+    root = tempfile.mkdtemp(prefix='features-')
+    try:
+        fetcher = SyntheticFetcher()
+        full = fetcher('TEST', '2026-01-01', '2026-03-01', '15m')
+        bar_store = BarStore(root=root, fetcher=fetcher)
+        store = FeatureStore(bar_store)
+        bar_store.append('TEST', full.iloc[:3000])
+        started = time.perf_counter()
+        print(f"initial sync: {store.sync('TEST')} rows in {time.perf_counter() - started:.3f}s")
+        # A forming bar that changes, then new bars, through a fresh handle each time
+        revised = full.iloc[2999:3000].copy()
+        revised['Close'] *= 1.01
+        bar_store.append('TEST', revised)
+        assert FeatureStore(bar_store).sync('TEST') == 1
+        bar_store.append('TEST', full.iloc[2999:])
+        started = time.perf_counter()
+        written = FeatureStore(bar_store).sync('TEST')
+        print(f"incremental sync: {written} rows in {time.perf_counter() - started:.3f}s")
+        assert store.sync('TEST') == 0
+
+        expected = calculate_technical_indicators(full.copy())
+        expected['Price_to_SMA20'] = expected['Close'] / expected['SMA_20']
+        expected['Price_to_SMA50'] = expected['Close'] / expected['SMA_50']
+        actual = store.window('TEST')
+        assert actual.index.equals(expected.index)
+        assert not actual['RSI'].values.flags.writeable
+        np.testing.assert_allclose(actual.to_numpy(np.float64), expected[FEATURES].to_numpy(), rtol=1e-6, equal_nan=True)
+        print(f"{len(actual)} rows match calculate_technical_indicators (float32 tolerance)")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
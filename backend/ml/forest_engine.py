@@ -0,0 +1,116 @@
+import os
+import json
+import numpy as np
+
+# Arrays written by export_forest, one .npy file each
+_ARRAYS = ['feature', 'threshold', 'left', 'right', 'value', 'roots', 'classes']
+
+
+def flatten_forest(model):
+    """Flatten a fitted RandomForestClassifier into contiguous arrays.
+
+    Nodes of all trees are concatenated; `left`/`right` hold global node
+    ids and `roots` the id of each tree's root. Leaves point to themselves
+    with an infinite threshold, so a fixed number of steps walks every row
+    to its leaf without branching. `value` holds each leaf's normalized
+    class distribution, as used by `predict_proba`.
+    """
+    feature, threshold, left, right, value, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        ids = np.arange(tree.node_count, dtype=np.int32) + offset
+        is_leaf = tree.children_left < 0
+        feature.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+        threshold.append(np.where(is_leaf, np.inf, tree.threshold))
+        left.append(np.where(is_leaf, ids, tree.children_left + offset).astype(np.int32))
+        right.append(np.where(is_leaf, ids, tree.children_right + offset).astype(np.int32))
+        counts = tree.value[:, 0, :]
+        value.append(counts / counts.sum(axis=1, keepdims=True))
+        roots.append(offset)
+        offset += tree.node_count
+        max_depth = max(max_depth, tree.max_depth)
+    arrays = {
+        'feature': np.concatenate(feature),
+        'threshold': np.concatenate(threshold),
+        'left': np.concatenate(left),
+        'right': np.concatenate(right),
+        'value': np.ascontiguousarray(np.concatenate(value)),
+        'roots': np.array(roots, dtype=np.int32),
+        'classes': np.asarray(model.classes_),
+    }
+    meta = {
+        'n_trees': len(model.estimators_),
+        'n_nodes': offset,
+        'n_features': int(model.n_features_in_),
+        'max_depth': int(max_depth),
+        'feature_names': list(getattr(model, 'feature_names_in_', [])),
+    }
+    return arrays, meta
+
+
+def export_forest(model, path):
+    """Write the flattened forest to `path` as one .npy file per array."""
+    arrays, meta = flatten_forest(model)
+    os.makedirs(path, exist_ok=True)
+    for name in _ARRAYS:
+        np.save(os.path.join(path, f'{name}.npy'), arrays[name])
+    with open(os.path.join(path, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    return path
+
+
+class CompiledForest:
+    """NumPy-vectorized evaluator for a flattened RandomForestClassifier.
+
+    All trees are walked for a whole batch at once, which removes the
+    per-tree and per-call Python overhead of sklearn on small batches.
+    """
+
+    def __init__(self, arrays, meta):
+        for name in _ARRAYS:
+            # Plain ndarray views, also of memory-mapped arrays, so results are never memmaps
+            setattr(self, name, np.asarray(arrays[name]))
+        self.classes_ = self.classes
+        self.n_trees = meta['n_trees']
+        self.n_features = meta['n_features']
+        self.max_depth = meta['max_depth']
+        self.feature_names = meta.get('feature_names') or None
+
+    @classmethod
+    def from_model(cls, model):
+        return cls(*flatten_forest(model))
+
+    @classmethod
+    def load(cls, path, mmap_mode=None):
+        """Load an exported forest; with `mmap_mode='r'` the arrays stay in the page cache, shared by processes."""
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode) for name in _ARRAYS}
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        return cls(arrays, meta)
+
+    def predict_proba(self, X):
+        """Class probabilities, identical to sklearn's `predict_proba`.
+
+        Raises ValueError, as sklearn does, for a row width other than the
+        forest's or a value that is not finite in float32.
+        """
+        # sklearn compares float32 inputs against float64 thresholds
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f"X has shape {X.shape}, but the forest expects {self.n_features} features per row")
+        if not np.isfinite(X).all():
+            raise ValueError("Input X contains NaN or infinity, or a value too large for float32")
+        n = X.shape[0]
+        flat = X.ravel()
+        row_offsets = np.arange(n, dtype=np.intp) * X.shape[1]
+        nodes = np.repeat(self.roots[:, None], n, axis=1)
+        for _ in range(self.max_depth):
+            values = flat.take(row_offsets + self.feature.take(nodes))
+            nodes = np.where(values <= self.threshold.take(nodes), self.left.take(nodes), self.right.take(nodes))
+        return self.value.take(nodes, axis=0).mean(axis=0)
+
+    def predict(self, X):
+        return self.classes[self.predict_proba(X).argmax(axis=1)]
+
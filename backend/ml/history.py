@@ -0,0 +1,371 @@
+import os
+import time
+import threading
+from datetime import timedelta
+import numpy as np
+import pandas as pd
+from bar_store import COLUMNS
+
+# Range a history request covers when it gives no start
+DEFAULT_HISTORY_DAYS = int(os.getenv('HISTORY_DEFAULT_DAYS', '365'))
+
+# Decimals kept for prices and overlays in chart payloads
+CHART_DECIMALS = 4
+
+# Candidate points (a min and a max per bucket) gathered per line point before LTTB picks
+LINE_PRESELECT = 2
+
+# Per-block aggregates held at every pyramid level
+_FIELDS = ('open', 'high', 'low', 'close', 'volume', 'cmin', 'imin', 'cmax', 'imax')
+
+
+def _pairs(prev, start):
+    """Blocks of the next level up from pairs of `prev` blocks, from `prev` block `start` (even) on."""
+    count = len(prev['open'])
+    left = np.arange(start, count, 2)
+    # A lone last block pairs with itself
+    right = np.minimum(left + 1, count - 1)
+    lower = prev['cmin'][right] < prev['cmin'][left]
+    higher = prev['cmax'][right] > prev['cmax'][left]
+    return {
+        'open': prev['open'][left],
+        'high': np.maximum(prev['high'][left], prev['high'][right]),
+        'low': np.minimum(prev['low'][left], prev['low'][right]),
+        'close': prev['close'][right],
+        'volume': prev['volume'][left] + np.where(right > left, prev['volume'][right], 0),
+        'cmin': np.where(lower, prev['cmin'][right], prev['cmin'][left]),
+        'imin': np.where(lower, prev['imin'][right], prev['imin'][left]),
+        'cmax': np.where(higher, prev['cmax'][right], prev['cmax'][left]),
+        'imax': np.where(higher, prev['imax'][right], prev['imax'][left]),
+    }
+
+
+class MinMaxPyramid:
+    """OHLC aggregates of one bar series over aligned blocks of 2**k bars, for every k.
+
+    Level k holds, per block, the first open, highest high, lowest low,
+    last close and summed volume, plus the lowest and highest close and
+    the bar positions they occur at. Any range of bars is a few whole
+    blocks per level, so bucketing a range into a point budget reads
+    O(points) precomputed values however many bars it spans. `update`
+    recomputes only the blocks covering new or revised bars.
+    """
+
+    def __init__(self, arrays):
+        self.levels = []
+        self.length = 0
+        self.update(arrays)
+
+    def update(self, arrays):
+        """Catch up with the series' current views (as `BarStore.window_arrays` returns); whether anything changed."""
+        index = arrays['index']
+        n = len(index)
+        last = tuple(float(arrays[col][n - 1]) for col in COLUMNS) if n else ()
+        if (self.length and n >= self.length and int(index[0]) == self.first
+                and int(index[self.length - 1]) == self.last_time):
+            if n == self.length and last == self.last_bar:
+                return False
+            # Only the newest stored bar may have been revised; everything before it is unchanged
+            changed = self.length - 1
+        else:
+            changed = 0
+        self.index = index
+        self.length = n
+        self.first = int(index[0]) if n else None
+        self.last_time = int(index[n - 1]) if n else None
+        self.last_bar = last
+        positions = np.arange(n)
+        if not self.levels:
+            self.levels.append(None)
+        self.levels[0] = {
+            'open': arrays['Open'], 'high': arrays['High'], 'low': arrays['Low'], 'close': arrays['Close'],
+            'volume': arrays['Volume'], 'cmin': arrays['Close'], 'imin': positions,
+            'cmax': arrays['Close'], 'imax': positions,
+        }
+        k = 1
+        while len(self.levels[k - 1]['open']) > 1:
+            block = changed >> k
+            fresh = _pairs(self.levels[k - 1], 2 * block)
+            if k < len(self.levels) and block:
+                kept = self.levels[k]
+                self.levels[k] = {f: np.concatenate((kept[f][:block], fresh[f])) for f in _FIELDS}
+            elif k < len(self.levels):
+                self.levels[k] = fresh
+            else:
+                self.levels.append(fresh)
+            k += 1
+        del self.levels[k:]
+        return True
+
+    def span(self, lo, hi):
+        """Aggregate of bars [lo, hi) from the fewest aligned blocks, O(log n)."""
+        parts = []
+        while lo < hi:
+            k = 0
+            while k + 1 < len(self.levels) and lo % (2 << k) == 0 and lo + (2 << k) <= hi:
+                k += 1
+            parts.append((k, lo >> k))
+            lo += 1 << k
+        values = {f: np.array([self.levels[k][f][b] for k, b in parts]) for f in _FIELDS}
+        low, high = int(np.argmin(values['cmin'])), int(np.argmax(values['cmax']))
+        return {
+            'open': values['open'][:1], 'high': values['high'].max(keepdims=True),
+            'low': values['low'].min(keepdims=True), 'close': values['close'][-1:],
+            'volume': values['volume'].sum(keepdims=True),
+            'cmin': values['cmin'][low:low + 1], 'imin': values['imin'][low:low + 1],
+            'cmax': values['cmax'][high:high + 1], 'imax': values['imax'][high:high + 1],
+        }
+
+    def buckets(self, lo, hi, points):
+        """Aggregates of bars [lo, hi) in at most `points` (at least 3) buckets of whole blocks.
+
+        Uses the finest level whose blocks fit the budget: between half
+        and all of `points` buckets, or one per bar if the range is small
+        enough. Adds `first` and `last`, each bucket's bar positions.
+        """
+        count = hi - lo
+        if count <= points:
+            level = {f: self.levels[0][f][lo:hi] for f in _FIELDS}
+            level['first'] = level['last'] = np.arange(lo, hi)
+            return level
+        k = 1
+        while (count >> k) + 2 > points and k + 1 < len(self.levels):
+            k += 1
+        size = 1 << k
+        level = self.levels[k]
+        b0 = -(-lo // size)
+        # The tail block may be partial; it is whole if the range reaches the newest bar
+        b1 = len(level['open']) if hi >= self.length else hi // size
+        if b0 >= b1:
+            parts, bounds = [self.span(lo, hi)], [(lo, hi)]
+        else:
+            interior = {f: level[f][b0:b1] for f in _FIELDS}
+            parts, bounds = [interior], [(b0 * size, min(b1 * size, self.length))]
+            if lo < b0 * size:
+                parts.insert(0, self.span(lo, b0 * size))
+                bounds.insert(0, (lo, b0 * size))
+            if b1 * size < hi:
+                parts.append(self.span(b1 * size, hi))
+                bounds.append((b1 * size, hi))
+        out = {f: np.concatenate([part[f] for part in parts]) for f in _FIELDS}
+        firsts, lasts = [], []
+        for (start, end), part in zip(bounds, parts):
+            if len(part['open']) == 1:
+                firsts.append(np.array([start]))
+                lasts.append(np.array([end - 1]))
+            else:
+                starts = np.arange(start, end, size)
+                firsts.append(starts)
+                lasts.append(np.minimum(starts + size, end) - 1)
+        out['first'], out['last'] = np.concatenate(firsts), np.concatenate(lasts)
+        return out
+
+
+def lttb(x, y, points):
+    """Positions of the `points` of (x, y) kept by Largest-Triangle-Three-Buckets.
+
+    Keeps the first and last point; from each of the `points - 2` buckets
+    in between, the point forming the largest triangle with the point kept
+    before it and the mean of the next bucket.
+    """
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, points - 1).astype(np.int64)
+    # Means of each bucket's successor: the next bucket, and the last point for the last one
+    means_x = np.append(np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / np.diff(edges), x[n - 1])
+    means_y = np.append(np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / np.diff(edges), y[n - 1])
+    xs, ys = x.tolist(), y.tolist()
+    keep = [0]
+    a = 0
+    for i in range(points - 2):
+        ax, ay = xs[a], ys[a]
+        mx, my = means_x[i + 1], means_y[i + 1]
+        best, area = edges[i], -1.0
+        for j in range(edges[i], edges[i + 1]):
+            value = abs((ax - mx) * (ys[j] - ay) - (ax - xs[j]) * (my - ay))
+            if value > area:
+                best, area = j, value
+        keep.append(best)
+        a = best
+    keep.append(n - 1)
+    return np.array(keep)
+
+
+def _rounded(values):
+    """JSON-ready list: rounded floats, None for NaN."""
+    return [None if v != v else v for v in np.round(np.asarray(values, dtype=np.float64), CHART_DECIMALS).tolist()]
+
+
+class ChartHistory:
+    """Downsampled price history for charts, read from the bar store through min/max pyramids.
+
+    A pyramid is built per (symbol, interval) on first use and caught up
+    with the stored bars on every request, so serving any range at a
+    point budget costs O(points), not O(bars in the range). Overlays are
+    the feature store's materialized indicators, sampled at the returned
+    bars.
+    """
+
+    def __init__(self, bar_store, feature_store=None):
+        self.bar_store = bar_store
+        self.feature_store = feature_store
+        self._pyramids = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def _key_lock(self, key):
+        with self._guard:
+            if key not in self._locks:
+                self._locks[key] = threading.Lock()
+            return self._locks[key]
+
+    def pyramid(self, symbol, interval='15m'):
+        """The (symbol, interval) pyramid, up to date with the stored bars."""
+        key = (symbol.upper(), interval)
+        with self._key_lock(key):
+            arrays = self.bar_store.window_arrays(*key)
+            pyramid = self._pyramids.get(key)
+            if pyramid is None:
+                pyramid = self._pyramids[key] = MinMaxPyramid(arrays)
+            else:
+                pyramid.update(arrays)
+            return pyramid
+
+    def load(self, symbol, interval='15m', start=None):
+        """Refresh the newest bars and backfill history back to `start`."""
+        days = max(1, (self.bar_store.now().replace(tzinfo=None) - start).days + 1)
+        self.bar_store.refresh(symbol, interval, lookback_days=days)
+        self.bar_store.backfill(symbol, interval, start)
+
+    def _overlays(self, symbol, interval, times, names):
+        if not names or self.feature_store is None:
+            return {}
+        self.feature_store.sync(symbol, interval)
+        features = self.feature_store.window_arrays(symbol, interval)
+        rows = np.searchsorted(features['index'], times)
+        found = np.minimum(rows, len(features['index']) - 1)
+        matched = (rows < len(features['index'])) & (features['index'][found] == times)
+        return {name: _rounded(np.where(matched, features[name][found], np.nan)) for name in names}
+
+    def query(self, symbol, interval='15m', start=None, end=None, points=300, style='candles', overlays=(),
+              fetch=True):
+        """Bars of `symbol` between `start` and `end` downsampled to at most `points`.
+
+        `candles` aggregates whole blocks of bars into OHLCV buckets;
+        `line` keeps `points` closes picked by LTTB among each bucket's
+        lowest and highest close (MinMaxLTTB), so spikes survive. Times are
+        epoch seconds of each bucket's first bar (candles) or of the kept
+        bar (line); overlays are taken at each bucket's last bar. Returns
+        (payload, seconds spent per stage).
+        """
+        if points < 3:
+            raise ValueError("points must be at least 3")
+        started = time.perf_counter()
+        symbol = symbol.upper()
+        end = pd.Timestamp(end) if end is not None else pd.Timestamp(self.bar_store.now())
+        end = end.tz_convert('UTC').tz_localize(None) if end.tzinfo is not None else end
+        start = pd.Timestamp(start) if start is not None else end - timedelta(days=DEFAULT_HISTORY_DAYS)
+        start = start.tz_convert('UTC').tz_localize(None) if start.tzinfo is not None else start
+        timings = {}
+        if fetch:
+            self.load(symbol, interval, start)
+        timings['refresh'] = time.perf_counter() - started
+
+        stage = time.perf_counter()
+        pyramid = self.pyramid(symbol, interval)
+        lo = int(np.searchsorted(pyramid.index, start.value))
+        hi = max(lo, int(np.searchsorted(pyramid.index, end.value, side='right')))
+        timings['pyramid'] = time.perf_counter() - stage
+
+        stage = time.perf_counter()
+        if style == 'line':
+            buckets = pyramid.buckets(lo, hi, points * LINE_PRESELECT)
+            ends = np.array([lo, hi - 1], dtype=np.int64)[:hi - lo]
+            candidates = np.unique(np.concatenate((buckets['imin'], buckets['imax'], ends)).astype(np.int64))
+            close = pyramid.levels[0]['close']
+            times = pyramid.index[candidates]
+            kept = candidates[lttb((times - times[:1]) / 1e9, close[candidates], points)] if len(candidates) else candidates
+            rows = kept
+            payload = {'close': _rounded(close[kept])}
+        else:
+            buckets = pyramid.buckets(lo, hi, points)
+            rows = buckets['first']
+            payload = {name: _rounded(buckets[name]) for name in ('open', 'high', 'low', 'close')}
+            payload['volume'] = np.asarray(buckets['volume'], dtype=np.float64).round().astype(np.int64).tolist()
+        times = pyramid.index[rows]
+        timings['downsample'] = time.perf_counter() - stage
+
+        stage = time.perf_counter()
+        # Candles show each indicator as of their close
+        at = pyramid.index[buckets['last']] if style != 'line' else times
+        overlay_values = self._overlays(symbol, interval, at, list(overlays))
+        timings['overlays'] = time.perf_counter() - stage
+        timings['total'] = time.perf_counter() - started
+        return {
+            'symbol': symbol,
+            'interval': interval,
+            'style': style,
+            'bars': hi - lo,
+            'points': len(rows),
+            'time': (times // 10**9).tolist(),
+            **payload,
+            'overlays': overlay_values,
+        }, timings
+
+
+if __name__ == '__main__':
+    # Check pyramid buckets and spans against direct reductions over the bars, through updates
+    import shutil
+    import tempfile
+    from bar_store import BarStore, SyntheticFetcher
+
+    root = tempfile.mkdtemp(prefix='history-')
+    try:
+        fetcher = SyntheticFetcher()
+        full = fetcher('TEST', '2025-01-01', '2026-01-01', '15m')
+        bar_store = BarStore(root=root, fetcher=fetcher)
+        bar_store.append('TEST', full.iloc[:20000])
+        history = ChartHistory(bar_store)
+        rng = np.random.default_rng(0)
+        stored = 20000
+        for step, length in enumerate((20000, 20001, 20001, 20777, len(full))):
+            revised = full.iloc[:length].copy()
+            if step == 2:
+                revised.iloc[-1, revised.columns.get_loc('Close')] *= 1.01
+            # Like a refresh: the last stored bar again, then the new ones
+            bar_store.append('TEST', revised.iloc[stored - 1:])
+            stored = length
+            pyramid = history.pyramid('TEST')
+            bars = bar_store.window_arrays('TEST')
+            for _ in range(200):
+                lo, hi = sorted(rng.integers(0, length + 1, 2))
+                if hi - lo < 1:
+                    continue
+                points = int(rng.integers(3, 400))
+                got = pyramid.buckets(lo, hi, points)
+                assert len(got['open']) <= points, (lo, hi, points)
+                assert got['first'][0] == lo and got['last'][-1] == hi - 1
+                assert (got['first'][1:] == got['last'][:-1] + 1).all()
+                starts, ends = got['first'], got['last'] + 1
+                np.testing.assert_array_equal(got['open'], bars['Open'][starts])
+                np.testing.assert_array_equal(got['close'], bars['Close'][ends - 1])
+                np.testing.assert_array_equal(got['high'], np.maximum.reduceat(bars['High'][lo:hi], starts - lo))
+                np.testing.assert_array_equal(got['low'], np.minimum.reduceat(bars['Low'][lo:hi], starts - lo))
+                np.testing.assert_allclose(got['volume'], np.add.reduceat(bars['Volume'][lo:hi], starts - lo))
+                np.testing.assert_array_equal(got['cmin'], bars['Close'][got['imin']])
+                np.testing.assert_array_equal(got['cmin'], np.minimum.reduceat(bars['Close'][lo:hi], starts - lo))
+                np.testing.assert_array_equal(got['cmax'], np.maximum.reduceat(bars['Close'][lo:hi], starts - lo))
+            print(f"{length} bars, {len(pyramid.levels)} levels: buckets match direct reductions")
+        line, _ = history.query('TEST', start='2025-01-01', end='2026-01-01', points=300, style='line', fetch=False)
+        assert line['points'] == 300 and line['time'] == sorted(line['time'])
+        closes = full['Close'].to_numpy()
+        assert max(line['close']) == round(closes.max(), CHART_DECIMALS)
+        assert min(line['close']) == round(closes.min(), CHART_DECIMALS)
+        print(f"line: {line['bars']} bars -> {line['points']} points, keeping the extremes")
+        for style in ('candles', 'line'):
+            empty, _ = history.query('TEST', start='2030-01-01', end='2030-02-01', style=style, fetch=False)
+            assert empty['bars'] == empty['points'] == 0 and empty['time'] == []
+        print("an empty range returns no points")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
@@ -0,0 +1,263 @@
+import math
+import pickle
+import time
+from collections import deque
+import numpy as np
+import pandas as pd
+
+# Output columns, in the order calculate_technical_indicators adds them
+INDICATOR_COLUMNS = [
+    'RSI', 'SMA_20', 'SMA_50', 'EMA_20', 'MACD', 'Signal_Line',
+    'BB_middle', 'BB_upper', 'BB_lower', 'Volume_SMA', 'Volume_Ratio'
+]
+
+# Running sums are rebuilt from their window this often to stop float drift
+_RESYNC_EVERY = 10000
+
+
+class _RollingSum:
+    """Fixed-size window keeping a running sum."""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.total = 0.0
+        self.updates = 0
+
+    def push(self, x):
+        if len(self.values) == self.window:
+            self.total -= self.values[0]
+        self.values.append(x)
+        self.total += x
+        self.updates += 1
+        if self.updates % _RESYNC_EVERY == 0:
+            self.total = math.fsum(self.values)
+
+    @property
+    def mean(self):
+        if len(self.values) < self.window:
+            return math.nan
+        return self.total / self.window
+
+
+class _RollingMoments:
+    """Fixed-size window keeping mean and sum of squared deviations (Welford)."""
+
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+        self.mean_ = 0.0
+        self.m2 = 0.0
+        self.updates = 0
+
+    def push(self, x):
+        n = len(self.values)
+        if n < self.window:
+            delta = x - self.mean_
+            self.mean_ += delta / (n + 1)
+            self.m2 += delta * (x - self.mean_)
+        else:
+            old = self.values[0]
+            old_mean = self.mean_
+            self.mean_ += (x - old) / n
+            self.m2 += (x - old) * (x - self.mean_ + old - old_mean)
+        self.values.append(x)
+        self.updates += 1
+        if self.updates % _RESYNC_EVERY == 0:
+            self.mean_ = math.fsum(self.values) / len(self.values)
+            self.m2 = math.fsum((v - self.mean_) ** 2 for v in self.values)
+
+    @property
+    def mean(self):
+        if len(self.values) < self.window:
+            return math.nan
+        return self.mean_
+
+    @property
+    def std(self):
+        if len(self.values) < self.window:
+            return math.nan
+        # Sample standard deviation (ddof=1), like pandas rolling().std()
+        return math.sqrt(max(self.m2, 0.0) / (self.window - 1))
+
+
+class _EWM:
+    """Exponentially weighted mean matching pandas `ewm(span=...)`."""
+
+    def __init__(self, span, adjust):
+        self.alpha = 2.0 / (span + 1.0)
+        self.adjust = adjust
+        self.numerator = 0.0
+        self.denominator = 0.0
+        self.value = math.nan
+
+    def push(self, x):
+        if math.isnan(x):
+            return self.value
+        if self.adjust:
+            # Weights (1 - alpha)^i normalized by their running sum
+            decay = 1.0 - self.alpha
+            self.numerator = x + decay * self.numerator
+            self.denominator = 1.0 + decay * self.denominator
+            self.value = self.numerator / self.denominator
+        elif math.isnan(self.value):
+            self.value = x
+        else:
+            self.value = self.value + self.alpha * (x - self.value)
+        return self.value
+
+
+class IndicatorEngine:
+    """Streaming equivalent of `calculate_technical_indicators` for one symbol.
+
+    Every `update` costs O(1): SMAs keep running sums, RSI keeps rolling
+    gain/loss sums, EMA/MACD carry their previous value and Bollinger Bands
+    use a Welford window. Outputs match the pandas implementation, NaNs
+    included, for the same sequence of bars.
+    """
+
+    def __init__(self):
+        self.prev_close = math.nan
+        self.gain = _RollingSum(14)
+        self.loss = _RollingSum(14)
+        self.close_20 = _RollingMoments(20)
+        self.close_50 = _RollingSum(50)
+        self.volume_20 = _RollingSum(20)
+        self.ema_20 = _EWM(20, adjust=True)
+        self.ema_12 = _EWM(12, adjust=False)
+        self.ema_26 = _EWM(26, adjust=False)
+        self.signal = _EWM(9, adjust=False)
+        self.last_timestamp = None
+        self.last = None
+        self._checkpoint = None
+
+    def update(self, close, volume, timestamp=None, checkpoint=True):
+        """Feed the next bar and return the indicator values for it.
+
+        With `checkpoint`, the state before the bar is kept so `revise` can
+        replace it later; bulk loads skip it for all but the last bar.
+        """
+        # Pickled rather than deep-copied: several times faster for these deque-heavy states
+        self._checkpoint = pickle.dumps(self._state(), pickle.HIGHEST_PROTOCOL) if checkpoint else None
+        return self._advance(close, volume, timestamp)
+
+    def revise(self, close, volume, timestamp=None):
+        """Replace the most recent bar, e.g. when a still-forming bar changes."""
+        if self._checkpoint is None:
+            return self.update(close, volume, timestamp)
+        self._restore(pickle.loads(self._checkpoint))
+        return self._advance(close, volume, timestamp)
+
+    def _advance(self, close, volume, timestamp):
+        delta = close - self.prev_close
+        # pandas `where(delta > 0, 0)` also turns the leading NaN into 0
+        self.gain.push(delta if delta > 0 else 0.0)
+        self.loss.push(-delta if delta < 0 else 0.0)
+        self.prev_close = close
+        self.close_20.push(close)
+        self.close_50.push(close)
+        self.volume_20.push(volume)
+
+        gain, loss = self.gain.mean, self.loss.mean
+        if math.isnan(gain) or (gain == 0 and loss == 0):
+            rsi = math.nan
+        elif loss == 0:
+            rsi = 100.0
+        else:
+            rsi = 100 - (100 / (1 + gain / loss))
+
+        macd = self.ema_12.push(close) - self.ema_26.push(close)
+        middle = self.close_20.mean
+        band = 2 * self.close_20.std
+        volume_sma = self.volume_20.mean
+        if math.isnan(volume_sma):
+            volume_ratio = math.nan
+        elif volume_sma == 0:
+            volume_ratio = math.inf if volume > 0 else math.nan
+        else:
+            volume_ratio = volume / volume_sma
+
+        self.last_timestamp = timestamp
+        self.last = {
+            'RSI': rsi,
+            'SMA_20': middle,
+            'SMA_50': self.close_50.mean,
+            'EMA_20': self.ema_20.push(close),
+            'MACD': macd,
+            'Signal_Line': self.signal.push(macd),
+            'BB_middle': middle,
+            'BB_upper': middle + band,
+            'BB_lower': middle - band,
+            'Volume_SMA': volume_sma,
+            'Volume_Ratio': volume_ratio,
+        }
+        return self.last
+
+    def _state(self):
+        return {k: v for k, v in self.__dict__.items() if k != '_checkpoint'}
+
+    def _restore(self, state):
+        self.__dict__.update(state)
+
+    def run(self, df):
+        """Feed every bar of an OHLCV frame and return the indicator columns."""
+        last = len(df) - 1
+        rows = [
+            dict(self.update(c, v, t, checkpoint=i == last))
+            for i, (t, c, v) in enumerate(zip(df.index, df['Close'].values, df['Volume'].values))
+        ]
+        return pd.DataFrame(rows, index=df.index, columns=INDICATOR_COLUMNS)
+
+
+class IndicatorBank:
+    """Per-symbol streaming engines kept in sync with a bar store's tail."""
+
+    def __init__(self):
+        self.engines = {}
+
+    def sync(self, symbol, index, close, volume):
+        """Feed bars newer than the engine's last bar and return its latest values.
+
+        `index` holds int64 nanosecond timestamps, as returned by
+        `BarStore.window_arrays`. A bar with the same timestamp as the last
+        one fed replaces it, so a forming bar can be refreshed in place.
+        """
+        engine = self.engines.get(symbol)
+        if engine is None:
+            engine = self.engines[symbol] = IndicatorEngine()
+        start = 0
+        if engine.last_timestamp is not None:
+            start = int(np.searchsorted(index, engine.last_timestamp))
+            if start < len(index) and index[start] == engine.last_timestamp:
+                engine.revise(float(close[start]), float(volume[start]), int(index[start]))
+                start += 1
+        last = len(index) - 1
+        for i in range(start, len(index)):
+            engine.update(float(close[i]), float(volume[i]), int(index[i]), checkpoint=i == last)
+        return engine.last
+
+
+if __name__ == '__main__':
+    # Verify against the pandas implementation on synthetic bars
+    from datetime import datetime, timedelta
+    from bar_store import SyntheticFetcher
+    from train_model import calculate_technical_indicators
+
+    end = datetime(2024, 6, 1)
+    bars = SyntheticFetcher()('AAPL', end - timedelta(days=60), end, '15m')
+    expected = calculate_technical_indicators(bars.copy())[INDICATOR_COLUMNS]
+
+    engine = IndicatorEngine()
+    started = time.perf_counter()
+    streamed = engine.run(bars)
+    per_bar = (time.perf_counter() - started) / len(bars)
+
+    assert (expected.isna() == streamed.isna()).all().all(), "NaN positions differ"
+    diff = ((expected - streamed).abs() / expected.abs().clip(lower=1.0)).max()
+    print(diff.to_string())
+    assert (diff < 1e-9).all(), "Streaming indicators diverge from pandas"
+
+    started = time.perf_counter()
+    calculate_technical_indicators(bars.copy())
+    full = time.perf_counter() - started
+    print(f"{len(bars)} bars: {per_bar * 1e6:.1f} us per streamed bar, {full * 1e3:.1f} ms per full recompute")
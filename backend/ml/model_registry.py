@@ -0,0 +1,195 @@
+import os
+import re
+import json
+import shutil
+import hashlib
+import tempfile
+from datetime import datetime
+
+DEFAULT_REGISTRY_DIR = os.getenv(
+    'MODEL_REGISTRY_DIR', os.path.join(os.path.dirname(__file__), 'models')
+)
+
+# Version ids are sha256 prefixes of the pickled model (see file_digest)
+VERSION_PATTERN = re.compile(r'[0-9a-f]{6,64}')
+
+
+def file_digest(path, length=12):
+    """Short sha256 of a file's contents, used as a version id."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()[:length]
+
+
+def _write_atomic(path, text):
+    directory = os.path.dirname(path)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    with os.fdopen(fd, 'w') as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class ModelRegistry:
+    """Versioned model artifacts with an atomic "current" pointer.
+
+    Each version lives in `versions/<sha>/` (the sha256 prefix of its
+    pickled model) with `model.pkl`, the compiled `model_forest/`, a
+    `meta.json` describing features, training window and metrics, and the
+    per-symbol feature statistics fitted in training (`normalization.json`). The
+    `CURRENT` file names the served version and is replaced atomically;
+    `history.json` records promotions so a rollback can step back.
+    """
+
+    def __init__(self, root=None):
+        self.root = root or DEFAULT_REGISTRY_DIR
+        self.versions_dir = os.path.join(self.root, 'versions')
+        self.current_path = os.path.join(self.root, 'CURRENT')
+        self.history_path = os.path.join(self.root, 'history.json')
+
+    def version_dir(self, version):
+        # Ids arrive from API bodies; anything else (e.g. '../..') must not become a path
+        if not isinstance(version, str) or not VERSION_PATTERN.fullmatch(version):
+            raise ValueError(f"Invalid model version id: {version!r}")
+        return os.path.join(self.versions_dir, version)
+
+    def model_path(self, version):
+        return os.path.join(self.version_dir(version), 'model.pkl')
+
+    def forest_path(self, version):
+        return os.path.join(self.version_dir(version), 'model_forest')
+
+    def normalization_path(self, version):
+        return os.path.join(self.version_dir(version), 'normalization.json')
+
+    def register(self, model, metadata=None, promote=True, normalization=None):
+        """Store a trained model as a new version and return its id.
+
+        `normalization` holds the feature statistics inference must apply.
+        Registering identical model bytes twice returns the existing version.
+        """
+        import joblib
+        from forest_engine import export_forest
+
+        os.makedirs(self.versions_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=self.versions_dir, prefix='.staging-')
+        try:
+            joblib.dump(model, os.path.join(staging, 'model.pkl'))
+            version = file_digest(os.path.join(staging, 'model.pkl'))
+            if not os.path.exists(self.version_dir(version)):
+                export_forest(model, os.path.join(staging, 'model_forest'))
+                meta = {
+                    'version': version,
+                    'created_at': datetime.now().isoformat(),
+                    'model_type': type(model).__name__,
+                    'classes': [int(c) for c in getattr(model, 'classes_', [])],
+                    'feature_names': [str(f) for f in getattr(model, 'feature_names_in_', [])],
+                    'params': {k: v for k, v in model.get_params().items() if isinstance(v, (int, float, str, bool, type(None)))},
+                }
+                meta.update(metadata or {})
+                with open(os.path.join(staging, 'meta.json'), 'w') as f:
+                    json.dump(meta, f, indent=2, default=str)
+                if normalization is not None:
+                    with open(os.path.join(staging, 'normalization.json'), 'w') as f:
+                        json.dump(normalization, f)
+                # Publishing the finished directory in one rename keeps readers from seeing partial versions
+                os.rename(staging, self.version_dir(version))
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        if promote:
+            self.set_current(version)
+        return version
+
+    def stored_dir(self, version):
+        """Directory of a stored version; ValueError if there is none."""
+        path = self.version_dir(version)
+        if not os.path.isdir(path):
+            raise ValueError(f"Unknown model version: {version}")
+        return path
+
+    def meta(self, version):
+        with open(os.path.join(self.stored_dir(version), 'meta.json')) as f:
+            return json.load(f)
+
+    def normalization(self, version):
+        """Fitted feature statistics of `version`, or None if it was registered without them."""
+        try:
+            with open(self.normalization_path(version)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def versions(self):
+        """Metadata of every stored version, oldest first."""
+        if not os.path.isdir(self.versions_dir):
+            return []
+        metas = []
+        for name in os.listdir(self.versions_dir):
+            if not name.startswith('.'):
+                try:
+                    metas.append(self.meta(name))
+                except (OSError, ValueError) as e:
+                    print(f"Skipping unreadable model version {name}: {e}")
+        return sorted(metas, key=lambda meta: meta.get('created_at', ''))
+
+    def current(self):
+        """Version id the pointer names, or None before anything is promoted."""
+        try:
+            with open(self.current_path) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def pointer_mtime(self):
+        try:
+            return os.stat(self.current_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def history(self):
+        try:
+            with open(self.history_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def set_current(self, version):
+        """Atomically point the registry at `version`."""
+        if not os.path.exists(self.model_path(version)):
+            raise ValueError(f"Unknown model version: {version}")
+        os.makedirs(self.root, exist_ok=True)
+        if version != self.current():
+            history = self.history()
+            history.append({'version': version, 'promoted_at': datetime.now().isoformat()})
+            _write_atomic(self.history_path, json.dumps(history, indent=2))
+        _write_atomic(self.current_path, version + '\n')
+
+    def rollback(self, version=None):
+        """Point back at `version`, or step back to the version promoted before the current one.
+
+        Stepping back pops the current version off the history, so repeated
+        rollbacks walk further back instead of flipping between two versions.
+        """
+        if version is not None:
+            self.set_current(version)
+            return version
+        current = self.current()
+        history = self.history()
+        while history and history[-1]['version'] == current:
+            history.pop()
+        if not history:
+            raise ValueError('No earlier model version to roll back to')
+        version = history[-1]['version']
+        if not os.path.exists(self.model_path(version)):
+            raise ValueError(f"Unknown model version: {version}")
+        _write_atomic(self.history_path, json.dumps(history, indent=2))
+        _write_atomic(self.current_path, version + '\n')
+        return version
+
+    def load(self, version):
+        import joblib
+
+        return joblib.load(os.path.join(self.stored_dir(version), 'model.pkl'))
@@ -0,0 +1,253 @@
+import warnings
+import numpy as np
+from bar_store import COLUMNS
+from train_model import FEATURES, LABEL_HORIZON, MODEL_INTERVAL, label_threshold
+
+
+class BarPanel:
+    """OHLCV of many symbols as aligned (time x symbol) float64 arrays.
+
+    Rows are the union of every symbol's bar times (int64 ns in `index`);
+    a symbol without a bar at a row, because it was not listed yet or has
+    a gap there, holds NaN.
+    """
+
+    def __init__(self, index, symbols, columns):
+        self.index = np.asarray(index, dtype=np.int64)
+        self.symbols = list(symbols)
+        self.columns = columns
+        self.valid = ~np.isnan(columns['Close'])
+
+    def __getitem__(self, name):
+        return self.columns[name]
+
+    @property
+    def shape(self):
+        return self.valid.shape
+
+    @classmethod
+    def from_arrays(cls, symbols, arrays):
+        """Align per-symbol column arrays (as `BarStore.window_arrays` returns) on one time index."""
+        indexes = [np.asarray(a['index'], dtype=np.int64) for a in arrays]
+        index = np.unique(np.concatenate(indexes)) if indexes else np.empty(0, dtype=np.int64)
+        columns = {col: np.full((len(index), len(arrays)), np.nan) for col in COLUMNS}
+        for j, (times, a) in enumerate(zip(indexes, arrays)):
+            rows = np.searchsorted(index, times)
+            for col in COLUMNS:
+                columns[col][rows, j] = a[col]
+        return cls(index, symbols, columns)
+
+    @classmethod
+    def from_bar_store(cls, bar_store, symbols, interval='15m', start=None, end=None):
+        """Stored bars (no network) of every symbol between `start` and `end`."""
+        return cls.from_arrays(symbols, [bar_store.window_arrays(symbol, interval, start, end) for symbol in symbols])
+
+    @classmethod
+    def from_frames(cls, frames):
+        """Panel of a {symbol: OHLCV DataFrame} mapping."""
+        arrays = []
+        for df in frames.values():
+            a = {col: df[col].to_numpy(np.float64) for col in COLUMNS}
+            a['index'] = df.index.values.astype('datetime64[ns]').astype(np.int64)
+            arrays.append(a)
+        return cls.from_arrays(list(frames), arrays)
+
+    def last_rows(self):
+        """Row of each symbol's newest bar, -1 for symbols without bars."""
+        rows = len(self.index) - 1 - np.argmax(self.valid[::-1], axis=0)
+        return np.where(self.valid.any(axis=0), rows, -1)
+
+
+def _pack(valid):
+    """Row order per column that moves its valid rows to the top, in time order (None if there are no gaps)."""
+    return None if valid.all() else np.argsort(~valid, axis=0, kind='stable')
+
+
+def _take(x, order):
+    return x if order is None else np.take_along_axis(x, order, axis=0)
+
+
+def _put(packed, order, valid):
+    if order is None:
+        return packed
+    out = np.empty_like(packed)
+    np.put_along_axis(out, order, packed, axis=0)
+    out[~valid] = np.nan
+    return out
+
+
+def _window_sum(x, window):
+    total = np.cumsum(x, axis=0)
+    out = total.copy()
+    out[window:] -= total[:-window]
+    return out
+
+
+def rolling_mean(x, window, min_periods=None):
+    """Mean of the non-NaN values among the last `window` rows of each column.
+
+    Matches `DataFrame.rolling(window, min_periods).mean()`: NaN until
+    `min_periods` (default `window`) values are in the window.
+    """
+    valid = ~np.isnan(x)
+    count = _window_sum(valid, window)
+    total = _window_sum(np.where(valid, x, 0.0), window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = total / count
+    return np.where(count >= (window if min_periods is None else min_periods), mean, np.nan)
+
+
+def rolling_std(x, window, min_periods=None):
+    """Sample standard deviation (ddof=1) over the last `window` rows, NaN-aware like `rolling_mean`."""
+    valid = ~np.isnan(x)
+    # Center each column on its first value so the sums of squares keep their precision
+    first = x[np.argmax(valid, axis=0), np.arange(x.shape[1])]
+    centered = np.where(valid, x - np.nan_to_num(first), 0.0)
+    count = _window_sum(valid, window)
+    total = _window_sum(centered, window)
+    squares = _window_sum(centered ** 2, window)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        var = np.maximum(squares - total ** 2 / count, 0.0) / (count - 1)
+    return np.where(count >= max(2, window if min_periods is None else min_periods), np.sqrt(var), np.nan)
+
+
+def ewm_mean(x, span, adjust=True):
+    """`Series.ewm(span=span, adjust=adjust).mean()` down every column at once.
+
+    Columns must be gap-free from their first row (as packed columns are);
+    rows after a column's last value are left undefined.
+    """
+    alpha = 2.0 / (span + 1)
+    decay = 1 - alpha
+    out = np.empty_like(x)
+    if not len(x):
+        return out
+    if adjust:
+        weighted, weights = np.zeros(x.shape[1:]), np.zeros(x.shape[1:])
+        for t in range(len(x)):
+            weighted = x[t] + decay * weighted
+            weights = 1 + decay * weights
+            out[t] = weighted / weights
+    else:
+        out[0] = x[0]
+        for t in range(1, len(x)):
+            out[t] = decay * out[t - 1] + alpha * x[t]
+    return out
+
+
+def calculate_panel_indicators(panel):
+    """Vectorized `calculate_technical_indicators` over every symbol of a panel.
+
+    Each symbol's indicators only see its own bars: rows are packed so its
+    bars are contiguous before any window is applied, which lets windows
+    start at a late listing and skip gaps, and are unpacked afterwards.
+    Returns {name: (time x symbol) array}, NaN wherever the pandas version
+    is NaN or the symbol has no bar.
+    """
+    order = _pack(panel.valid)
+    close = _take(panel['Close'], order)
+    volume = _take(panel['Volume'], order)
+
+    delta = np.full_like(close, np.nan)
+    delta[1:] = close[1:] - close[:-1]
+    gain = rolling_mean(np.where(delta > 0, delta, 0.0), 14)
+    loss = rolling_mean(np.where(delta < 0, -delta, 0.0), 14)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100 - 100 / (1 + gain / loss)
+
+    sma_20 = rolling_mean(close, 20)
+    std_20 = rolling_std(close, 20)
+    macd = ewm_mean(close, 12, adjust=False) - ewm_mean(close, 26, adjust=False)
+    volume_sma = rolling_mean(volume, 20)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        volume_ratio = volume / volume_sma
+    packed = {
+        'RSI': rsi,
+        'SMA_20': sma_20,
+        'SMA_50': rolling_mean(close, 50),
+        'EMA_20': ewm_mean(close, 20),
+        'MACD': macd,
+        'Signal_Line': ewm_mean(macd, 9, adjust=False),
+        'BB_middle': sma_20,
+        'BB_upper': sma_20 + 2 * std_20,
+        'BB_lower': sma_20 - 2 * std_20,
+        'Volume_SMA': volume_sma,
+        'Volume_Ratio': volume_ratio,
+    }
+    return {name: _put(values, order, panel.valid) for name, values in packed.items()}
+
+
+def create_panel_labels(panel, threshold=None, horizon=LABEL_HORIZON, interval=MODEL_INTERVAL):
+    """Vectorized `create_labels`: 1 (Buy), -1 (Sell) or 0 (Hold) per bar, NaN where there is no bar.
+
+    The forward return is taken `horizon` of the symbol's own bars ahead;
+    `threshold` defaults to the one training uses for `interval` bars.
+    """
+    if threshold is None:
+        threshold = label_threshold(interval)
+    order = _pack(panel.valid)
+    close = _take(panel['Close'], order)
+    future = np.full_like(close, np.nan)
+    if len(close) > horizon:
+        future[:-horizon] = close[horizon:] / close[:-horizon] - 1
+    labels = np.where(future > threshold, 1.0, np.where(future < -threshold, -1.0, 0.0))
+    return _put(labels, order, panel.valid)
+
+
+def panel_raw_features(panel, indicators=None):
+    """Unnormalized model features as a (time x symbol x feature) array, like the feature store's."""
+    indicators = indicators or calculate_panel_indicators(panel)
+    close = panel['Close']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        derived = {'Price_to_SMA20': close / indicators['SMA_20'], 'Price_to_SMA50': close / indicators['SMA_50']}
+    return np.stack([derived[name] if name in derived else indicators[name] for name in FEATURES], axis=-1)
+
+
+def panel_stats(raw):
+    """Each symbol's mean and std (ddof=1, NaNs skipped) over a (time x symbol x feature) array."""
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return {'mean': np.nanmean(raw, axis=0), 'std': np.nanstd(raw, axis=0, ddof=1)}
+
+
+def prepare_panel_features(panel, raw=None, stats=None):
+    """Vectorized `prepare_features`: normalized (time x symbol x feature) float64 features.
+
+    Normalizes with fitted `stats` ({'mean', 'std'} of shape (symbols,
+    features)) when given, otherwise over each symbol's whole history.
+    Missing values become 0 as in `prepare_features`.
+    """
+    raw = panel_raw_features(panel) if raw is None else raw
+    if stats is None:
+        stats = panel_stats(raw)
+    mean, std = np.asarray(stats['mean']), np.asarray(stats['std'])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = (raw - mean) / std
+    return np.where(np.isnan(z), 0.0, z)
+
+
+if __name__ == '__main__':
+    # Check against the per-symbol pandas functions, with a late listing and gaps
+    from bar_store import SyntheticFetcher
+    from train_model import calculate_technical_indicators, create_labels, prepare_features
+
+    fetch = SyntheticFetcher()
+    frames = {symbol: fetch(symbol, '2026-03-01', '2026-04-15', '15m') for symbol in ('AAA', 'BBB', 'CCC', 'DDD')}
+    frames['BBB'] = frames['BBB'].iloc[1500:]
+    frames['CCC'] = frames['CCC'].drop(frames['CCC'].index[200:260].union(frames['CCC'].index[::7]))
+    frames['DDD'] = frames['DDD'].iloc[:40]
+    panel = BarPanel.from_frames(frames)
+    indicators = calculate_panel_indicators(panel)
+    labels = create_panel_labels(panel, interval='15m')
+    normalized = prepare_panel_features(panel)
+    for j, (symbol, df) in enumerate(frames.items()):
+        rows = np.searchsorted(panel.index, df.index.values.astype('datetime64[ns]').astype(np.int64))
+        expected = create_labels(calculate_technical_indicators(df.copy()), label_threshold('15m'))
+        for name in indicators:
+            np.testing.assert_allclose(indicators[name][rows, j], expected[name].to_numpy(), rtol=1e-9, atol=1e-9,
+                                       err_msg=f"{symbol} {name}")
+        np.testing.assert_array_equal(labels[rows, j], expected['Label'].to_numpy(), err_msg=f"{symbol} labels")
+        np.testing.assert_allclose(normalized[rows, j], prepare_features(expected.copy()).to_numpy(),
+                                   rtol=1e-7, atol=1e-7, err_msg=f"{symbol} features")
+        assert np.isnan(indicators['SMA_20'][:, j][~panel.valid[:, j]]).all()
+        print(f"{symbol}: {len(df)} bars match the pandas indicators, labels and features")
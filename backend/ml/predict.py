@@ -1,91 +1,433 @@
 import os
-import yfinance as yf
+import time
 import pandas as pd
 import numpy as np
-import joblib
+import threading
 from datetime import datetime, timedelta
-from train_model import calculate_technical_indicators, prepare_features
+from concurrent.futures import ThreadPoolExecutor
+from train_model import FEATURES, MODEL_INTERVAL, STOCKS
+from bar_store import BarStore
+from feature_store import FeatureStore, feature_matrix, normalize, window_stats
+from panel import BarPanel, calculate_panel_indicators, panel_raw_features, panel_stats
+from forest_engine import CompiledForest
+from model_registry import ModelRegistry, file_digest
+
+# Map model classes to signal names
+SIGNAL_MAP = {-1: 'Sell', 0: 'Hold', 1: 'Buy'}
+
+# Screener order: actionable signals first, each by confidence
+SIGNAL_RANK = {'Buy': 0, 'Sell': 1, 'Hold': 2}
+
+# Concurrent bar fetches per batch
+FETCH_WORKERS = int(os.getenv('PREDICT_FETCH_WORKERS', '8'))
+
+# Inference engine: 'compiled' (flattened NumPy forest) or 'sklearn'
+DEFAULT_ENGINE = os.getenv('PREDICTOR_ENGINE', 'compiled')
+
+# Map compiled forest arrays read-only instead of reading them, so every
+# worker process serving a version shares one copy in the page cache
+MODEL_MMAP = os.getenv('MODEL_MMAP', 'true').lower() == 'true'
+
+class LoadedModel:
+    """A model version ready to serve; never replaced after construction.
+
+    `normalization` holds the per-symbol feature statistics fitted when the
+    model was trained; symbols without them are normalized over their
+    lookback window. When scoring with the compiled forest the sklearn
+    model is only unpickled, by `loader`, if something asks for `model`.
+    """
+
+    def __init__(self, version, model, scorer, meta=None, normalization=None, loader=None):
+        self.version = version
+        self._model = model
+        self._loader = loader
+        self._lock = threading.Lock()
+        self.scorer = scorer
+        self.meta = meta or {}
+        self.normalization = (normalization or {}).get('symbols', {})
+
+    @property
+    def model(self):
+        if self._model is None and self._loader is not None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self._loader()
+        return self._model
 
 class StockPredictor:
-    def __init__(self, model_path: str | None = None):
+    def __init__(self, model_path: str | None = None, bar_store: BarStore | None = None,
+                 engine: str | None = None, registry: ModelRegistry | None = None):
         """Initialize predictor and try to load the trained model lazily.
 
-        If the model file is missing, keep `self.model` as None and allow the server to start.
+        The served model is the registry's current version, falling back to
+        the legacy `model_path` file. If neither exists, keep `self.model` as
+        None and allow the server to start. Bars are read from `bar_store`,
+        which only downloads the missing tail on refresh, and features from
+        the feature store built on it. `engine` selects sklearn or the
+        compiled forest exported next to the model.
         """
         if model_path is None:
             model_path = os.path.join(os.path.dirname(__file__), 'model.pkl')
         self.model_path = model_path
-        self.model = None
+        self.engine = engine or DEFAULT_ENGINE
+        # Score on the bars the model was trained on
+        self.interval = MODEL_INTERVAL
+        self.registry = registry or ModelRegistry()
+        self._active = LoadedModel(None, None, None)
+        self._shadow = None
+        self.shadow_counts = {}
+        # Batches count shadow agreement from executor threads
+        self._shadow_lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._pointer_mtime = None
         try:
-            if os.path.exists(self.model_path):
-                self.model = joblib.load(self.model_path)
-            else:
+            if not self.refresh_model():
                 print(f"Model file not found at {self.model_path}. Endpoints will return errors until trained.")
         except Exception as e:
-            print(f"Failed to load model from {self.model_path}: {e}")
-            self.model = None
-        self.stocks = ['AAPL', 'MSFT', 'TSLA', 'AMZN', 'GOOGL', 'NVDA', 'META', 'NFLX', 'AMD', 'BABA']
-        
+            print(f"Failed to load model: {e}")
+        self.stocks = list(STOCKS)
+        self.bar_store = bar_store or BarStore()
+        self.feature_store = FeatureStore(self.bar_store)
+        self.last_timings = {}
+        self.last_screen_timings = {}
+        # Called with every batch's timings, e.g. to export them as metrics
+        self.on_batch = None
+
+    @property
+    def model(self):
+        return self._active.model
+
+    @property
+    def scorer(self):
+        return self._active.scorer
+
+    @property
+    def model_version(self):
+        return self._active.version
+
+    @property
+    def model_meta(self):
+        return self._active.meta
+
+    def _load_scorer(self, model, forest_path):
+        """Return the object whose `predict_proba` serves predictions."""
+        if model is None or self.engine == 'sklearn':
+            return model
+        if self.engine != 'compiled':
+            raise ValueError(f"Unknown predictor engine: {self.engine}")
+        try:
+            if os.path.exists(forest_path):
+                return CompiledForest.load(forest_path, mmap_mode='r' if MODEL_MMAP else None)
+        except Exception as e:
+            print(f"Failed to load compiled forest from {forest_path}: {e}")
+        # Fall back to flattening the loaded model in memory
+        return CompiledForest.from_model(model)
+
+    def _load(self, version, load_model, forest_path, meta=None, normalization=None):
+        """Build a LoadedModel, serving from the exported forest without unpickling if possible."""
+        if self.engine == 'compiled' and os.path.exists(forest_path):
+            try:
+                scorer = CompiledForest.load(forest_path, mmap_mode='r' if MODEL_MMAP else None)
+                return LoadedModel(version, None, scorer, meta, normalization, loader=load_model)
+            except Exception as e:
+                print(f"Failed to load compiled forest from {forest_path}: {e}")
+        model = load_model()
+        return LoadedModel(version, model, self._load_scorer(model, forest_path), meta, normalization)
+
+    def load_version(self, version):
+        """Load a registry version without serving it."""
+        return self._load(version, lambda: self.registry.load(version), self.registry.forest_path(version),
+                          self.registry.meta(version), self.registry.normalization(version))
+
+    def _load_legacy(self):
+        import joblib
+
+        forest_path = os.path.splitext(self.model_path)[0] + '_forest'
+        return self._load(file_digest(self.model_path), lambda: joblib.load(self.model_path), forest_path,
+                          {'source': self.model_path})
+
+    def set_model(self, model, version, meta=None, normalization=None):
+        """Serve an in-memory model (e.g. in benchmarks) as `version`."""
+        forest_path = os.path.splitext(self.model_path)[0] + '_forest'
+        self._active = LoadedModel(version, model, self._load_scorer(model, forest_path), meta, normalization)
+
+    def refresh_model(self):
+        """Load the registry's current version if it is not the one being served.
+
+        Loading happens on the calling thread while requests keep using the
+        previous model; the new one is swapped in with a single assignment.
+        Returns True if a model was (re)loaded.
+        """
+        with self._reload_lock:
+            mtime = self.registry.pointer_mtime()
+            if mtime is not None and mtime == self._pointer_mtime:
+                return False
+            version = self.registry.current()
+            if version is not None:
+                self._pointer_mtime = mtime
+                if version == self._active.version:
+                    return False
+                self._active = self.load_version(version)
+                print(f"Serving model version {version}")
+                trained_on = self._active.meta.get('training', {}).get('interval')
+                if trained_on and trained_on != self.interval:
+                    print(f"Model version {version} was trained on {trained_on} bars but is scored on "
+                          f"{self.interval} bars; set MODEL_INTERVAL={trained_on}")
+                return True
+            if self._active.scorer is None and os.path.exists(self.model_path):
+                self._active = self._load_legacy()
+                return True
+            return False
+
+    def set_shadow(self, version):
+        """Score every batch with `version` as well, without serving it; None stops."""
+        shadow = self.load_version(version) if version else None
+        with self._shadow_lock:
+            self._shadow = shadow
+            self.shadow_counts = {}
+
+    def shadow_stats(self):
+        """Agreement between the served and shadow models since shadowing began."""
+        with self._shadow_lock:
+            shadow_model, counts = self._shadow, dict(self.shadow_counts)
+        if shadow_model is None:
+            return {"active": False}
+        total = sum(counts.values())
+        agree = sum(n for (served, shadow), n in counts.items() if served == shadow)
+        return {
+            "active": True,
+            "served_version": self.model_version,
+            "shadow_version": shadow_model.version,
+            "scored": total,
+            "agreement": round(agree / total, 4) if total else None,
+            "signals": {f"{served}->{shadow}": n for (served, shadow), n in sorted(counts.items())},
+        }
+
     def get_live_data(self, symbol, lookback_days=60):
-        """Fetch recent stock data for prediction."""
-        end_date = datetime.now()
-        start_date = end_date - timedelta(days=lookback_days)
-        
-        df = yf.download(symbol, start=start_date, end=end_date, interval='15m')
-        if df.empty:
+        """Fetch recent stock data for prediction from the local bar store."""
+        return self.bar_store.load(symbol, interval=self.interval, lookback_days=lookback_days)
+
+    def get_live_features(self, symbol, lookback_days=60, timings=None):
+        """Refresh bars, materialize new features and return views of the lookback window.
+
+        Returns (latest bar, raw feature columns); nothing is copied. If
+        `timings` is a list, (refresh, sync) seconds are appended to it.
+        """
+        started = time.perf_counter()
+        self.bar_store.refresh(symbol, interval=self.interval, lookback_days=lookback_days)
+        refreshed = time.perf_counter()
+        self.feature_store.sync(symbol, self.interval)
+        if timings is not None:
+            timings.append((refreshed - started, time.perf_counter() - refreshed))
+        start = self.bar_store.now().replace(tzinfo=None) - timedelta(days=lookback_days)
+        features = self.feature_store.window_arrays(symbol, self.interval, start=start)
+        if not len(features['index']):
             raise ValueError(f"No data available for {symbol}")
-        return df
+        last = pd.Timestamp(int(features['index'][-1]))
+        bar = self.bar_store.window_arrays(symbol, self.interval, start=last, end=last)
+        return bar, features
+
+    def _model_inputs(self, loaded, symbols, raw, windows):
+        """Normalize the latest raw rows with `loaded`'s fitted statistics."""
+        mean = np.empty_like(raw)
+        std = np.empty_like(raw)
+        for i, symbol in enumerate(symbols):
+            stats = loaded.normalization.get(symbol.upper()) or windows(i)
+            mean[i], std[i] = stats['mean'], stats['std']
+        return pd.DataFrame(normalize(raw, {'mean': mean, 'std': std}), columns=FEATURES, copy=False)
     
+    def predict_batch(self, symbols=None):
+        """Make predictions for many stocks with a single model call.
+
+        Bars are refreshed and new features materialized concurrently, the
+        latest feature row of every symbol is normalized with the model's
+        training statistics, stacked into one matrix and scored with one
+        `predict_proba` call whose argmax also gives the class. Symbols that
+        fail, including those whose feature row is not finite, are skipped. Per-stage timings (seconds) are kept in
+        `self.last_timings` and passed to `self.on_batch`; `refresh` and
+        `sync` are summed over symbols, so they can exceed `fetch`.
+        """
+        # One consistent model for the whole batch, even if a swap happens mid-way
+        active, shadow = self._active, self._shadow
+        if active.scorer is None:
+            raise RuntimeError("Model is not loaded. Train the model first.")
+        symbols = list(symbols or self.stocks)
+        timings = {}
+        per_symbol = []
+        started = time.perf_counter()
+
+        # Refresh bars and sync features for all symbols concurrently
+        with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, max(len(symbols), 1))) as pool:
+            futures = {symbol: pool.submit(self.get_live_features, symbol, timings=per_symbol) for symbol in symbols}
+        ready = []
+        for symbol, future in futures.items():
+            try:
+                ready.append((symbol, *future.result()))
+            except Exception as e:
+                print(f"Error predicting {symbol}: {str(e)}")
+        timings['fetch'] = time.perf_counter() - started
+        timings['refresh'] = sum(refresh for refresh, _ in per_symbol)
+        timings['sync'] = sum(sync for _, sync in per_symbol)
+
+        # Latest raw row per symbol, normalized per model
+        stage = time.perf_counter()
+        predictions = []
+        if ready:
+            names = [symbol for symbol, _, _ in ready]
+            raw = np.array([[features[name][-1] for name in FEATURES] for _, _, features in ready], dtype=np.float64)
+            fallback = {}
+
+            def windows(i):
+                if i not in fallback:
+                    fallback[i] = window_stats(feature_matrix(ready[i][2]))
+                return fallback[i]
+
+            X = self._model_inputs(active, names, raw, windows)
+            shadow_X = self._model_inputs(shadow, names, raw, windows) if shadow is not None else None
+            # A non-finite row (e.g. Volume_Ratio over a zero volume average) would fail the whole call
+            finite = np.isfinite(X.to_numpy()).all(axis=1)
+            if not finite.all():
+                for symbol in np.asarray(names)[~finite]:
+                    print(f"Error predicting {symbol}: non-finite features")
+                ready = [row for row, ok in zip(ready, finite) if ok]
+                X = X[finite]
+                shadow_X = shadow_X[finite] if shadow_X is not None else None
+        timings['features'] = time.perf_counter() - stage
+
+        # Score every symbol in one vectorized call
+        stage = time.perf_counter()
+        if ready:
+            probabilities = active.scorer.predict_proba(X)
+            classes = active.scorer.classes_[probabilities.argmax(axis=1)]
+            confidences = probabilities.max(axis=1) * 100
+            if shadow is not None:
+                # The shadow may see non-finite rows the served model doesn't; those aren't compared
+                comparable = np.isfinite(shadow_X.to_numpy()).all(axis=1)
+                shadow_classes = []
+                if comparable.any():
+                    shadow_classes = shadow.scorer.classes_[shadow.scorer.predict_proba(shadow_X[comparable]).argmax(axis=1)]
+                with self._shadow_lock:
+                    # Not counted if the shadow was swapped while this batch was scored
+                    if shadow is self._shadow:
+                        for served, shadowed in zip(classes[comparable], shadow_classes):
+                            key = (SIGNAL_MAP[served], SIGNAL_MAP[shadowed])
+                            self.shadow_counts[key] = self.shadow_counts.get(key, 0) + 1
+            timestamp = datetime.fromtimestamp(self.bar_store.clock()).isoformat()
+            for (symbol, bar, features), label, confidence in zip(ready, classes, confidences):
+                predictions.append({
+                    'symbol': symbol,
+                    'signal': SIGNAL_MAP[label],
+                    'confidence': round(float(confidence), 2),
+                    'timestamp': timestamp,
+                    'current_price': float(bar['Close'][-1]),
+                    'volume': float(bar['Volume'][-1]),
+                    'rsi': float(features['RSI'][-1]),
+                    'macd': float(features['MACD'][-1]),
+                    'model_version': active.version
+                })
+        timings['inference'] = time.perf_counter() - stage
+        timings['total'] = time.perf_counter() - started
+        self.last_timings = timings
+        if self.on_batch is not None:
+            self.on_batch(timings)
+        return predictions
+
+    def screen(self, symbols, lookback_days=60):
+        """Score the latest bar of every symbol from one (time x symbol) panel and rank them.
+
+        Bars are refreshed concurrently, then the lookback window of the
+        whole universe is read into a `BarPanel` and indicators, features
+        and normalization are computed for all symbols at once instead of
+        per symbol; indicators warm up inside the window. Returns
+        predictions ranked Buy, Sell, Hold and by confidence within each,
+        skipping symbols whose feature row is not finite; per-stage timings are kept in `self.last_screen_timings`.
+        """
+        active = self._active
+        if active.scorer is None:
+            raise RuntimeError("Model is not loaded. Train the model first.")
+        symbols = [symbol.upper() for symbol in symbols]
+        timings = {}
+        started = time.perf_counter()
+
+        def refresh(symbol):
+            self.bar_store.refresh(symbol, interval=self.interval, lookback_days=lookback_days)
+
+        with ThreadPoolExecutor(max_workers=min(FETCH_WORKERS, max(len(symbols), 1))) as pool:
+            futures = {symbol: pool.submit(refresh, symbol) for symbol in symbols}
+        loaded = []
+        for symbol, future in futures.items():
+            try:
+                future.result()
+                loaded.append(symbol)
+            except Exception as e:
+                print(f"Error screening {symbol}: {str(e)}")
+        timings['refresh'] = time.perf_counter() - started
+
+        stage = time.perf_counter()
+        start = self.bar_store.now().replace(tzinfo=None) - timedelta(days=lookback_days)
+        panel = BarPanel.from_bar_store(self.bar_store, loaded, self.interval, start=start)
+        timings['panel'] = time.perf_counter() - stage
+
+        stage = time.perf_counter()
+        indicators = calculate_panel_indicators(panel)
+        raw = panel_raw_features(panel, indicators)
+        rows = panel.last_rows()
+        listed = np.flatnonzero(rows >= 0)
+        rows = rows[listed]
+        names = [panel.symbols[j] for j in listed]
+        # Window statistics only for symbols the model has none fitted for
+        missing = [i for i, name in enumerate(names) if name not in active.normalization]
+        window = panel_stats(raw[:, listed[missing]]) if missing else None
+        position = {i: k for k, i in enumerate(missing)}
+        X = self._model_inputs(active, names, raw[rows, listed],
+                               lambda i: {'mean': window['mean'][position[i]], 'std': window['std'][position[i]]})
+        # A non-finite row (e.g. Volume_Ratio over a zero volume average) would fail the whole call
+        finite = np.isfinite(X.to_numpy()).all(axis=1)
+        if not finite.all():
+            for symbol in np.asarray(names)[~finite]:
+                print(f"Error screening {symbol}: non-finite features")
+            names = [name for name, ok in zip(names, finite) if ok]
+            rows, listed, X = rows[finite], listed[finite], X[finite]
+        timings['features'] = time.perf_counter() - stage
+
+        stage = time.perf_counter()
+        predictions = []
+        if names:
+            probabilities = active.scorer.predict_proba(X)
+            classes = active.scorer.classes_[probabilities.argmax(axis=1)]
+            confidences = probabilities.max(axis=1) * 100
+            timestamp = datetime.fromtimestamp(self.bar_store.clock()).isoformat()
+            for symbol, row, j, label, confidence in zip(names, rows, listed, classes, confidences):
+                predictions.append({
+                    'symbol': symbol,
+                    'signal': SIGNAL_MAP[label],
+                    'confidence': round(float(confidence), 2),
+                    'timestamp': timestamp,
+                    'bar_time': pd.Timestamp(int(panel.index[row])).isoformat(),
+                    'current_price': float(panel['Close'][row, j]),
+                    'volume': float(panel['Volume'][row, j]),
+                    'rsi': float(indicators['RSI'][row, j]),
+                    'macd': float(indicators['MACD'][row, j]),
+                    'model_version': active.version
+                })
+        predictions.sort(key=lambda p: (SIGNAL_RANK[p['signal']], -p['confidence'], p['symbol']))
+        timings['inference'] = time.perf_counter() - stage
+        timings['total'] = time.perf_counter() - started
+        self.last_screen_timings = timings
+        return predictions
+
     def predict_single_stock(self, symbol):
         """Make prediction for a single stock."""
         try:
-            if self.model is None:
-                raise RuntimeError("Model is not loaded. Train the model first.")
-            # Get recent data
-            df = self.get_live_data(symbol)
-            
-            # Calculate indicators
-            df = calculate_technical_indicators(df)
-            
-            # Prepare features for the latest data point
-            X = prepare_features(df).iloc[-1:]
-            
-            # Make prediction
-            prediction = self.model.predict(X)[0]
-            probabilities = self.model.predict_proba(X)[0]
-            
-            # Map prediction to signal
-            signal_map = {-1: 'Sell', 0: 'Hold', 1: 'Buy'}
-            signal = signal_map[prediction]
-            
-            # Get confidence score
-            confidence = max(probabilities) * 100
-            
-            return {
-                'symbol': symbol,
-                'signal': signal,
-                'confidence': round(confidence, 2),
-                'timestamp': datetime.now().isoformat(),
-                'current_price': df['Close'].iloc[-1],
-                'volume': df['Volume'].iloc[-1],
-                'rsi': df['RSI'].iloc[-1],
-                'macd': df['MACD'].iloc[-1]
-            }
-            
+            predictions = self.predict_batch([symbol])
+            return predictions[0] if predictions else None
         except Exception as e:
             print(f"Error predicting {symbol}: {str(e)}")
             return None
     
     def predict_all_stocks(self):
         """Make predictions for all stocks."""
-        predictions = []
-        if self.model is None:
-            raise RuntimeError("Model is not loaded. Train the model first.")
-        for symbol in self.stocks:
-            pred = self.predict_single_stock(symbol)
-            if pred:
-                predictions.append(pred)
-        return predictions
+        return self.predict_batch(self.stocks)
 
     def get_high_confidence_signals(self, confidence_threshold=70):
         """Get only high-confidence predictions."""
@@ -0,0 +1,166 @@
+import os
+import time
+import argparse
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from bar_store import INTERVAL_SECONDS, BarStore, SyntheticFetcher, normalize_bars, yfinance_fetcher
+
+# Replay time at the anchor (ISO, UTC if no offset is given)
+REPLAY_START = os.getenv('REPLAY_START')
+# Replay seconds per wall second
+REPLAY_SPEED = float(os.getenv('REPLAY_SPEED', '1'))
+# Wall clock epoch seconds at which replay time equals REPLAY_START; set it
+# explicitly when several processes must share one replay clock
+REPLAY_ANCHOR = os.getenv('REPLAY_ANCHOR') or None
+# 'synthetic', or the directory of a recorded bar store
+REPLAY_SOURCE = os.getenv('REPLAY_SOURCE', 'synthetic')
+
+
+def _utc_seconds(value) -> float:
+    stamp = pd.Timestamp(value)
+    if stamp.tzinfo is None:
+        stamp = stamp.tz_localize('UTC')
+    return stamp.timestamp()
+
+
+class ReplayClock:
+    """Epoch seconds on the replay timeline; call it like `time.time`.
+
+    Replay time equals `start` at wall time `anchor` and runs `speed` times
+    faster. It depends on nothing else, so processes given the same three
+    settings (the backend and the local broker stub) agree on "now".
+    """
+
+    def __init__(self, start, speed: float = 1.0, anchor=None):
+        self.start = _utc_seconds(start)
+        self.speed = float(speed)
+        self.anchor = time.time() if anchor is None else float(anchor)
+
+    @classmethod
+    def from_env(cls):
+        if not REPLAY_START:
+            raise ValueError("REPLAY_START must be set to replay market data")
+        return cls(REPLAY_START, REPLAY_SPEED, REPLAY_ANCHOR)
+
+    def __call__(self) -> float:
+        return self.start + (time.time() - self.anchor) * self.speed
+
+    def now(self) -> datetime:
+        return datetime.fromtimestamp(self(), timezone.utc)
+
+    def wall_time(self, replay_seconds: float) -> float:
+        """Wall clock epoch seconds at which the replay reaches `replay_seconds`."""
+        return self.anchor + (replay_seconds - self.start) / self.speed
+
+
+def _read_only(symbol, start, end, interval):
+    raise ValueError(f"Recorded bar store has no more bars for {symbol}")
+
+
+class RecordedSource:
+    """Bars previously recorded into a bar store directory (see `record`)."""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.store = BarStore(root=root, fetcher=_read_only, clock=time.time)
+
+    def __call__(self, symbol, start, end, interval):
+        start = pd.Timestamp(_utc_seconds(start), unit='s')
+        end = pd.Timestamp(_utc_seconds(end), unit='s')
+        return self.store.window(symbol, interval, start=start, end=end)
+
+
+def get_source(name=None):
+    name = name or REPLAY_SOURCE
+    if name == 'synthetic':
+        return SyntheticFetcher()
+    if os.path.isdir(name):
+        return RecordedSource(name)
+    raise ValueError(f"Unknown replay source: {name}")
+
+
+class ReplayFetcher:
+    """Fetcher that serves `source` bars up to the last one closed by `clock`.
+
+    Bars are revealed whole when they close; the forming bar is never
+    returned, so every process sees the same data at the same replay time.
+    """
+
+    def __init__(self, source=None, clock=None):
+        self.source = source or get_source()
+        self.clock = clock or ReplayClock.from_env()
+
+    @classmethod
+    def from_env(cls):
+        return cls(get_source(), ReplayClock.from_env())
+
+    def last_closed(self, interval: str, now: float = None) -> pd.Timestamp:
+        """Open time of the newest bar that has closed by replay time `now`."""
+        step = INTERVAL_SECONDS[interval]
+        now = self.clock() if now is None else now
+        return pd.Timestamp((int(now) // step - 1) * step, unit='s')
+
+    def __call__(self, symbol, start, end, interval):
+        cutoff = self.last_closed(interval)
+        end = min(pd.Timestamp(_utc_seconds(end), unit='s'), cutoff)
+        start = pd.Timestamp(_utc_seconds(start), unit='s')
+        if end < start:
+            return normalize_bars(None)
+        bars = normalize_bars(self.source(symbol, start, end, interval))
+        return bars[bars.index <= cutoff]
+
+    def last_close(self, symbol: str, interval: str = '15m'):
+        """Close of the newest closed bar, or None if the source has none nearby."""
+        cutoff = self.last_closed(interval)
+        bars = self(symbol, cutoff - pd.Timedelta(days=5), cutoff, interval)
+        return float(bars['Close'].iloc[-1]) if len(bars) else None
+
+
+def record(symbols, start, end, root, interval='15m', fetcher=yfinance_fetcher):
+    """Download bars into a bar store directory usable as `REPLAY_SOURCE`."""
+    store = BarStore(root=root, fetcher=fetcher, clock=time.time)
+    for symbol in symbols:
+        try:
+            rows = store.append(symbol, fetcher(symbol, start, end, interval), interval)
+            print(f"Recorded {rows} {interval} bars for {symbol}")
+        except Exception as e:
+            print(f"Error recording {symbol}: {str(e)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Record or inspect market data replays.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    recorder = commands.add_parser('record', help='download bars into a bar store for later replays')
+    recorder.add_argument('--symbols', required=True, help='comma-separated symbols')
+    recorder.add_argument('--start', required=True)
+    recorder.add_argument('--end', required=True)
+    recorder.add_argument('--root', required=True, help='bar store directory to write')
+    recorder.add_argument('--interval', default='15m')
+    show = commands.add_parser('show', help='print the bars a replay reveals over a few seconds')
+    show.add_argument('--symbol', default='AAPL')
+    show.add_argument('--start', required=True, help='replay start time (UTC)')
+    show.add_argument('--speed', type=float, default=600)
+    show.add_argument('--source', default=REPLAY_SOURCE)
+    show.add_argument('--seconds', type=float, default=5)
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args.symbols.split(','), args.start, args.end, args.root, args.interval)
+        return
+    fetcher = ReplayFetcher(get_source(args.source), ReplayClock(args.start, args.speed))
+    last = None
+    deadline = time.time() + args.seconds
+    while time.time() < deadline:
+        cutoff = fetcher.last_closed('15m')
+        if cutoff != last:
+            bars = fetcher(args.symbol, cutoff - pd.Timedelta(hours=1), cutoff, '15m')
+            print(f"replay {fetcher.clock.now():%Y-%m-%d %H:%M:%S}  newest bar {cutoff}  "
+                  f"close {bars['Close'].iloc[-1]:.2f}" if len(bars) else f"no bars by {cutoff}")
+            last = cutoff
+        time.sleep(0.05)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+from bar_store import COLUMNS, INTERVAL_SECONDS
+
+# Where buckets start, in seconds after the epoch (a Thursday). Hours start
+# on the half hour like the US session, weeks on Monday; days are UTC days,
+# which hold a whole US session.
+BUCKET_ORIGINS = {'1h': 1800, '60m': 1800, '1wk': 4 * 86400}
+
+
+def can_derive(interval, base):
+    """Whether `interval` bars are whole multiples of `base` bars."""
+    step, base_step = INTERVAL_SECONDS[interval], INTERVAL_SECONDS[base]
+    return step > base_step and step % base_step == 0 and BUCKET_ORIGINS.get(interval, 0) % base_step == 0
+
+
+def bucket_starts(index, interval):
+    """Start (int64 ns) of the `interval` bucket holding each int64 ns timestamp."""
+    step = INTERVAL_SECONDS[interval] * 10**9
+    origin = BUCKET_ORIGINS.get(interval, 0) * 10**9
+    return (np.asarray(index, dtype=np.int64) - origin) // step * step + origin
+
+
+def resample_arrays(arrays, interval):
+    """Aggregate sorted OHLCV column arrays (as `BarStore.window_arrays` returns) into `interval` bars.
+
+    One pass of reductions over the bucket boundaries: first open, highest
+    high, lowest low, last close and summed volume. Bars are labelled with
+    the bucket start; the last bucket may still be open.
+    """
+    index = np.asarray(arrays['index'], dtype=np.int64)
+    if not len(index):
+        return {'index': index[:0], **{col: np.empty(0) for col in COLUMNS}}
+    buckets = bucket_starts(index, interval)
+    first = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    last = np.r_[first[1:], len(index)] - 1
+    return {
+        'index': buckets[first],
+        'Open': np.asarray(arrays['Open'])[first],
+        'High': np.maximum.reduceat(arrays['High'], first),
+        'Low': np.minimum.reduceat(arrays['Low'], first),
+        'Close': np.asarray(arrays['Close'])[last],
+        'Volume': np.add.reduceat(arrays['Volume'], first),
+    }
+
+
+def resample(bars, interval):
+    """`resample_arrays` for an OHLCV DataFrame with a sorted DatetimeIndex."""
+    arrays = {col: bars[col].to_numpy(np.float64) for col in COLUMNS}
+    arrays['index'] = bars.index.values.astype('datetime64[ns]').astype(np.int64)
+    arrays = resample_arrays(arrays, interval)
+    index = pd.DatetimeIndex(arrays.pop('index').view('datetime64[ns]'))
+    return pd.DataFrame(arrays, index=index, columns=COLUMNS)
+
+
+if __name__ == '__main__':
+    # Check against pandas on synthetic 1m bars, including a partial last bucket
+    from bar_store import SyntheticFetcher
+
+    bars = SyntheticFetcher()('TEST', '2026-05-01', '2026-06-03 14:07', '1m')
+    bars = bars[bars.index.dayofweek < 5]
+    for interval, rule, offset in [('15m', '15min', None), ('1h', '1h', '30min'),
+                                   ('1d', '1D', None), ('1wk', 'W-MON', None)]:
+        kwargs = {'closed': 'left', 'label': 'left'} if interval == '1wk' else {'offset': offset}
+        expected = bars.resample(rule, **kwargs).agg(
+            {'Open': 'first', 'High': 'max', 'Low': 'min', 'Close': 'last', 'Volume': 'sum'}).dropna()
+        expected.index = expected.index.as_unit('ns')
+        got = resample(bars, interval)
+        pd.testing.assert_frame_equal(got, expected, check_freq=False, check_names=False)
+        print(f"{interval}: {len(got)} bars match pandas")
@@ -1,15 +1,30 @@
-import yfinance as yf
-import pandas as pd
+import os
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import classification_report
-import joblib
-from datetime import datetime, timedelta
+from bar_store import INTERVAL_SECONDS
 
 # Stock symbols to track
 STOCKS = ['AAPL', 'MSFT', 'TSLA', 'AMZN', 'GOOGL', 'NVDA', 'META', 'NFLX', 'AMD', 'BABA']
 
+def load_universe(path):
+    """Read tickers from a text or CSV file.
+
+    Accepts one or more tickers per line separated by commas or whitespace,
+    `#` comments, and an optional `symbol` header row. Order is kept and
+    duplicates are dropped.
+    """
+    symbols = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#', 1)[0]
+            for token in line.replace(',', ' ').split():
+                token = token.strip().upper()
+                if token and token not in ('SYMBOL', 'TICKER'):
+                    symbols.append(token)
+    return list(dict.fromkeys(symbols))
+
+# Bar interval the model is trained on and scored on; both sides must agree
+MODEL_INTERVAL = os.getenv('MODEL_INTERVAL', '15m')
+
 def calculate_technical_indicators(df):
     """Calculate technical indicators for feature engineering."""
     # RSI
@@ -30,10 +45,11 @@ def calculate_technical_indicators(df):
     df['MACD'] = exp1 - exp2
     df['Signal_Line'] = df['MACD'].ewm(span=9, adjust=False).mean()
     
-    # Bollinger Bands
-    df['BB_middle'] = df['Close'].rolling(window=20).mean()
-    df['BB_upper'] = df['BB_middle'] + 2 * df['Close'].rolling(window=20).std()
-    df['BB_lower'] = df['BB_middle'] - 2 * df['Close'].rolling(window=20).std()
+    # Bollinger Bands (reuse the 20-period mean, compute the std once)
+    df['BB_middle'] = df['SMA_20']
+    std_20 = df['Close'].rolling(window=20).std()
+    df['BB_upper'] = df['BB_middle'] + 2 * std_20
+    df['BB_lower'] = df['BB_middle'] - 2 * std_20
     
     # Volume indicators
     df['Volume_SMA'] = df['Volume'].rolling(window=20).mean()
@@ -41,90 +57,72 @@ def calculate_technical_indicators(df):
     
     return df
 
-def create_labels(df, threshold=0.02):
+# Bars ahead whose return decides the label
+LABEL_HORIZON = 5
+
+def forward_returns(df, periods=LABEL_HORIZON):
+    """Return from each bar's close to the close `periods` bars later."""
+    return df['Close'].pct_change(periods=periods).shift(-periods)
+
+# Move over the label horizon that counts as Buy/Sell on daily bars
+DAILY_LABEL_THRESHOLD = 0.02
+
+def label_threshold(interval):
+    """Buy/Sell threshold for `interval` bars, scaled from the daily one by the square root of time."""
+    return DAILY_LABEL_THRESHOLD * np.sqrt(INTERVAL_SECONDS[interval] / INTERVAL_SECONDS['1d'])
+
+def create_labels(df, threshold=DAILY_LABEL_THRESHOLD):
     """Create labels based on future price movements.
     Buy (1) if price increases by threshold%
     Sell (-1) if price decreases by threshold%
     Hold (0) otherwise
     """
-    future_returns = df['Close'].pct_change(periods=5).shift(-5)  # 5-day future returns
+    future_returns = forward_returns(df)  # 5-bar future returns
     df['Label'] = 0  # Hold by default
     df.loc[future_returns > threshold, 'Label'] = 1  # Buy
     df.loc[future_returns < -threshold, 'Label'] = -1  # Sell
     return df
 
-def prepare_features(df):
-    """Prepare feature matrix for ML model."""
-    features = [
-        'RSI', 'SMA_20', 'SMA_50', 'EMA_20', 'MACD', 'Signal_Line',
-        'BB_middle', 'BB_upper', 'BB_lower', 'Volume_Ratio'
-    ]
-    
+# Model inputs, in column order
+FEATURES = [
+    'RSI', 'SMA_20', 'SMA_50', 'EMA_20', 'MACD', 'Signal_Line',
+    'BB_middle', 'BB_upper', 'BB_lower', 'Volume_Ratio',
+    'Price_to_SMA20', 'Price_to_SMA50'
+]
+
+def normalization_stats(X):
+    """Per-feature mean and std of a raw (unnormalized) feature frame.
+
+    These are the statistics fitted at training time; they are stored with
+    the model so inference normalizes with the same values.
+    """
+    X = X[FEATURES].astype('float64')
+    return {'mean': X.mean().tolist(), 'std': X.std().tolist()}
+
+def prepare_features(df, stats=None):
+    """Prepare feature matrix for ML model.
+
+    Features are normalized with fitted `stats` (see `normalization_stats`)
+    when given, and otherwise over the whole frame.
+    """
     # Add price-based features
     df['Price_to_SMA20'] = df['Close'] / df['SMA_20']
     df['Price_to_SMA50'] = df['Close'] / df['SMA_50']
-    features.extend(['Price_to_SMA20', 'Price_to_SMA50'])
     
     # Normalize features
-    for feature in features:
-        df[feature] = (df[feature] - df[feature].mean()) / df[feature].std()
+    for i, feature in enumerate(FEATURES):
+        if stats is not None:
+            df[feature] = (df[feature] - stats['mean'][i]) / stats['std'][i]
+        else:
+            df[feature] = (df[feature] - df[feature].mean()) / df[feature].std()
     
-    return df[features].fillna(0)
+    return df[FEATURES].fillna(0)
 
-def train_model():
-    """Train ML model on historical data and save it."""
-    all_features = []
-    all_labels = []
-    
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=180)  # 6 months of data
-    
-    for symbol in STOCKS:
-        print(f"Processing {symbol}...")
-        # Download historical data
-        df = yf.download(symbol, start=start_date, end=end_date)
-        
-        # Calculate indicators and create labels
-        df = calculate_technical_indicators(df)
-        df = create_labels(df)
-        
-        # Prepare features
-        X = prepare_features(df)
-        y = df['Label']
-        
-        # Remove rows with NaN values
-        valid_idx = ~(X.isna().any(axis=1) | y.isna())
-        X = X[valid_idx]
-        y = y[valid_idx]
-        
-        all_features.append(X)
-        all_labels.append(y)
-    
-    # Combine data from all stocks
-    X = pd.concat(all_features)
-    y = pd.concat(all_labels)
-    
-    # Split data
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42
-    )
-    
-    # Train Random Forest model
-    model = RandomForestClassifier(
-        n_estimators=100,
-        max_depth=10,
-        random_state=42
-    )
-    model.fit(X_train, y_train)
-    
-    # Evaluate model
-    y_pred = model.predict(X_test)
-    print("\nModel Performance:")
-    print(classification_report(y_test, y_pred, target_names=['Sell', 'Hold', 'Buy']))
-    
-    # Save model
-    joblib.dump(model, 'model.pkl')
-    print("\nModel saved as model.pkl")
+def train_model(bar_store=None):
+    """Train ML model on historical data for the watch list and save it."""
+    # Imported here because the pipeline builds on the helpers above
+    from training_pipeline import TrainingPipeline
+    return TrainingPipeline(bar_store=bar_store).run(STOCKS)
 
 if __name__ == '__main__':
     train_model()
\ No newline at end of file
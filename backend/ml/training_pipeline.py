@@ -0,0 +1,240 @@
+import os
+import sys
+import time
+import resource
+import argparse
+import multiprocessing
+import numpy as np
+import pandas as pd
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import classification_report
+import joblib
+from bar_store import BarStore
+from feature_store import FeatureStore, feature_matrix, normalize
+from forest_engine import export_forest
+from model_registry import ModelRegistry
+from train_model import STOCKS, FEATURES, MODEL_INTERVAL, create_labels, label_threshold, load_universe, normalization_stats
+
+# Concurrent bar downloads while building the training set
+TRAIN_FETCH_WORKERS = int(os.getenv('TRAIN_FETCH_WORKERS', '16'))
+
+# Worker processes for indicators and labels (default: one per core)
+TRAIN_PROCESS_WORKERS = int(os.getenv('TRAIN_PROCESS_WORKERS', str(os.cpu_count() or 1)))
+
+
+def symbol_training_rows(feature_store, symbol, interval, start):
+    """Labels, fitted normalization and features for one symbol as compact arrays.
+
+    Runs in a worker process: materializes any bars the feature store has
+    not seen, then reads the training window as views of its columns.
+    Returns (float32 X, int8 y, (first bar, last bar), normalization stats).
+    """
+    feature_store.sync(symbol, interval)
+    features = feature_store.window(symbol, interval, start=start)
+    if features.empty:
+        raise ValueError(f"No data available for {symbol}")
+    bars = feature_store.bar_store.window(symbol, interval, start=features.index[0], end=features.index[-1])
+    if not bars.index.equals(features.index):
+        raise ValueError(f"Bars for {symbol} changed while reading features")
+    stats = normalization_stats(features)
+    X = normalize(feature_matrix(features), stats)
+    y = create_labels(bars, label_threshold(interval))['Label'].to_numpy(np.int8)
+    return X, y, (features.index[0], features.index[-1]), stats
+
+
+def peak_memory_mb():
+    """Peak resident set size of this process and of its largest child, in MB."""
+    scale = 1 / 1024 if sys.platform != 'darwin' else 1 / (1024 * 1024)
+    return {
+        'main': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale, 1),
+        'workers': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale, 1),
+    }
+
+
+class TrainingPipeline:
+    """Train the signal model over an arbitrary universe of symbols.
+
+    Bars are refreshed on a thread pool and each symbol is handed to a
+    process pool as soon as it arrives, so downloads and feature work
+    overlap. Workers only compute features for bars the feature store has
+    not materialized yet and fit each symbol's normalization statistics,
+    which are registered with the model. Per-symbol rows are copied once
+    into a preallocated float32 matrix and the forest is fitted on every core.
+    """
+
+    def __init__(self, bar_store=None, fetch_workers=None, process_workers=None,
+                 interval=MODEL_INTERVAL, lookback_days=180, n_estimators=100, max_depth=10, feature_store=None):
+        self.fetch_workers = fetch_workers or TRAIN_FETCH_WORKERS
+        self.process_workers = TRAIN_PROCESS_WORKERS if process_workers is None else process_workers
+        self.bar_store = bar_store or BarStore(fetch_concurrency=self.fetch_workers)
+        self.feature_store = feature_store or FeatureStore(self.bar_store)
+        self.interval = interval
+        self.lookback_days = lookback_days
+        self.n_estimators = n_estimators
+        self.max_depth = max_depth
+        self.timings = {}
+        self.memory = {}
+        self.failed = []
+        self.window = None
+        self.normalization = {}
+
+    def _stage(self, name, started):
+        self.timings[name] = round(time.perf_counter() - started, 3)
+        self.memory[name] = peak_memory_mb()
+
+    def _load(self, symbol):
+        return self.bar_store.refresh(symbol, interval=self.interval, lookback_days=self.lookback_days)
+
+    def build_dataset(self, symbols):
+        """Return (X, y, feature names) for every symbol that loaded."""
+        started = time.perf_counter()
+        start = self.bar_store.now().replace(tzinfo=None) - timedelta(days=self.lookback_days)
+        results = {}
+        # spawn: forking while download threads hold locks can deadlock the child
+        process_pool = (
+            ProcessPoolExecutor(max_workers=self.process_workers, mp_context=multiprocessing.get_context('spawn'))
+            if self.process_workers > 1 else None
+        )
+        try:
+            with ThreadPoolExecutor(max_workers=self.fetch_workers) as fetch_pool:
+                fetches = {fetch_pool.submit(self._load, symbol): symbol for symbol in symbols}
+                pending = {}
+                for job in as_completed(fetches):
+                    symbol = fetches[job]
+                    try:
+                        job.result()
+                        if process_pool is None:
+                            results[symbol] = symbol_training_rows(self.feature_store, symbol, self.interval, start)
+                    except Exception as e:
+                        print(f"Error loading {symbol}: {str(e)}")
+                        self.failed.append(symbol)
+                        continue
+                    if process_pool is not None:
+                        job = process_pool.submit(symbol_training_rows, self.feature_store, symbol, self.interval, start)
+                        pending[job] = symbol
+            self._stage('fetch', started)
+
+            for job in as_completed(pending):
+                try:
+                    results[pending[job]] = job.result()
+                except Exception as e:
+                    print(f"Error processing {pending[job]}: {str(e)}")
+                    self.failed.append(pending[job])
+            self._stage('features', started)
+        finally:
+            if process_pool is not None:
+                process_pool.shutdown()
+
+        if not results:
+            raise RuntimeError('No training data loaded')
+        assemble_started = time.perf_counter()
+        features = list(FEATURES)
+        self.window = (min(r[2][0] for r in results.values()), max(r[2][1] for r in results.values()))
+        total = sum(len(r[1]) for r in results.values())
+        X = np.empty((total, len(features)), dtype=np.float32)
+        y = np.empty(total, dtype=np.int8)
+        offset = 0
+        # In `symbols` order, not completion order, so the same bars train the same model
+        for symbol in [symbol for symbol in symbols if symbol in results]:
+            X_part, y_part, _, stats = results.pop(symbol)
+            self.normalization[symbol.upper()] = stats
+            X[offset:offset + len(y_part)] = X_part
+            y[offset:offset + len(y_part)] = y_part
+            offset += len(y_part)
+        self._stage('assemble', assemble_started)
+        return X, y, features
+
+    def run(self, symbols, model_path='model.pkl', forest_path='model_forest', registry=None, promote=True):
+        """Build the dataset, fit and evaluate the forest, and save it.
+
+        The model is also registered as a new version in the model registry
+        and, with `promote`, becomes the version running servers load next.
+        """
+        total_started = time.perf_counter()
+        X, y, features = self.build_dataset(symbols)
+        print(f"Training set: {len(y)} rows from {len(symbols) - len(self.failed)} symbols "
+              f"({len(self.failed)} failed)")
+
+        started = time.perf_counter()
+        # Feature names match what predict.py scores; float32 is what the trees use internally
+        X = pd.DataFrame(X, columns=features, copy=False)
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+        model = RandomForestClassifier(
+            n_estimators=self.n_estimators,
+            max_depth=self.max_depth,
+            random_state=42,
+            n_jobs=-1
+        )
+        model.fit(X_train, y_train)
+        self._stage('fit', started)
+
+        started = time.perf_counter()
+        y_pred = model.predict(X_test)
+        print("\nModel Performance:")
+        print(classification_report(y_test, y_pred, labels=[-1, 0, 1], target_names=['Sell', 'Hold', 'Buy'], zero_division=0))
+        report = classification_report(y_test, y_pred, labels=[-1, 0, 1], target_names=['Sell', 'Hold', 'Buy'],
+                                       zero_division=0, output_dict=True)
+        self._stage('evaluate', started)
+
+        started = time.perf_counter()
+        joblib.dump(model, model_path)
+        export_forest(model, forest_path)
+        print(f"\nModel saved as {model_path}, compiled forest exported to {forest_path}/")
+        registry = registry or ModelRegistry()
+        version = registry.register(model, {
+            'feature_names': features,
+            'training': {
+                'symbols': len(symbols) - len(self.failed),
+                'failed_symbols': len(self.failed),
+                'interval': self.interval,
+                'label_threshold': round(float(label_threshold(self.interval)), 6),
+                'lookback_days': self.lookback_days,
+                'start': self.window[0].isoformat(),
+                'end': self.window[1].isoformat(),
+                'rows': int(len(y)),
+            },
+            'metrics': {
+                'accuracy': round(report['accuracy'], 4),
+                **{label: {k: round(v, 4) for k, v in report[label].items()} for label in ('Sell', 'Hold', 'Buy')},
+            },
+        }, promote=promote, normalization={'features': features, 'symbols': self.normalization})
+        print(f"Registered model version {version}{' (current)' if promote else ''}")
+        self._stage('save', started)
+        self._stage('total', total_started)
+        self.report()
+        return model
+
+    def report(self):
+        print("\nStage timings (s) and peak memory (MB):")
+        for stage, seconds in self.timings.items():
+            memory = self.memory[stage]
+            print(f"  {stage:10s} {seconds:9.3f}   main={memory['main']:8.1f}  workers={memory['workers']:8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Train the signal model over a universe of symbols.')
+    parser.add_argument('--universe', help='text/CSV file of tickers (default: the built-in watch list)')
+    parser.add_argument('--fetch-workers', type=int, default=TRAIN_FETCH_WORKERS)
+    parser.add_argument('--process-workers', type=int, default=TRAIN_PROCESS_WORKERS)
+    parser.add_argument('--interval', default=MODEL_INTERVAL, help='bar interval to train on (default: MODEL_INTERVAL)')
+    parser.add_argument('--lookback-days', type=int, default=180)
+    parser.add_argument('--model-path', default='model.pkl')
+    parser.add_argument('--forest-path', default='model_forest')
+    parser.add_argument('--no-promote', action='store_true', help='register without making it the served version')
+    args = parser.parse_args()
+
+    symbols = load_universe(args.universe) if args.universe else STOCKS
+    pipeline = TrainingPipeline(
+        fetch_workers=args.fetch_workers,
+        process_workers=args.process_workers,
+        interval=args.interval,
+        lookback_days=args.lookback_days
+    )
+    pipeline.run(symbols, model_path=args.model_path, forest_path=args.forest_path, promote=not args.no_promote)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,62 +1,413 @@
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response, StreamingResponse
+from typing import List, Dict, Any, Callable, Hashable, Optional
 from datetime import datetime
+import asyncio
+import json
 import sys
 import os
+import pandas as pd
 
 # Add ML directory to path
 sys.path.append(os.path.join(os.path.dirname(__file__), '../ml'))
 
 from predict import StockPredictor
+from train_model import FEATURES, load_universe
+from bar_store import INTERVAL_SECONDS
+from history import ChartHistory
+from utils import metrics, serialization
 from utils.ai_suggestions import AISuggestionGenerator
+from utils.executor import run_blocking
+from utils.llm_cache import LLMCache
+from utils.prediction_cache import PredictionCache
+from utils.signal_scheduler import SignalScheduler
 
 router = APIRouter()
 predictor = StockPredictor()
-ai = AISuggestionGenerator()
+predictor.bar_store.fetcher = metrics.instrumented(predictor.bar_store.fetcher, 'market_data', 'bars')
+predictor.on_batch = lambda timings: metrics.observe_stages('predict', timings)
+# Reuse LLM responses for near-identical prompts, persisted across restarts
+llm_cache = LLMCache() if os.getenv('LLM_CACHE_ENABLED', 'true').lower() == 'true' else None
+ai = AISuggestionGenerator(cache=llm_cache)
+# Bars close on the bar store's clock: wall time, or replay time with BAR_FETCHER=replay.
+# A derived timeframe's open bar changes with every bar of the feed it is resampled from.
+clock = predictor.bar_store.clock
+cache = PredictionCache(
+    max_entries=int(os.getenv('PREDICTION_CACHE_SIZE', '1024')),
+    bar_seconds=INTERVAL_SECONDS[predictor.bar_store.feed_interval(predictor.interval)],
+    clock=clock
+)
+
+# Cache key symbol for the full watch-list batch
+ALL_STOCKS = '*'
+
+# Encoded prediction responses, reused while their snapshot is current
+bodies = serialization.EncodedBodies(max_entries=int(os.getenv('RESPONSE_CACHE_SIZE', '256')))
+
+def encoded_response(request: Request, key: Hashable, source: Any,
+                     build: Optional[Callable[[], Any]] = None) -> Response:
+    """Serve `build()` (or `source`) in the format the Accept header asks for, with an ETag.
+
+    The body is encoded once per `source` object (a snapshot) and format,
+    and a request whose If-None-Match still names it gets a 304.
+    """
+    fmt = serialization.negotiate(request.headers.get('accept'))
+    body, etag = bodies.encode(key, source, fmt, build)
+    return conditional_response(request, body, etag, fmt)
+
+def conditional_response(request: Request, body: bytes, etag: str, fmt: str) -> Response:
+    """`body` with its ETag, or an empty 304 if the request's If-None-Match names it."""
+    headers = {"ETag": etag, "Vary": "Accept", "Cache-Control": "no-cache"}
+    if serialization.etag_matches(request.headers.get('if-none-match'), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type=serialization.MEDIA_TYPES[fmt], headers=headers)
+
+# Tickers the screener ranks: a universe file (see `load_universe`), by default the watch list
+SCREENER_UNIVERSE = os.getenv('SCREENER_UNIVERSE')
+screener_symbols = load_universe(SCREENER_UNIVERSE) if SCREENER_UNIVERSE else predictor.stocks
+# Cache key symbol for the screener's ranking of the universe
+SCREENER = '#screener'
+# Symbols the per-symbol endpoints serve. Bar, feature and chart state is kept per symbol
+# and never evicted, so arbitrary symbols would grow it without bound.
+served_symbols = frozenset(symbol.upper() for symbol in (*predictor.stocks, *screener_symbols))
+
+def served_symbol(symbol: str) -> str:
+    """`symbol` uppercased, or a 404 if it is in neither the watch list nor the screener universe."""
+    symbol = symbol.upper()
+    if symbol not in served_symbols:
+        raise HTTPException(status_code=404, detail=f"Unknown symbol: {symbol}")
+    return symbol
+
+# Downsampled chart history over the predictor's bar and feature stores
+history = ChartHistory(predictor.bar_store, predictor.feature_store)
+# Largest point budget a history request may ask for
+HISTORY_MAX_POINTS = int(os.getenv('HISTORY_MAX_POINTS', '5000'))
+
+async def get_all_predictions() -> List[Dict[str, Any]]:
+    """Return the current bar's batch, computing it once for all concurrent callers."""
+    key = cache.key(ALL_STOCKS, predictor.model_version)
+
+    async def compute():
+        predictions = await run_blocking(predictor.predict_all_stocks, upstream='predictor')
+        # Seed per-symbol entries so single-stock requests reuse the batch
+        for prediction in predictions:
+            cache.set(cache.key(prediction['symbol'], predictor.model_version), prediction)
+        return predictions
+
+    return await cache.get_or_compute(key, compute)
+
+scheduler = SignalScheduler(
+    get_all_predictions,
+    bar_seconds=INTERVAL_SECONDS[predictor.bar_store.feed_interval(predictor.interval)],
+    delay_seconds=float(os.getenv('SIGNAL_SCHEDULER_DELAY', '5')),
+    clock=clock
+)
+
+def llm_cache_metrics():
+    """LLM cache lookups by endpoint and result."""
+    if llm_cache is None:
+        return []
+    stats = llm_cache.stats()
+    lookups = [({'endpoint': endpoint, 'result': result}, counters[result])
+               for endpoint, counters in stats['endpoints'].items()
+               for result in ('hits', 'disk_hits', 'misses', 'coalesced')]
+    return [
+        ('stockgenie_llm_cache_lookups_total', 'counter', 'LLM cache lookups by result', lookups),
+        ('stockgenie_llm_cache_entries', 'gauge', 'LLM responses cached in memory', [({}, stats['entries'])]),
+        ('stockgenie_llm_cache_in_flight', 'gauge', 'LLM requests being computed', [({}, stats['in_flight'])]),
+        ('stockgenie_llm_cache_evictions_total', 'counter', 'LLM cache evictions', [({}, stats['evictions'])]),
+    ]
+
+metrics.registry.add_collector(metrics.stats_collector(
+    'stockgenie_prediction_cache', cache.stats,
+    counters=('hits', 'misses', 'coalesced', 'evictions'), gauges=('entries', 'in_flight', 'hit_rate')))
+metrics.registry.add_collector(llm_cache_metrics)
+metrics.registry.add_collector(metrics.stats_collector(
+    'stockgenie_response_cache', bodies.stats, counters=('hits', 'misses'), gauges=('entries',)))
+metrics.registry.add_collector(metrics.stats_collector(
+    'stockgenie_signal_scheduler', scheduler.stats, gauges=('running', 'symbols', 'subscribers')))
+
+# Seconds between SSE keep-alive comments on an idle stream
+SSE_KEEPALIVE_SECONDS = 15
+
+# Seconds between checks of the model registry's current pointer
+MODEL_POLL_SECONDS = float(os.getenv('MODEL_POLL_SECONDS', '30'))
+model_watcher: Optional[asyncio.Task] = None
+
+async def reload_model() -> bool:
+    """Load a newly promoted model off the event loop, then refresh signals with it.
+
+    Requests keep being served by the previous version until the swap.
+    """
+    changed = await run_blocking(predictor.refresh_model)
+    if changed and scheduler.ready:
+        await scheduler.refresh()
+    return changed
+
+async def watch_model():
+    while True:
+        await asyncio.sleep(MODEL_POLL_SECONDS)
+        try:
+            await reload_model()
+        except Exception as e:
+            print(f"Model reload failed: {str(e)}")
+
+def start_model_watcher():
+    global model_watcher
+    if model_watcher is None:
+        model_watcher = asyncio.create_task(watch_model())
+
+async def stop_model_watcher():
+    global model_watcher
+    if model_watcher is not None:
+        model_watcher.cancel()
+        try:
+            await model_watcher
+        except asyncio.CancelledError:
+            pass
+        model_watcher = None
 
 @router.get("/predictions", response_model=List[Dict[str, Any]])
-async def get_predictions():
+async def get_predictions(request: Request):
     """Get predictions for all stocks."""
     try:
-        predictions = predictor.predict_all_stocks()
-        return predictions
+        predictions = scheduler.predictions if scheduler.ready else await get_all_predictions()
+        return encoded_response(request, 'predictions', predictions)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/predictions/{symbol}", response_model=Dict[str, Any])
-async def get_stock_prediction(symbol: str):
+async def get_stock_prediction(symbol: str, request: Request):
     """Get prediction for a specific stock."""
     try:
-        prediction = predictor.predict_single_stock(symbol)
+        symbol = served_symbol(symbol)
+        if symbol in scheduler.by_symbol:
+            return encoded_response(request, ('prediction', symbol), scheduler.by_symbol[symbol])
+        prediction = await cache.get_or_compute(
+            cache.key(symbol, predictor.model_version),
+            lambda: run_blocking(predictor.predict_single_stock, symbol, upstream='predictor')
+        )
         if not prediction:
             raise HTTPException(status_code=404, detail=f"No prediction available for {symbol}")
-        return prediction
+        return encoded_response(request, ('prediction', symbol), prediction)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/signals", response_model=List[Dict[str, Any]])
-async def get_high_confidence_signals(confidence_threshold: float = 70):
+async def get_high_confidence_signals(request: Request, confidence_threshold: float = 70):
     """Get high confidence trading signals."""
     try:
-        signals = predictor.get_high_confidence_signals(confidence_threshold)
-        return signals
+        predictions = scheduler.predictions if scheduler.ready else await get_all_predictions()
+        return encoded_response(
+            request, ('signals', confidence_threshold), predictions,
+            lambda: [pred for pred in predictions if pred['confidence'] >= confidence_threshold]
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/screener")
+async def get_screener(request: Request, signal: Optional[str] = None, min_confidence: float = 0, limit: int = 50):
+    """Rank the screener universe by signal and confidence on its latest bars.
+
+    The whole universe is scored once per bar; `signal` (Buy, Sell or Hold)
+    and `min_confidence` filter that ranking.
+    """
+    try:
+        async def compute():
+            ranked = await run_blocking(predictor.screen, screener_symbols, upstream='predictor')
+            metrics.observe_stages('screener', predictor.last_screen_timings)
+            return ranked
+
+        ranked = await cache.get_or_compute(cache.key(SCREENER, predictor.model_version), compute)
+
+        def build():
+            results = [pred for pred in ranked
+                       if (signal is None or pred['signal'].lower() == signal.lower()) and pred['confidence'] >= min_confidence]
+            return {"universe": len(screener_symbols), "scored": len(ranked), "results": results[:limit]}
+
+        return encoded_response(request, ('screener', signal and signal.lower(), min_confidence, limit), ranked, build)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/history/{symbol}")
+async def get_history(symbol: str, request: Request, interval: str = '15m', start: Optional[str] = None,
+                      end: Optional[str] = None, points: int = 300, style: str = 'candles',
+                      overlays: Optional[str] = None):
+    """Price history of a symbol between `start` and `end`, downsampled to at most `points`.
+
+    `style=candles` returns OHLCV buckets, `style=line` closes picked by
+    LTTB; `overlays` is a comma-separated list of indicator columns (e.g.
+    SMA_20,RSI) sampled at the same bars. Served from min/max pyramids, so
+    the cost follows `points`, not the length of the range.
+    """
+    symbol = served_symbol(symbol)
+    if interval not in INTERVAL_SECONDS:
+        raise HTTPException(status_code=400, detail=f"Unknown interval: {interval}")
+    if style not in ('candles', 'line'):
+        raise HTTPException(status_code=400, detail="style must be 'candles' or 'line'")
+    if not 3 <= points <= HISTORY_MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"points must be between 3 and {HISTORY_MAX_POINTS}")
+    names = [name.strip() for name in overlays.split(',') if name.strip()] if overlays else []
+    unknown = [name for name in names if name not in FEATURES]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown overlays: {', '.join(unknown)}")
+    try:
+        start, end = (pd.Timestamp(value) if value else None for value in (start, end))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        payload, timings = await run_blocking(
+            history.query, symbol, interval, start, end, points, style, names
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    metrics.observe_stages('history', timings)
+    fmt = serialization.negotiate(request.headers.get('accept'))
+    body = serialization.encode(payload, fmt)
+    return conditional_response(request, body, serialization.etag(body), fmt)
+
+@router.get("/cache/stats")
+async def get_cache_stats():
+    """Get prediction cache hit/miss/coalesce counters."""
+    return dict(cache.stats(), responses=bodies.stats())
+
+@router.get("/stream")
+async def stream_predictions():
+    """Push prediction updates as Server-Sent Events.
+
+    Sends a `snapshot` event with every prediction on connect, then `delta`
+    events with only the symbols whose signal or confidence changed and
+    `removed` events with the symbols no longer in the snapshot.
+    """
+    async def events():
+        queue = scheduler.subscribe()
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), timeout=SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                data = json.dumps(jsonable_encoder(message['data']))
+                yield f"id: {message['version']}\nevent: {message['event']}\ndata: {data}\n\n"
+        finally:
+            scheduler.unsubscribe(queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.get("/scheduler/status")
+async def get_scheduler_status():
+    """Get background signal scheduler state."""
+    return scheduler.stats()
 
 @router.get("/model/info")
 async def get_model_info():
     """Get information about the current model."""
     try:
+        meta = predictor.model_meta
+        last_updated = meta.get('created_at')
+        if last_updated is None and os.path.exists(predictor.model_path):
+            last_updated = datetime.fromtimestamp(os.path.getmtime(predictor.model_path)).isoformat()
         return {
             "stocks": predictor.stocks,
             "model_type": "RandomForest",
-            "last_updated": datetime.fromtimestamp(
-                os.path.getmtime(os.path.join(os.path.dirname(__file__), '../ml/model.pkl'))
-            ).isoformat()
+            "version": predictor.model_version,
+            "engine": predictor.engine,
+            "last_updated": last_updated,
+            "features": meta.get('feature_names'),
+            "training": meta.get('training'),
+            "metrics": meta.get('metrics'),
+            "shadow": predictor.shadow_stats(),
+            "last_batch_timings": predictor.last_timings
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/model/versions")
+async def get_model_versions():
+    """List registered model versions and the one currently served."""
+    versions = await run_blocking(predictor.registry.versions)
+    return {
+        "current": await run_blocking(predictor.registry.current),
+        "serving": predictor.model_version,
+        "versions": versions
+    }
+
+@router.post("/model/promote")
+async def promote_model(payload: Dict[str, Any]):
+    """Point the registry at a version and hot-swap it in."""
+    version = payload.get("version")
+    if not version:
+        raise HTTPException(status_code=400, detail="Missing 'version' in request body")
+    try:
+        await run_blocking(predictor.registry.set_current, version)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await reload_model()
+    return {"serving": predictor.model_version}
+
+@router.post("/model/rollback")
+async def rollback_model(payload: Optional[Dict[str, Any]] = None):
+    """Step back to the previously promoted version (or a given one) and hot-swap it in."""
+    try:
+        version = await run_blocking(predictor.registry.rollback, (payload or {}).get("version"))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await reload_model()
+    return {"serving": predictor.model_version, "rolled_back_to": version}
+
+@router.post("/model/shadow")
+async def set_shadow_model(payload: Dict[str, Any]):
+    """Score a second version alongside the served one; `{"version": null}` stops."""
+    try:
+        await run_blocking(predictor.set_shadow, payload.get("version"))
+    except ValueError:
+        raise HTTPException(status_code=404, detail="Unknown model version")
+    except OSError:
+        raise HTTPException(status_code=500, detail="Model version could not be loaded")
+    return predictor.shadow_stats()
+
+@router.get("/model/shadow")
+async def get_shadow_stats():
+    """Agreement between the served and shadow model versions."""
+    return predictor.shadow_stats()
+
+@router.get("/suggestions", response_model=List[Dict[str, Any]])
+async def get_signal_suggestions(confidence_threshold: float = 70):
+    """Get high confidence signals with an AI suggestion for each, generated concurrently."""
+    try:
+        predictions = scheduler.predictions if scheduler.ready else await get_all_predictions()
+        signals = [pred for pred in predictions if pred['confidence'] >= confidence_threshold]
+        suggestions = await ai.generate_suggestions(signals)
+        return [dict(signal, suggestion=suggestion) for signal, suggestion in zip(signals, suggestions)]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/summary")
+async def get_market_summary():
+    """Get a short AI market summary of the current predictions."""
+    try:
+        predictions = scheduler.predictions if scheduler.ready else await get_all_predictions()
+        return {"summary": await ai.generate_market_summary(predictions)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/suggestions/cache/stats")
+async def get_suggestion_cache_stats():
+    """LLM response cache counters, with hit rates per endpoint."""
+    if llm_cache is None:
+        return {"enabled": False}
+    return dict(llm_cache.stats(), enabled=True)
+
 @router.post("/suggest")
 async def generate_suggestion(payload: Dict[str, Any]):
     """Generate a freeform AI suggestion for the chat assistant."""
@@ -69,4 +420,30 @@ async def generate_suggestion(payload: Dict[str, Any]):
     except HTTPException:
         raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/suggest/stream")
+async def stream_suggestion(payload: Dict[str, Any]):
+    """Stream a freeform AI suggestion as Server-Sent Events.
+
+    Sends a `token` event per chunk as the upstream generates it, then a
+    `done` event. A client disconnect cancels the upstream request.
+    """
+    prompt = payload.get("prompt", "").strip()
+    if not prompt:
+        raise HTTPException(status_code=400, detail="Missing 'prompt' in request body")
+
+    async def events():
+        tokens = ai.stream_freeform(prompt)
+        try:
+            async for token in tokens:
+                yield f"event: token\ndata: {json.dumps({'text': token})}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        finally:
+            await tokens.aclose()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
\ No newline at end of file
@@ -1,46 +1,68 @@
 from fastapi import APIRouter, HTTPException, BackgroundTasks
-from typing import List, Dict, Any
+from typing import Dict, Any, Optional
 from datetime import datetime
-import alpaca_trade_api as tradeapi
 import os
-import json
-import csv
+import uuid
 from dotenv import load_dotenv
+from utils import metrics
+from utils.broker import BrokerGateway, ORDER_STATUSES
+from utils.executor import run_blocking
+from utils.trade_journal import TradeJournal
 
 # Load environment variables
 load_dotenv()
 
 router = APIRouter()
 
-# Initialize Alpaca API
-alpaca = tradeapi.REST(
-    os.getenv('ALPACA_KEY'),
-    os.getenv('ALPACA_SECRET'),
-    'https://paper-api.alpaca.markets',
-    api_version='v2'
-)
+# Shared broker client with snapshots of account, positions and orders
+broker = BrokerGateway()
+metrics.registry.add_collector(metrics.stats_collector(
+    'stockgenie_broker', broker.stats,
+    counters=('retries', 'rate_limited', 'snapshot_hits', 'coalesced', 'snapshot_refreshes', 'invalidations',
+              'duplicate_orders'),
+    gauges=('rate_budget_remaining',)))
 
-# Trade log path
+# Legacy CSV trade log, imported into the journal once on startup
 TRADE_LOG_PATH = 'trade_log.csv'
 
+# Indexed, append-only trade journal
+journal = TradeJournal()
+
+def import_legacy_log():
+    """Copy an existing CSV trade log into the journal (no-op once imported)."""
+    if os.path.exists(TRADE_LOG_PATH):
+        journal.import_csv(TRADE_LOG_PATH)
+
 def log_trade(trade_data: Dict[str, Any]):
-    """Log trade to CSV file."""
-    fieldnames = ['timestamp', 'symbol', 'action', 'quantity', 'price', 'signal_confidence']
-    
-    file_exists = os.path.exists(TRADE_LOG_PATH)
-    mode = 'a' if file_exists else 'w'
-    
-    with open(TRADE_LOG_PATH, mode, newline='') as f:
-        writer = csv.DictWriter(f, fieldnames=fieldnames)
-        if not file_exists:
-            writer.writeheader()
-        writer.writerow(trade_data)
+    """Record a trade in the journal."""
+    journal.append(trade_data)
+
+def plan_order(symbol: str, signal: str, position) -> Optional[Dict[str, Any]]:
+    """Order to place for a signal given the current position (or None), if any."""
+    if signal == 'Buy' and position is None:
+        # Buy 1 share
+        return {"symbol": symbol, "qty": 1, "side": "buy", "type": "market", "time_in_force": "gtc"}
+    if signal == 'Sell' and position is not None:
+        # Sell entire position
+        return {"symbol": symbol, "qty": position.qty, "side": "sell", "type": "market", "time_in_force": "gtc"}
+    return None
+
+def trade_record(order_request: Dict[str, Any], order, confidence) -> Dict[str, Any]:
+    """Journal entry for a submitted order."""
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'symbol': order_request['symbol'],
+        'action': order_request['side'],
+        'quantity': int(order_request['qty']),
+        'price': float(order.filled_avg_price) if order.filled_avg_price else None,
+        'signal_confidence': confidence
+    }
 
 @router.get("/account")
 async def get_account_info():
     """Get paper trading account information."""
     try:
-        account = alpaca.get_account()
+        account = await run_blocking(broker.account)
         return {
             "account_value": float(account.portfolio_value),
             "buying_power": float(account.buying_power),
@@ -56,7 +78,7 @@ async def get_account_info():
 async def get_positions():
     """Get current positions."""
     try:
-        positions = alpaca.list_positions()
+        positions = await run_blocking(broker.positions)
         return [{
             "symbol": pos.symbol,
             "quantity": int(pos.qty),
@@ -73,91 +95,103 @@ async def get_positions():
 async def execute_trade(background_tasks: BackgroundTasks, trade_data: Dict[str, Any]):
     """Execute a trade based on ML signal."""
     try:
-        symbol = trade_data['symbol']
+        symbol = trade_data['symbol'].upper()
         signal = trade_data['signal']
         confidence = trade_data.get('confidence', 0)
         
-        # Get current position
-        try:
-            position = alpaca.get_position(symbol)
-            has_position = True
-        except:
-            has_position = False
-        
-        # Execute trade based on signal
-        if signal == 'Buy' and not has_position:
-            # Buy 1 share
-            order = alpaca.submit_order(
-                symbol=symbol,
-                qty=1,
-                side='buy',
-                type='market',
-                time_in_force='gtc'
-            )
-            
-            # Log trade
-            trade_log = {
-                'timestamp': datetime.now().isoformat(),
-                'symbol': symbol,
-                'action': 'buy',
-                'quantity': 1,
-                'price': float(order.filled_avg_price) if order.filled_avg_price else None,
-                'signal_confidence': confidence
-            }
-            background_tasks.add_task(log_trade, trade_log)
-            
-            return {"message": f"Buy order executed for {symbol}", "order_id": order.id}
-            
-        elif signal == 'Sell' and has_position:
-            # Sell entire position
-            order = alpaca.submit_order(
-                symbol=symbol,
-                qty=position.qty,
-                side='sell',
-                type='market',
-                time_in_force='gtc'
-            )
-            
-            # Log trade
-            trade_log = {
-                'timestamp': datetime.now().isoformat(),
-                'symbol': symbol,
-                'action': 'sell',
-                'quantity': int(position.qty),
-                'price': float(order.filled_avg_price) if order.filled_avg_price else None,
-                'signal_confidence': confidence
-            }
-            background_tasks.add_task(log_trade, trade_log)
-            
-            return {"message": f"Sell order executed for {symbol}", "order_id": order.id}
-            
-        return {"message": f"No trade executed for {symbol} (Signal: {signal})"}
-        
+        # Get current position, fresh rather than from the dashboard snapshot
+        with metrics.span('trade', 'position'):
+            position = await run_blocking(broker.position, symbol, max_age=0)
+        order_request = plan_order(symbol, signal, position)
+        if order_request is None:
+            return {"message": f"No trade executed for {symbol} (Signal: {signal})"}
+
+        with metrics.span('trade', 'submit'):
+            order = await run_blocking(broker.submit_order, **order_request)
+        background_tasks.add_task(log_trade, trade_record(order_request, order, confidence))
+        return {"message": f"{order_request['side'].capitalize()} order executed for {symbol}", "order_id": order.id}
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/trades")
-async def get_trade_history(limit: int = 50):
-    """Get recent trade history."""
+@router.post("/basket")
+async def execute_basket(background_tasks: BackgroundTasks, basket: Dict[str, Any]):
+    """Act on a batch of ML signals at once.
+
+    Positions are read once, orders are decided in memory and submitted
+    concurrently, and every fill is journaled in one write. Each leg's
+    client_order_id is derived from `basket_id`, so re-posting a basket
+    after a failure never submits an accepted leg twice, nor journals it
+    twice.
+    """
+    signals = basket.get('signals')
+    if not isinstance(signals, list) or not all(isinstance(s, dict) and s.get('symbol') for s in signals):
+        raise HTTPException(status_code=400, detail="Body must be {signals: [{symbol, signal, confidence}], basket_id?}")
+    basket_id = str(basket.get('basket_id') or uuid.uuid4().hex[:16])
     try:
+        with metrics.span('basket', 'positions'):
+            positions = {pos.symbol: pos for pos in await run_blocking(broker.positions, max_age=0)}
+        legs, requests, seen = [], [], set()
+        for item in signals:
+            symbol = item['symbol'].upper()
+            leg = {"symbol": symbol, "signal": item.get('signal'), "status": "skipped", "client_order_id": None}
+            legs.append(leg)
+            if symbol in seen:
+                leg["detail"] = "duplicate symbol in basket"
+                continue
+            seen.add(symbol)
+            order_request = plan_order(symbol, item.get('signal'), positions.get(symbol))
+            if order_request is None:
+                continue
+            order_request['client_order_id'] = f"{basket_id}-{symbol}-{order_request['side']}"
+            leg.update(action=order_request['side'], quantity=int(order_request['qty']),
+                       client_order_id=order_request['client_order_id'])
+            requests.append((leg, order_request, item.get('confidence', 0)))
+
+        with metrics.span('basket', 'submit'):
+            results = await run_blocking(broker.submit_orders, [order_request for _, order_request, _ in requests])
         trades = []
-        if os.path.exists(TRADE_LOG_PATH):
-            with open(TRADE_LOG_PATH, 'r') as f:
-                reader = csv.DictReader(f)
-                trades = list(reader)[-limit:]
-        return trades
+        for (leg, order_request, confidence), (order, duplicate, error) in zip(requests, results):
+            if error is not None:
+                leg.update(status="error", detail=str(error))
+                continue
+            leg.update(status="submitted", order_id=order.id, order_status=order.status,
+                       price=float(order.filled_avg_price) if order.filled_avg_price else None)
+            if duplicate:
+                # Placed by an earlier post of this basket; journaling it again would duplicate its row
+                leg["detail"] = "already submitted"
+                continue
+            trades.append(trade_record(order_request, order, confidence))
+        if trades:
+            background_tasks.add_task(journal.append_many, trades)
+        return {
+            "basket_id": basket_id,
+            "submitted": sum(leg["status"] == "submitted" for leg in legs),
+            "errors": sum(leg["status"] == "error" for leg in legs),
+            "legs": legs,
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/trades")
+async def get_trade_history(limit: int = 50, symbol: Optional[str] = None, action: Optional[str] = None,
+                            start: Optional[str] = None, end: Optional[str] = None,
+                            before_id: Optional[int] = None):
+    """Get recent trade history, optionally filtered by symbol, action and time range."""
+    try:
+        return await run_blocking(journal.query, limit, symbol=symbol, action=action,
+                                  start=start, end=end, before_id=before_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/orders")
 async def get_orders(status: str = 'all', limit: int = 50):
     """Get recent orders."""
+    if status not in ORDER_STATUSES:
+        raise HTTPException(status_code=400, detail=f"status must be one of {', '.join(ORDER_STATUSES)}")
     try:
-        if status == 'all':
-            orders = alpaca.list_orders(limit=limit)
-        else:
-            orders = alpaca.list_orders(status=status, limit=limit)
-            
+        orders = await run_blocking(broker.orders, status, limit)
+
         return [{
             "id": order.id,
             "symbol": order.symbol,
@@ -171,4 +205,9 @@ async def get_orders(status: str = 'all', limit: int = 50):
             "filled_avg_price": float(order.filled_avg_price) if order.filled_avg_price else None
         } for order in orders]
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/broker/stats")
+async def get_broker_stats():
+    """Upstream broker calls, snapshot hits and rate-limit backoffs."""
+    return broker.stats()
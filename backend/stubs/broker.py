@@ -0,0 +1,208 @@
+"""Local stand-in for the Alpaca paper trading API (v2).
+
+Serves account, positions and orders from memory after a configurable
+delay, fills market orders immediately at a fixed per-symbol price (or, with
+`REPLAY_START` set, at the close of the last bar of the shared market-data
+replay; see `ml/replay.py`), and
+enforces a request budget with Alpaca-style 429 responses, so the broker
+gateway can be exercised and benchmarked without network access or a
+brokerage account. Point the backend at it with
+`ALPACA_BASE_URL=http://127.0.0.1:8082`.
+
+    python stubs/broker.py --port 8082 --latency 0.05 --rate-limit 200
+"""
+import os
+import sys
+import time
+import uuid
+import zlib
+import asyncio
+import argparse
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="Alpaca broker stub")
+
+# Simulated round trip in seconds
+LATENCY = float(os.getenv('STUB_BROKER_LATENCY', '0.05'))
+# Requests allowed per window before answering 429 (0 disables the limit)
+RATE_LIMIT = int(os.getenv('STUB_BROKER_RATE_LIMIT', '200'))
+RATE_WINDOW = float(os.getenv('STUB_BROKER_RATE_WINDOW', '60'))
+STARTING_CASH = 100000.0
+
+stats = {"requests": 0, "rate_limited": 0, "orders": 0, "endpoints": {}}
+# Client (host, port) pairs seen, i.e. distinct TCP connections
+connections = set()
+recent = deque()
+state: Dict[str, Any] = {}
+
+
+def reset_state():
+    state.update(cash=STARTING_CASH, positions={}, orders=[], by_client_id={})
+
+
+reset_state()
+
+
+# Same replay settings (REPLAY_*) as the backend, so fills match the bars it sees
+replay = None
+if os.getenv('REPLAY_START'):
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ml'))
+    from replay import ReplayFetcher
+    replay = ReplayFetcher.from_env()
+
+
+def price(symbol: str) -> float:
+    """Deterministic quote per symbol, the replayed close during a replay."""
+    if replay is not None:
+        close = replay.last_close(symbol)
+        if close is not None:
+            return round(close, 2)
+    return round(50 + zlib.crc32(symbol.encode()) % 45000 / 100, 2)
+
+
+def now_iso() -> str:
+    now = replay.clock.now() if replay is not None else datetime.now(timezone.utc)
+    return now.isoformat().replace('+00:00', 'Z')
+
+
+def error(status: int, code: int, message: str, headers: Optional[Dict[str, str]] = None) -> JSONResponse:
+    return JSONResponse({"code": code, "message": message}, status_code=status, headers=headers)
+
+
+def position_json(symbol: str, qty: int, entry: float) -> Dict[str, Any]:
+    current = price(symbol)
+    return {
+        "symbol": symbol, "qty": str(qty), "side": "long",
+        "avg_entry_price": str(entry), "current_price": str(current),
+        "market_value": str(round(qty * current, 2)), "cost_basis": str(round(qty * entry, 2)),
+        "unrealized_pl": str(round(qty * (current - entry), 2)),
+        "unrealized_plpc": str(round(current / entry - 1, 4)),
+    }
+
+
+@app.middleware("http")
+async def broker_conditions(request: Request, call_next):
+    if not request.url.path.startswith('/v2/'):
+        return await call_next(request)
+    stats["requests"] += 1
+    endpoint = f"{request.method} {request.url.path}"
+    stats["endpoints"][endpoint] = stats["endpoints"].get(endpoint, 0) + 1
+    connections.add((request.client.host, request.client.port))
+    await asyncio.sleep(LATENCY)
+    if RATE_LIMIT:
+        now = time.time()
+        while recent and recent[0] <= now - RATE_WINDOW:
+            recent.popleft()
+        if len(recent) >= RATE_LIMIT:
+            stats["rate_limited"] += 1
+            return error(429, 42910000, "rate limit exceeded", {
+                "X-RateLimit-Limit": str(RATE_LIMIT), "X-RateLimit-Remaining": "0",
+                "X-RateLimit-Reset": str(int(recent[0] + RATE_WINDOW) + 1),
+            })
+        recent.append(now)
+    return await call_next(request)
+
+
+@app.get("/v2/account")
+async def account():
+    equity = state["cash"] + sum(qty * price(symbol) for symbol, (qty, _) in state["positions"].items())
+    return {
+        "id": "stub-account", "status": "ACTIVE", "currency": "USD",
+        "cash": str(round(state["cash"], 2)), "portfolio_value": str(round(equity, 2)),
+        "equity": str(round(equity, 2)), "last_equity": str(STARTING_CASH),
+        "buying_power": str(round(2 * state["cash"], 2)),
+    }
+
+
+@app.get("/v2/positions")
+async def positions():
+    return [position_json(symbol, qty, entry) for symbol, (qty, entry) in sorted(state["positions"].items())]
+
+
+@app.get("/v2/positions/{symbol}")
+async def position(symbol: str):
+    if symbol.upper() not in state["positions"]:
+        return error(404, 40410000, "position does not exist")
+    qty, entry = state["positions"][symbol.upper()]
+    return position_json(symbol.upper(), qty, entry)
+
+
+@app.get("/v2/orders")
+async def orders(status: str = 'open', limit: int = 50):
+    # Market orders fill immediately, so nothing is ever open
+    matching = [] if status == 'open' else state["orders"]
+    return list(reversed(matching[-limit:]))
+
+
+@app.get("/v2/orders:by_client_order_id")
+async def order_by_client_id(client_order_id: str):
+    order = state["by_client_id"].get(client_order_id)
+    return order if order is not None else error(404, 40410000, "order not found")
+
+
+@app.post("/v2/orders")
+async def submit_order(payload: Dict[str, Any]):
+    symbol, side = payload['symbol'].upper(), payload.get('side', 'buy')
+    qty = int(float(payload['qty']))
+    client_order_id = payload.get('client_order_id') or str(uuid.uuid4())
+    if client_order_id in state["by_client_id"]:
+        return error(422, 40010001, "client_order_id must be unique")
+    held, entry = state["positions"].get(symbol, (0, 0.0))
+    if side == 'sell' and qty > held:
+        return error(403, 40310000, f"insufficient qty available for order (requested: {qty}, available: {held})")
+    fill = price(symbol)
+    if side == 'buy':
+        state["positions"][symbol] = (held + qty, round((held * entry + qty * fill) / (held + qty), 4))
+        state["cash"] -= qty * fill
+    else:
+        if qty == held:
+            del state["positions"][symbol]
+        else:
+            state["positions"][symbol] = (held - qty, entry)
+        state["cash"] += qty * fill
+    submitted = now_iso()
+    order = {
+        "id": str(uuid.uuid4()), "client_order_id": client_order_id, "symbol": symbol, "side": side,
+        "qty": str(qty), "filled_qty": str(qty), "type": payload.get('type', 'market'),
+        "time_in_force": payload.get('time_in_force', 'day'), "status": "filled",
+        "submitted_at": submitted, "filled_at": submitted, "filled_avg_price": str(fill),
+    }
+    state["orders"].append(order)
+    state["by_client_id"][client_order_id] = order
+    stats["orders"] += 1
+    return order
+
+
+@app.get("/stats")
+async def get_stats():
+    return {**stats, "connections": len(connections)}
+
+
+@app.post("/stats/reset")
+async def reset_stats(clear_state: bool = False):
+    stats.update(requests=0, rate_limited=0, orders=0, endpoints={})
+    connections.clear()
+    recent.clear()
+    if clear_state:
+        reset_state()
+    return stats
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Alpaca broker stub server")
+    parser.add_argument('--port', type=int, default=8082)
+    parser.add_argument('--latency', type=float, default=LATENCY)
+    parser.add_argument('--rate-limit', type=int, default=RATE_LIMIT, help='requests per window (0 for no limit)')
+    parser.add_argument('--rate-window', type=float, default=RATE_WINDOW, help='rate limit window (s)')
+    args = parser.parse_args()
+    LATENCY = args.latency
+    RATE_LIMIT = args.rate_limit
+    RATE_WINDOW = args.rate_window
+    uvicorn.run(app, host='127.0.0.1', port=args.port, log_level='warning', ws='none')
@@ -0,0 +1,116 @@
+"""Local stand-in for the OpenRouter chat completions API.
+
+Answers `POST /api/v1/chat/completions` after a configurable delay, so the
+AI suggestion path can be exercised and benchmarked without network access
+or API spend. Requests with `"stream": true` get OpenAI-style SSE chunks,
+one word per chunk. Point the backend at it with
+`OPENROUTER_API_URL=http://127.0.0.1:8081/api/v1/chat/completions`.
+
+    python stubs/openrouter.py --port 8081 --latency 0.05
+"""
+import os
+import time
+import asyncio
+import json
+import argparse
+from typing import Any, Dict, List
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+app = FastAPI(title="OpenRouter stub")
+
+# Simulated model latency in seconds (time to first token when streaming)
+LATENCY = float(os.getenv('STUB_LLM_LATENCY', '0.05'))
+# Seconds per generated word after the first, and minimum words per response
+TOKEN_DELAY = float(os.getenv('STUB_LLM_TOKEN_DELAY', '0'))
+TOKENS = int(os.getenv('STUB_LLM_TOKENS', '0'))
+
+stats = {"requests": 0, "streams_completed": 0, "streams_cancelled": 0}
+# Client (host, port) pairs seen, i.e. distinct TCP connections
+connections = set()
+
+
+def completion_text(payload: Dict[str, Any]) -> str:
+    prompt = payload['messages'][-1]['content']
+    first_line = prompt.strip().splitlines()[0] if prompt.strip() else ''
+    return f"Stub analysis: {first_line[:80]}"
+
+
+def completion_words(payload: Dict[str, Any]) -> List[str]:
+    words = completion_text(payload).split(' ')
+    words += ['analysis'] * (TOKENS - len(words))
+    return [word if i == 0 else ' ' + word for i, word in enumerate(words)]
+
+
+def chunk(text: str, finish_reason=None) -> str:
+    delta = {"content": text} if text else {}
+    body = {"object": "chat.completion.chunk", "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+    return f"data: {json.dumps(body)}\n\n"
+
+
+async def stream_words(words: List[str]):
+    completed = False
+    try:
+        await asyncio.sleep(LATENCY)
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(TOKEN_DELAY)
+            yield chunk(word)
+        yield chunk('', finish_reason='stop')
+        yield "data: [DONE]\n\n"
+        completed = True
+    finally:
+        stats["streams_completed" if completed else "streams_cancelled"] += 1
+
+
+@app.post("/api/v1/chat/completions")
+async def chat_completions(payload: Dict[str, Any], request: Request):
+    stats["requests"] += 1
+    connections.add((request.client.host, request.client.port))
+    words = completion_words(payload)
+    if payload.get('stream'):
+        return StreamingResponse(stream_words(words), media_type="text/event-stream")
+    await asyncio.sleep(LATENCY + TOKEN_DELAY * (len(words) - 1))
+    return {
+        "id": f"stub-{stats['requests']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": payload.get('model', 'stub'),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": ''.join(words)},
+            "finish_reason": "stop"
+        }]
+    }
+
+
+@app.get("/stats")
+async def get_stats():
+    return dict(stats, connections=len(connections))
+
+
+@app.post("/stats/reset")
+async def reset_stats():
+    for name in stats:
+        stats[name] = 0
+    connections.clear()
+    return stats
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="OpenRouter stub server")
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=LATENCY)
+    parser.add_argument('--token-delay', type=float, default=TOKEN_DELAY)
+    parser.add_argument('--tokens', type=int, default=TOKENS)
+    parser.add_argument('--ssl-keyfile')
+    parser.add_argument('--ssl-certfile')
+    args = parser.parse_args()
+    LATENCY = args.latency
+    TOKEN_DELAY = args.token_delay
+    TOKENS = args.tokens
+    uvicorn.run(app, host='127.0.0.1', port=args.port, log_level='warning', ws='none',
+                ssl_keyfile=args.ssl_keyfile, ssl_certfile=args.ssl_certfile)
@@ -1,17 +1,117 @@
 import os
 import json
+import time
+import asyncio
+import itertools
+import importlib.util
 import httpx
-from typing import List, Dict, Any
+from typing import AsyncIterator, List, Dict, Any, Optional
 from dotenv import load_dotenv
+from utils import metrics
+from utils.llm_cache import LLMCache
 
 # Load environment variables
 load_dotenv()
 
+# HTTP/2 needs the optional `h2` package (pip install httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+# Max connections per pooled client
+POOL_SHARD_SIZE = 16
+
 class AISuggestionGenerator:
-    def __init__(self):
+    def __init__(self, cache: Optional[LLMCache] = None, **client_options):
+        """Configure the generator; the pooled HTTP clients are created by `start`.
+
+        With a `cache`, responses to the structured suggestion and summary
+        prompts are reused when their quantized inputs match; free-form chat
+        is never cached. Extra keyword arguments are passed to `httpx.AsyncClient`.
+        """
         self.api_key = os.getenv('OPENROUTER_API_KEY')
-        self.api_url = 'https://openrouter.ai/api/v1/chat/completions'
-        
+        self.api_url = os.getenv('OPENROUTER_API_URL', 'https://openrouter.ai/api/v1/chat/completions')
+        self.concurrency = int(os.getenv('LLM_CONCURRENCY', '16'))
+        self.max_connections = int(os.getenv('LLM_MAX_CONNECTIONS', '32'))
+        self.keepalive_expiry = float(os.getenv('LLM_KEEPALIVE_EXPIRY', '60'))
+        self.cache = cache
+        self.client_options = client_options
+        self._clients: List[httpx.AsyncClient] = []
+        self._next_client = None
+
+    async def start(self):
+        """Create the shared clients used for every request.
+
+        Connections are split across clients of at most `POOL_SHARD_SIZE`
+        connections each: httpcore scans its whole pool on every request
+        event, which gets quadratic with ~100 busy connections in one pool.
+        """
+        if self._clients:
+            return
+        shards = max(1, -(-self.max_connections // POOL_SHARD_SIZE))
+        per_shard = -(-self.max_connections // shards)
+        self._clients = [
+            httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                limits=httpx.Limits(
+                    max_connections=per_shard,
+                    max_keepalive_connections=per_shard,
+                    keepalive_expiry=self.keepalive_expiry
+                ),
+                timeout=30.0,
+                headers={
+                    'Authorization': f'Bearer {self.api_key}' if self.api_key else '',
+                    'Content-Type': 'application/json'
+                },
+                **self.client_options
+            )
+            for _ in range(shards)
+        ]
+        self._next_client = itertools.cycle(self._clients)
+
+    async def aclose(self):
+        clients, self._clients = self._clients, []
+        for client in clients:
+            await client.aclose()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Next pooled client, round-robin across shards."""
+        return next(self._next_client)
+
+    def _bucket(self, field: str, value: float) -> float:
+        """Snap a prompt input to its cache bucket so near-identical inputs share a response."""
+        return self.cache.quantize(field, value) if self.cache is not None else value
+
+    async def _complete(self, system_prompt: str, prompt: str, endpoint: str) -> Optional[str]:
+        """Return a completion, served from the cache when one is configured."""
+        if self.cache is None:
+            return await self._request(system_prompt, prompt)
+        key = self.cache.key(endpoint, system_prompt, prompt)
+        return await self.cache.get_or_compute(endpoint, key, lambda: self._request(system_prompt, prompt))
+
+    async def _request(self, system_prompt: str, prompt: str) -> Optional[str]:
+        """Post a chat completion on the shared client; None on a non-200 response."""
+        if not self._clients:
+            await self.start()
+        data = {
+            'model': 'grok-1',  # or any other supported model
+            'messages': [
+                {'role': 'system', 'content': system_prompt},
+                {'role': 'user', 'content': prompt}
+            ]
+        }
+        started = time.perf_counter()
+        try:
+            response = await self.client.post(self.api_url, json=data)
+        except Exception:
+            metrics.record_upstream('openrouter', 'chat', 'error', time.perf_counter() - started)
+            raise
+        outcome = 'ok' if response.status_code == 200 else 'error'
+        metrics.record_upstream('openrouter', 'chat', outcome, time.perf_counter() - started)
+        if response.status_code == 200:
+            result = response.json()
+            return result['choices'][0]['message']['content'].strip()
+        return None
+
     async def generate_suggestion(self, prediction_data: Dict[str, Any]) -> str:
         """Generate a human-readable trading suggestion based on ML predictions."""
         try:
@@ -19,83 +119,117 @@ class AISuggestionGenerator:
             symbol = prediction_data['symbol']
             signal = prediction_data['signal']
             confidence = prediction_data['confidence']
-            rsi = prediction_data.get('rsi', 0)
-            macd = prediction_data.get('macd', 0)
-            
+            rsi = self._bucket('rsi', prediction_data.get('rsi', 0))
+            macd = self._bucket('macd', prediction_data.get('macd', 0))
+
             # Create prompt
             prompt = f"""Based on technical analysis for {symbol}:
             - Trading Signal: {signal}
-            - Confidence: {confidence}%
+            - Confidence: {self._bucket('confidence', confidence)}%
             - RSI: {rsi:.2f}
             - MACD: {macd:.2f}
             
             Generate a brief, professional trading suggestion explaining why this signal was generated.
             Focus on the technical indicators and their implications.
             Keep the response under 50 words."""
-            
-            # Prepare API request
-            headers = {
-                'Authorization': f'Bearer {self.api_key}',
-                'Content-Type': 'application/json'
-            }
-            
-            data = {
-                'model': 'grok-1',  # or any other supported model
-                'messages': [
-                    {'role': 'system', 'content': 'You are a professional trading analyst providing brief, technical analysis-based suggestions.'},
-                    {'role': 'user', 'content': prompt}
-                ]
-            }
-            
-            # Make API call
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    self.api_url,
-                    headers=headers,
-                    json=data,
-                    timeout=30.0
-                )
-                
-                if response.status_code == 200:
-                    result = response.json()
-                    suggestion = result['choices'][0]['message']['content'].strip()
-                    return suggestion
-                else:
-                    return f"AI suggestion unavailable (Signal: {signal}, Confidence: {confidence}%)"
-                    
+
+            suggestion = await self._complete(
+                'You are a professional trading analyst providing brief, technical analysis-based suggestions.',
+                prompt,
+                endpoint='suggestion'
+            )
+            if suggestion is not None:
+                return suggestion
+            return f"AI suggestion unavailable (Signal: {signal}, Confidence: {confidence}%)"
+
         except Exception as e:
             print(f"Error generating AI suggestion: {str(e)}")
             return f"Technical analysis suggests a {signal.lower()} signal for {symbol} with {confidence}% confidence."
-    
+
+    async def generate_suggestions(self, predictions: List[Dict[str, Any]],
+                                   concurrency: Optional[int] = None) -> List[str]:
+        """Generate suggestions for a batch of predictions concurrently.
+
+        At most `concurrency` requests (default `LLM_CONCURRENCY`) are in
+        flight at once; results keep the order of `predictions`.
+        """
+        semaphore = asyncio.Semaphore(concurrency or self.concurrency)
+
+        async def bounded(prediction):
+            async with semaphore:
+                return await self.generate_suggestion(prediction)
+
+        with metrics.span('suggestions', 'batch'):
+            return await asyncio.gather(*(bounded(p) for p in predictions))
+
     async def generate_freeform(self, prompt: str) -> str:
         """Generate a freeform response from OpenRouter based on a user prompt."""
         try:
-            headers = {
-                'Authorization': f'Bearer {self.api_key}' if self.api_key else '',
-                'Content-Type': 'application/json'
-            }
-            data = {
-                'model': 'grok-1',
-                'messages': [
-                    {'role': 'system', 'content': 'You are a helpful trading assistant.'},
-                    {'role': 'user', 'content': prompt}
-                ]
-            }
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    self.api_url,
-                    headers=headers,
-                    json=data,
-                    timeout=30.0
-                )
-                if response.status_code == 200:
-                    result = response.json()
-                    return result['choices'][0]['message']['content'].strip()
-                return 'AI suggestion unavailable at the moment.'
+            # User-written and conversational, so neither quantized nor cached
+            response = await self._request('You are a helpful trading assistant.', prompt)
+            if response is not None:
+                return response
+            return 'AI suggestion unavailable at the moment.'
         except Exception as e:
             print(f"Error generating freeform suggestion: {str(e)}")
             return 'Unable to generate a response right now.'
-    
+
+    async def stream_freeform(self, prompt: str) -> AsyncIterator[str]:
+        """Yield a freeform response token by token as the upstream streams it.
+
+        Closing the iterator (e.g. when the client disconnects) closes the
+        upstream request, so abandoned generations stop being billed.
+        """
+        system_prompt = 'You are a helpful trading assistant.'
+        if not self._clients:
+            await self.start()
+        data = {
+            'model': 'grok-1',  # or any other supported model
+            'messages': [
+                {'role': 'system', 'content': system_prompt},
+                {'role': 'user', 'content': prompt}
+            ],
+            'stream': True
+        }
+        tokens = []
+        started = time.perf_counter()
+        outcome = 'error'
+        try:
+            async with self.client.stream('POST', self.api_url, json=data) as response:
+                if response.status_code != 200:
+                    yield 'AI suggestion unavailable at the moment.'
+                    return
+                async for line in response.aiter_lines():
+                    # Skip blank separators and ": keepalive" comment lines
+                    if not line.startswith('data:'):
+                        continue
+                    payload = line[5:].strip()
+                    if payload == '[DONE]':
+                        break
+                    try:
+                        token = json.loads(payload)['choices'][0].get('delta', {}).get('content')
+                    except (ValueError, KeyError, IndexError, TypeError, AttributeError):
+                        # Malformed or non-content chunks (e.g. keep-alives, usage frames)
+                        continue
+                    if token:
+                        if not tokens:
+                            metrics.STAGE_SECONDS.observe(time.perf_counter() - started,
+                                                          component='suggestions', stage='first_token')
+                        tokens.append(token)
+                        yield token
+                outcome = 'ok'
+        except httpx.HTTPError as e:
+            print(f"Error streaming freeform suggestion: {str(e)}")
+            if not tokens:
+                yield 'Unable to generate a response right now.'
+            return
+        except (GeneratorExit, asyncio.CancelledError):
+            # The client went away, while we yielded or awaited the upstream; not an upstream failure
+            outcome = 'cancelled'
+            raise
+        finally:
+            metrics.record_upstream('openrouter', 'chat_stream', outcome, time.perf_counter() - started)
+
     async def generate_market_summary(self, predictions: List[Dict[str, Any]]) -> str:
         """Generate a brief market summary based on all predictions."""
         # Precompute simple fallback stats to avoid NameError in exception path
@@ -110,32 +244,18 @@ class AISuggestionGenerator:
             prompt = f"""Based on ML analysis of {num_predictions} stocks:
             - Buy Signals: {buy_signals}
             - Sell Signals: {sell_signals}
-            - Average Confidence: {avg_confidence:.2f}%
+            - Average Confidence: {self._bucket('avg_confidence', avg_confidence):.2f}%
             
             Generate a brief (2-3 sentences) market summary describing the current trading environment.
             Focus on the overall market sentiment and potential opportunities."""
-            headers = {
-                'Authorization': f'Bearer {self.api_key}' if self.api_key else '',
-                'Content-Type': 'application/json'
-            }
-            data = {
-                'model': 'grok-1',
-                'messages': [
-                    {'role': 'system', 'content': 'You are a professional market analyst providing concise market summaries.'},
-                    {'role': 'user', 'content': prompt}
-                ]
-            }
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    self.api_url,
-                    headers=headers,
-                    json=data,
-                    timeout=30.0
-                )
-                if response.status_code == 200:
-                    result = response.json()
-                    return result['choices'][0]['message']['content'].strip()
-                return f"Market shows {buy_signals} buy and {sell_signals} sell signals with {avg_confidence:.2f}% average confidence."
+            summary = await self._complete(
+                'You are a professional market analyst providing concise market summaries.',
+                prompt,
+                endpoint='market_summary'
+            )
+            if summary is not None:
+                return summary
+            return f"Market shows {buy_signals} buy and {sell_signals} sell signals with {avg_confidence:.2f}% average confidence."
         except Exception as e:
             print(f"Error generating market summary: {str(e)}")
-            return f"Analysis shows {buy_signals} buy and {sell_signals} sell signals across monitored stocks."
\ No newline at end of file
+            return f"Analysis shows {buy_signals} buy and {sell_signals} sell signals across monitored stocks."
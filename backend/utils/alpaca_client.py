@@ -1,16 +1,17 @@
-from alpaca.trading.client import TradingClient
-from alpaca.data.historical import StockHistoricalDataClient
-from alpaca.data.requests import StockBarsRequest
-from alpaca.data.timeframe import TimeFrame
 from datetime import datetime
+from functools import lru_cache
 from dotenv import load_dotenv
 import os
 
 # Load environment variables
 load_dotenv()
 
+@lru_cache(maxsize=1)
 def get_trading_client():
-    """Initialize and return Alpaca trading client."""
+    """Return the shared Alpaca trading client (created once, reusing its HTTP session)."""
+    # The SDK is imported on first use, so importing this module stays cheap
+    from alpaca.trading.client import TradingClient
+
     api_key = os.getenv('ALPACA_KEY')
     api_secret = os.getenv('ALPACA_SECRET')
     
@@ -20,11 +21,15 @@ def get_trading_client():
     return TradingClient(
         api_key,
         api_secret,
-        paper=True  # Use paper trading
+        paper=True,  # Use paper trading
+        url_override=os.getenv('ALPACA_BASE_URL')
     )
 
+@lru_cache(maxsize=1)
 def get_data_client():
-    """Initialize and return Alpaca data client for historical data."""
+    """Return the shared Alpaca data client for historical data."""
+    from alpaca.data.historical import StockHistoricalDataClient
+
     api_key = os.getenv('ALPACA_KEY')
     api_secret = os.getenv('ALPACA_SECRET')
     
@@ -33,9 +38,13 @@ def get_data_client():
     
     return StockHistoricalDataClient(api_key, api_secret)
 
-def get_historical_bars(symbols, start_date, end_date, timeframe=TimeFrame.Hour):
-    """Get historical bar data for specified symbols."""
+def get_historical_bars(symbols, start_date, end_date, timeframe=None):
+    """Get historical bar data for specified symbols (hourly unless `timeframe` is given)."""
+    from alpaca.data.requests import StockBarsRequest
+    from alpaca.data.timeframe import TimeFrame
+
     client = get_data_client()
+    timeframe = timeframe or TimeFrame.Hour
     
     request = StockBarsRequest(
         symbol_or_symbols=symbols,
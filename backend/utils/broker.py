@@ -0,0 +1,331 @@
+import os
+import math
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from utils import metrics
+
+load_dotenv()
+
+# Trading API root; point at `stubs/broker.py` to run without Alpaca
+ALPACA_BASE_URL = os.getenv('ALPACA_BASE_URL', 'https://paper-api.alpaca.markets')
+
+# Account, positions and orders are re-fetched at most this often
+SNAPSHOT_SECONDS = float(os.getenv('BROKER_SNAPSHOT_SECONDS', '2'))
+
+# Request budget: calls per window (Alpaca allows 200 per minute per account)
+RATE_LIMIT = int(os.getenv('BROKER_RATE_LIMIT', '200'))
+RATE_WINDOW_SECONDS = float(os.getenv('BROKER_RATE_WINDOW_SECONDS', '60'))
+
+# Concurrent in-flight broker reads, and pooled connections to keep open
+ALPACA_CONCURRENCY = int(os.getenv('ALPACA_CONCURRENCY', '8'))
+
+# Concurrent order submissions, so a basket goes out in about one round trip
+ORDER_CONCURRENCY = int(os.getenv('BROKER_ORDER_CONCURRENCY', '50'))
+
+# Retries of rate-limited or failed calls, with exponential backoff
+MAX_RETRIES = int(os.getenv('BROKER_MAX_RETRIES', '4'))
+BACKOFF_SECONDS = float(os.getenv('BROKER_BACKOFF_SECONDS', '0.5'))
+MAX_BACKOFF_SECONDS = 30.0
+
+# Reads are retried on rate limits and gateway errors; order submissions
+# only on 429, since a timed-out submission may still have been accepted
+READ_RETRY_STATUSES = (429, 500, 502, 503, 504)
+WRITE_RETRY_STATUSES = (429,)
+
+# Order list snapshots: the statuses Alpaca accepts, and the page sizes a
+# requested limit is rounded up to (Alpaca returns at most 500), so there
+# is a fixed set of snapshot kinds whatever callers ask for
+ORDER_STATUSES = ('open', 'closed', 'all')
+ORDER_LIMITS = (50, 100, 500)
+
+
+def status_code(error: Exception) -> Optional[int]:
+    """HTTP status of an SDK or requests error, if it carries one."""
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'response', None), 'status_code', None)
+    return status
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        if 'Retry-After' in headers:
+            return float(headers['Retry-After'])
+        if 'X-RateLimit-Reset' in headers:
+            return max(0.0, float(headers['X-RateLimit-Reset']) - time.time())
+    except ValueError:
+        pass
+    return None
+
+
+class RateBudget:
+    """At most `limit` calls in any `window` seconds, shared by all threads.
+
+    Mirrors a sliding-window limit like Alpaca's. A call counts from when it
+    completed (in-flight calls always count), so our window never ends
+    before the upstream's does.
+    """
+
+    def __init__(self, limit: int, window: float = 60.0):
+        self.limit = limit
+        self.window = window
+        self.paused_until = 0.0
+        self.waited = 0.0
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def _expire(self, now: float):
+        while self._calls and self._calls[0][0] <= now - self.window:
+            self._calls.popleft()
+
+    def acquire(self) -> list:
+        """Wait for room in the window; pass the returned slot to `release` when the call is done."""
+        started = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._expire(now)
+                if now >= self.paused_until and len(self._calls) < self.limit:
+                    slot = [math.inf]
+                    self._calls.append(slot)
+                    self.waited += now - started
+                    return slot
+                delay = self.paused_until - now
+                if len(self._calls) >= self.limit:
+                    oldest = self._calls[0][0]
+                    # The oldest call may still be in flight; check again shortly
+                    delay = max(delay, oldest + self.window - now if oldest != math.inf else 0.01)
+            time.sleep(max(delay, 0.001))
+
+    def release(self, slot: list):
+        slot[0] = time.monotonic()
+
+    def pause(self, seconds: float):
+        """Hold every caller back, e.g. after the upstream answered 429."""
+        with self._lock:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def remaining(self) -> int:
+        with self._lock:
+            self._expire(time.monotonic())
+            return self.limit - len(self._calls)
+
+
+class BrokerGateway:
+    """The one way the backend talks to the broker.
+
+    A single Alpaca REST client (one pooled HTTP session) is shared by all
+    requests. Account, positions and orders are served from snapshots that
+    are refreshed at most once per `snapshot_seconds`; concurrent callers
+    wait for the same refresh instead of issuing their own, and our own
+    order submissions invalidate them. Every upstream call counts against
+    a sliding-window rate budget and is retried with jittered exponential
+    backoff when rate-limited.
+    """
+
+    def __init__(self, client: Any = None, snapshot_seconds: float = SNAPSHOT_SECONDS,
+                 rate_limit: int = RATE_LIMIT, rate_window: float = RATE_WINDOW_SECONDS,
+                 concurrency: int = ALPACA_CONCURRENCY, order_concurrency: int = ORDER_CONCURRENCY,
+                 max_retries: int = MAX_RETRIES, base_url: str = ALPACA_BASE_URL):
+        self._client = client
+        self.base_url = base_url
+        self.snapshot_seconds = snapshot_seconds
+        self.concurrency = concurrency
+        self.order_concurrency = order_concurrency
+        self.max_retries = max_retries
+        self.budget = RateBudget(rate_limit, rate_window)
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._order_slots = threading.BoundedSemaphore(order_concurrency)
+        self._order_pool: Optional[ThreadPoolExecutor] = None
+        self._client_lock = threading.Lock()
+        self._guard = threading.Lock()
+        self._snapshots: Dict[Any, tuple] = {}
+        self._snapshot_locks: Dict[Any, threading.Lock] = {}
+        self._generation = 0
+        self.calls: Dict[str, int] = {}
+        self.counters = {'snapshot_hits': 0, 'snapshot_refreshes': 0, 'coalesced': 0,
+                         'invalidations': 0, 'retries': 0, 'rate_limited': 0, 'duplicate_orders': 0}
+
+    @property
+    def client(self):
+        """The shared Alpaca client, created on first use."""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._create_client()
+        return self._client
+
+    def _create_client(self):
+        import alpaca_trade_api as tradeapi
+        from requests.adapters import HTTPAdapter
+
+        client = tradeapi.REST(
+            os.getenv('ALPACA_KEY'),
+            os.getenv('ALPACA_SECRET'),
+            self.base_url,
+            api_version='v2'
+        )
+        # Backoff is handled here, with a shared budget, instead of the SDK's fixed sleeps
+        client._retry = 0
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency + self.order_concurrency)
+        client._session.mount('https://', adapter)
+        client._session.mount('http://', adapter)
+        return client
+
+    def set_client(self, client: Any):
+        """Swap the underlying client (tests, benchmarks) and drop all snapshots."""
+        self._client = client
+        self.invalidate()
+
+    def call(self, method: str, *args, retry_statuses=READ_RETRY_STATUSES, slots=None, **kwargs) -> Any:
+        """Invoke a client method under the rate budget and concurrency limit."""
+        slots = slots or self._slots
+        for attempt in range(self.max_retries + 1):
+            with slots:
+                slot = self.budget.acquire()
+                with self._guard:
+                    self.calls[method] = self.calls.get(method, 0) + 1
+                try:
+                    with metrics.upstream_call('alpaca', method):
+                        return getattr(self.client, method)(*args, **kwargs)
+                except Exception as e:
+                    status = status_code(e)
+                    if status not in retry_statuses or attempt == self.max_retries:
+                        raise
+                    delay = _retry_after(e)
+                finally:
+                    self.budget.release(slot)
+            if delay is None:
+                delay = min(MAX_BACKOFF_SECONDS, BACKOFF_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.0)
+            with self._guard:
+                self.counters['retries'] += 1
+                if status == 429:
+                    self.counters['rate_limited'] += 1
+            print(f"Broker {method} returned {status}, retrying in {delay:.2f}s")
+            if status == 429:
+                # The budget is shared, so every caller backs off, not just this one
+                self.budget.pause(delay)
+            else:
+                time.sleep(delay)
+
+    def _snapshot(self, key: Any, fetch: Callable[[], Any], max_age: Optional[float]) -> Any:
+        """Value fetched no earlier than `max_age` seconds before this call."""
+        max_age = self.snapshot_seconds if max_age is None else max_age
+        arrived = time.monotonic()
+        entry = self._snapshots.get(key)
+        if entry is not None and entry[0] >= arrived - max_age:
+            with self._guard:
+                self.counters['snapshot_hits'] += 1
+            return entry[1]
+        with self._guard:
+            lock = self._snapshot_locks.setdefault(key, threading.Lock())
+        with lock:
+            # A refresh that started after we arrived is as fresh as our own would be
+            entry = self._snapshots.get(key)
+            if entry is not None and entry[0] >= arrived - max_age:
+                with self._guard:
+                    self.counters['coalesced'] += 1
+                return entry[1]
+            started, generation = time.monotonic(), self._generation
+            value = fetch()
+            with self._guard:
+                self.counters['snapshot_refreshes'] += 1
+                # Don't cache a read that raced with one of our own orders
+                if generation == self._generation:
+                    self._snapshots[key] = (started, value)
+            return value
+
+    def invalidate(self):
+        """Forget every snapshot, e.g. after submitting an order."""
+        with self._guard:
+            self._generation += 1
+            self._snapshots.clear()
+            self.counters['invalidations'] += 1
+
+    def account(self, max_age: Optional[float] = None):
+        return self._snapshot('account', lambda: self.call('get_account'), max_age)
+
+    def positions(self, max_age: Optional[float] = None) -> List[Any]:
+        return self._snapshot('positions', lambda: self.call('list_positions'), max_age)
+
+    def position(self, symbol: str, max_age: Optional[float] = None):
+        """The open position in `symbol` from the positions snapshot, or None."""
+        return next((pos for pos in self.positions(max_age) if pos.symbol == symbol), None)
+
+    def orders(self, status: str = 'all', limit: int = 50, max_age: Optional[float] = None) -> List[Any]:
+        """The newest `limit` orders (at most 500) with `status`, sliced from a snapshot of the next page size."""
+        if status not in ORDER_STATUSES:
+            raise ValueError(f"status must be one of {', '.join(ORDER_STATUSES)}")
+        limit = max(1, min(int(limit), ORDER_LIMITS[-1]))
+        page = next(size for size in ORDER_LIMITS if size >= limit)
+        orders = self._snapshot(('orders', status, page),
+                                lambda: self.call('list_orders', status=status, limit=page), max_age)
+        return orders[:limit]
+
+    def _submit(self, order: Dict[str, Any]) -> Tuple[Any, bool]:
+        """(order, duplicate): `duplicate` is True when the broker already had this client_order_id."""
+        try:
+            return self.call('submit_order', retry_statuses=WRITE_RETRY_STATUSES, slots=self._order_slots, **order), False
+        except Exception as e:
+            # Resubmitting a client_order_id the broker already accepted returns that order
+            if order.get('client_order_id') and status_code(e) == 422 and 'client_order_id' in str(e):
+                with self._guard:
+                    self.counters['duplicate_orders'] += 1
+                return self.call('get_order_by_client_order_id', order['client_order_id']), True
+            raise
+
+    def submit_order(self, **order) -> Any:
+        """Submit an order and invalidate the snapshots it changes."""
+        try:
+            return self._submit(order)[0]
+        finally:
+            self.invalidate()
+
+    def submit_orders(self, orders: List[Dict[str, Any]]) -> List[Tuple[Any, bool, Optional[Exception]]]:
+        """Submit several orders concurrently; returns an (order, duplicate, error) triple per order, in order.
+
+        `duplicate` marks an order the broker had already accepted under the
+        same client_order_id, i.e. one placed by an earlier attempt.
+        """
+        if not orders:
+            return []
+        with self._client_lock:
+            if self._order_pool is None:
+                self._order_pool = ThreadPoolExecutor(max_workers=self.order_concurrency,
+                                                      thread_name_prefix='broker-orders')
+        futures = [self._order_pool.submit(self._submit, order) for order in orders]
+        results = []
+        for future in futures:
+            try:
+                results.append((*future.result(), None))
+            except Exception as e:
+                results.append((None, False, e))
+        self.invalidate()
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        with self._guard:
+            return {
+                "base_url": self.base_url,
+                "snapshot_seconds": self.snapshot_seconds,
+                "rate_limit": self.budget.limit,
+                "rate_window_seconds": self.budget.window,
+                "rate_budget_remaining": self.budget.remaining(),
+                "rate_wait_seconds": round(self.budget.waited, 3),
+                "concurrency": self.concurrency,
+                "order_concurrency": self.order_concurrency,
+                "upstream_calls": dict(self.calls),
+                **self.counters,
+            }
+
+    def close(self):
+        if self._order_pool is not None:
+            self._order_pool.shutdown(wait=False, cancel_futures=True)
+            self._order_pool = None
@@ -0,0 +1,64 @@
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+# Threads available for blocking SDK/IO calls made from request handlers
+BLOCKING_WORKERS = int(os.getenv('BLOCKING_WORKERS', '16'))
+
+# Concurrent in-flight calls allowed per upstream service (the broker
+# gateway in utils/broker.py enforces ALPACA_CONCURRENCY itself)
+UPSTREAM_LIMITS = {
+    'predictor': int(os.getenv('PREDICTOR_CONCURRENCY', '4')),
+}
+
+_pool: Optional[ThreadPoolExecutor] = None
+_semaphores: Dict[str, asyncio.Semaphore] = {}
+
+
+def get_pool() -> ThreadPoolExecutor:
+    """Return the shared bounded executor, creating it on first use."""
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=BLOCKING_WORKERS, thread_name_prefix='blocking')
+    return _pool
+
+
+def _semaphore(upstream: str) -> asyncio.Semaphore:
+    if upstream not in _semaphores:
+        _semaphores[upstream] = asyncio.Semaphore(UPSTREAM_LIMITS.get(upstream, BLOCKING_WORKERS))
+    return _semaphores[upstream]
+
+
+async def run_blocking(fn: Callable[..., Any], *args, upstream: Optional[str] = None, **kwargs) -> Any:
+    """Run a blocking call on the shared executor without stalling the event loop.
+
+    With `upstream`, the call also waits for a slot under that service's
+    concurrency limit, so bursts of requests queue here instead of
+    flooding the upstream API.
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(fn, *args, **kwargs)
+    if upstream is None:
+        return await loop.run_in_executor(get_pool(), call)
+    async with _semaphore(upstream):
+        return await loop.run_in_executor(get_pool(), call)
+
+
+def stats() -> Dict[str, Any]:
+    return {
+        "workers": BLOCKING_WORKERS,
+        "upstreams": {
+            name: {"limit": limit, "available": _semaphores[name]._value if name in _semaphores else limit}
+            for name, limit in UPSTREAM_LIMITS.items()
+        },
+    }
+
+
+def shutdown():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+    _semaphores.clear()
@@ -0,0 +1,198 @@
+import os
+import re
+import math
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from utils.executor import run_blocking
+from utils.single_flight import SingleFlight
+
+DEFAULT_CACHE_PATH = os.getenv(
+    'LLM_CACHE_PATH', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'llm_cache.sqlite')
+)
+
+# Bucket width per numeric prompt field; values in one bucket share a response
+DEFAULT_BUCKETS = {'confidence': 1.0, 'rsi': 1.0, 'macd': 0.1, 'avg_confidence': 1.0}
+
+
+def parse_buckets(spec: str) -> Dict[str, float]:
+    """Parse `field=width` pairs, e.g. "rsi=2,macd=0.05"."""
+    buckets = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        field, width = item.split('=')
+        buckets[field.strip()] = float(width)
+    return buckets
+
+
+def normalize_prompt(text: str) -> str:
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+class LLMCache:
+    """Response cache for LLM completions with single-flight loading.
+
+    Numeric inputs are snapped to configurable buckets before the prompt is
+    built, and responses are looked up by the exact normalized prompt. Hot
+    entries live in an in-memory LRU with a TTL; every response is also
+    written to SQLite so the cache survives restarts.
+    """
+
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE_PATH,
+                 max_entries: int = int(os.getenv('LLM_CACHE_SIZE', '4096')),
+                 ttl_seconds: float = float(os.getenv('LLM_CACHE_TTL', '3600')),
+                 buckets: Optional[Dict[str, float]] = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.buckets = dict(DEFAULT_BUCKETS, **parse_buckets(os.getenv('LLM_CACHE_BUCKETS', '')))
+        self.buckets.update(buckets or {})
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._flights = SingleFlight()
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self.evictions = 0
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_lock = threading.Lock()
+
+    def quantize(self, field: str, value: Optional[float]) -> Optional[float]:
+        width = self.buckets.get(field)
+        # Indicators are NaN during warm-up; those keep their own (literal) value in the prompt
+        if not width or value is None or not math.isfinite(value):
+            return value
+        return round(round(value / width) * width, 10)
+
+    @staticmethod
+    def key(endpoint: str, system_prompt: str, prompt: str) -> str:
+        text = '\0'.join((endpoint, normalize_prompt(system_prompt), normalize_prompt(prompt)))
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if time.time() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def _remember(self, key: str, expires_at: float, value: str):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, endpoint TEXT NOT NULL, '
+                'value TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            db.execute('DELETE FROM responses WHERE expires_at <= ?', (time.time(),))
+            db.commit()
+            self._db = db
+        return self._db
+
+    def _disk_get(self, key: str) -> Optional[tuple]:
+        try:
+            with self._db_lock:
+                row = self._connect().execute(
+                    'SELECT expires_at, value FROM responses WHERE key = ?', (key,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"LLM cache read failed: {str(e)}")
+            return None
+        if row is None or row[0] <= time.time():
+            return None
+        return row
+
+    def _disk_set(self, key: str, endpoint: str, expires_at: float, value: str):
+        try:
+            with self._db_lock:
+                db = self._connect()
+                db.execute(
+                    'INSERT OR REPLACE INTO responses (key, endpoint, value, expires_at) VALUES (?, ?, ?, ?)',
+                    (key, endpoint, value, expires_at)
+                )
+                db.commit()
+        except sqlite3.Error as e:
+            print(f"LLM cache write failed: {str(e)}")
+
+    def _count(self, endpoint: str, event: str):
+        counters = self._counters.setdefault(
+            endpoint, {'hits': 0, 'disk_hits': 0, 'misses': 0, 'coalesced': 0}
+        )
+        counters[event] += 1
+
+    async def _disk_lookup(self, endpoint: str, key: str) -> Optional[str]:
+        row = await run_blocking(self._disk_get, key) if self.path else None
+        if row is None:
+            return None
+        self._count(endpoint, 'disk_hits')
+        expires_at, value = row
+        self._remember(key, expires_at, value)
+        return value
+
+    async def store(self, endpoint: str, key: str, value: str):
+        expires_at = time.time() + self.ttl_seconds
+        self._remember(key, expires_at, value)
+        if self.path:
+            await run_blocking(self._disk_set, key, endpoint, expires_at, value)
+
+    async def get_or_compute(self, endpoint: str, key: str,
+                             compute: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        """Return the cached response, joining or starting its computation on a miss.
+
+        `None` results (failed completions) are returned but not cached. The
+        computation runs in a task owned by the cache, so a cancelled caller
+        leaves it running for the others waiting on the same prompt.
+        """
+        value = self.get(key)
+        if value is not None:
+            self._count(endpoint, 'hits')
+            return value
+        if key in self._flights:
+            self._count(endpoint, 'coalesced')
+        return await self._flights.run(key, lambda: self._compute(endpoint, key, compute))
+
+    async def _compute(self, endpoint: str, key: str,
+                       compute: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        value = await self._disk_lookup(endpoint, key)
+        if value is None:
+            self._count(endpoint, 'misses')
+            value = await compute()
+            if value is not None:
+                await self.store(endpoint, key, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        endpoints = {}
+        for endpoint, counters in self._counters.items():
+            lookups = sum(counters.values())
+            served = counters['hits'] + counters['disk_hits'] + counters['coalesced']
+            endpoints[endpoint] = dict(counters, hit_rate=round(served / lookups, 4) if lookups else 0.0)
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "in_flight": len(self._flights),
+            "evictions": self.evictions,
+            "persistent": bool(self.path),
+            "buckets": self.buckets,
+            "endpoints": endpoints,
+        }
+
+    def close(self):
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
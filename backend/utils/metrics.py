@@ -0,0 +1,264 @@
+import time
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds, from a cached read to a slow upstream call
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# (name, type, help, [(labels, value)]) as returned by collectors
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels: Dict[str, Any]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _number(value: float) -> str:
+    value = float(value)
+    if value != value:
+        return 'NaN'
+    if value in (float('inf'), float('-inf')):
+        return '+Inf' if value > 0 else '-Inf'
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _samples(self) -> Iterable[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            values = list(self._values.items())
+        for key, value in values:
+            yield self.name, dict(zip(self.labelnames, key)), value
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        lines += [f'{name}{_labels(labels)} {_number(value)}' for name, labels, value in self._samples()]
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic count, e.g. upstream calls by outcome."""
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, e.g. requests in flight."""
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Cumulative latency histogram with fixed bucket bounds (seconds)."""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def _samples(self):
+        with self._lock:
+            values = [(key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()]
+        for key, (counts, total, count) in values:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float('inf'),), counts):
+                cumulative += n
+                yield f'{self.name}_bucket', dict(labels, le=_number(bound)), cumulative
+            yield f'{self.name}_sum', labels, total
+            yield f'{self.name}_count', labels, count
+
+
+class Registry:
+    """Named metrics plus collectors that report other components' stats at scrape time."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Family]]] = []
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, help: str, labelnames: Sequence[str], **options) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, labelnames, **options)
+            elif not isinstance(metric, cls) or metric.labelnames != tuple(labelnames):
+                raise ValueError(f"Metric {name} is already registered differently")
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get(Counter, name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._get(Gauge, name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, labelnames, buckets=buckets)
+
+    def add_collector(self, collector: Callable[[], Iterable[Family]]):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (0.0.4)."""
+        lines = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            lines += metric.render()
+        for collector in self._collectors:
+            try:
+                families = list(collector())
+            except Exception as e:
+                print(f"Metrics collector failed: {str(e)}")
+                continue
+            for name, kind, help, samples in families:
+                lines += [f'# HELP {name} {help}', f'# TYPE {name} {kind}']
+                lines += [f'{name}{_labels(labels)} {_number(value)}' for labels, value in samples]
+        return '\n'.join(lines) + '\n'
+
+
+def stats_collector(prefix: str, stats: Callable[[], Dict[str, Any]], counters: Sequence[str] = (),
+                    gauges: Sequence[str] = (), labels: Optional[Dict[str, str]] = None) -> Callable[[], List[Family]]:
+    """Collector exposing numeric fields of a component's `stats()` dict.
+
+    Fields in `counters` become `<prefix>_<field>_total` counters and fields
+    in `gauges` become `<prefix>_<field>` gauges.
+    """
+    def collect():
+        values = stats()
+        families = []
+        for field in counters:
+            if field in values:
+                families.append((f'{prefix}_{field}_total', 'counter', f'{field} ({prefix})',
+                                 [(dict(labels or {}), values[field])]))
+        for field in gauges:
+            if field in values:
+                families.append((f'{prefix}_{field}', 'gauge', f'{field} ({prefix})',
+                                 [(dict(labels or {}), values[field])]))
+        return families
+    return collect
+
+
+registry = Registry()
+
+# Hot-path stages, e.g. component="predict", stage="inference"
+STAGE_SECONDS = registry.histogram(
+    'stockgenie_stage_duration_seconds', 'Time spent in each hot-path stage', ('component', 'stage'))
+# Calls to market data, broker and LLM services
+UPSTREAM_SECONDS = registry.histogram(
+    'stockgenie_upstream_duration_seconds', 'Latency of upstream calls', ('upstream', 'operation'))
+UPSTREAM_CALLS = registry.counter(
+    'stockgenie_upstream_calls_total', 'Upstream calls by outcome', ('upstream', 'operation', 'outcome'))
+HTTP_SECONDS = registry.histogram(
+    'stockgenie_http_request_duration_seconds', 'API request latency by route', ('method', 'route', 'status'))
+HTTP_IN_FLIGHT = registry.gauge(
+    'stockgenie_http_requests_in_flight', 'API requests being served', ('method',))
+
+
+@contextmanager
+def span(component: str, stage: str):
+    """Time a block as one stage of `component`."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, component=component, stage=stage)
+
+
+def observe_stages(component: str, timings: Dict[str, float]):
+    """Record stage timings (seconds) measured elsewhere, e.g. a predictor batch."""
+    for stage, seconds in timings.items():
+        STAGE_SECONDS.observe(seconds, component=component, stage=stage)
+
+
+@contextmanager
+def upstream_call(upstream: str, operation: str):
+    """Time an upstream call and count it as ok or error (the exception propagates)."""
+    started = time.perf_counter()
+    outcome = 'error'
+    try:
+        yield
+        outcome = 'ok'
+    finally:
+        UPSTREAM_SECONDS.observe(time.perf_counter() - started, upstream=upstream, operation=operation)
+        UPSTREAM_CALLS.inc(upstream=upstream, operation=operation, outcome=outcome)
+
+
+def record_upstream(upstream: str, operation: str, outcome: str, seconds: Optional[float] = None):
+    """Count an upstream call whose outcome is known without raising (e.g. a non-200 reply)."""
+    if seconds is not None:
+        UPSTREAM_SECONDS.observe(seconds, upstream=upstream, operation=operation)
+    UPSTREAM_CALLS.inc(upstream=upstream, operation=operation, outcome=outcome)
+
+
+def instrumented(fn: Callable[..., Any], upstream: str, operation: str) -> Callable[..., Any]:
+    """Wrap a blocking upstream function (e.g. a bar fetcher) with `upstream_call`."""
+    def call(*args, **kwargs):
+        with upstream_call(upstream, operation):
+            return fn(*args, **kwargs)
+    call.__wrapped__ = fn
+    return call
@@ -0,0 +1,92 @@
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from utils.single_flight import SingleFlight
+
+
+class PredictionCache:
+    """Bounded LRU cache for predictions with single-flight loading.
+
+    Keys are (symbol, bar timestamp, model version) tuples and entries
+    expire when the bar they were computed for closes. Concurrent misses
+    for the same key share one in-flight computation instead of each
+    downloading and scoring the same bar. `clock` returns epoch seconds
+    (a replay clock makes bars close on replay time).
+    """
+
+    def __init__(self, max_entries: int = 1024, bar_seconds: int = 900,
+                 clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self.bar_seconds = bar_seconds
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._flights = SingleFlight()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def bar_start(self, now: Optional[float] = None) -> int:
+        """Epoch seconds at which the current bar opened."""
+        now = self.clock() if now is None else now
+        return int(now) // self.bar_seconds * self.bar_seconds
+
+    def key(self, symbol: str, model_version: Any, now: Optional[float] = None) -> tuple:
+        return (symbol, self.bar_start(now), model_version)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if self.clock() >= expires_at:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value until the close of the bar in its key."""
+        expires_at = key[1] + self.bar_seconds
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def get_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Return the cached value, joining or starting its computation on a miss.
+
+        `None` results are returned to every waiter but not cached. The
+        computation runs in a task owned by the cache, so a caller that is
+        cancelled (e.g. a disconnected client) leaves it running for the rest.
+        """
+        value = self.get(key)
+        if value is not None:
+            self.hits += 1
+            return value
+        if key in self._flights:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+        return await self._flights.run(key, lambda: self._compute(key, compute))
+
+    async def _compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        value = await compute()
+        if value is not None:
+            self.set(key, value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "in_flight": len(self._flights),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+        }
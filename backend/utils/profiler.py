@@ -0,0 +1,100 @@
+import os
+import re
+import sys
+import threading
+from collections import Counter
+from datetime import datetime
+from typing import Optional
+
+# Keep a flame graph profile of every request slower than this (ms); 0 disables profiling
+PROFILE_SLOW_MS = float(os.getenv('PROFILE_SLOW_REQUESTS_MS', '0'))
+# Milliseconds between stack samples
+PROFILE_INTERVAL_MS = float(os.getenv('PROFILE_INTERVAL_MS', '5'))
+# Where profiles are written, and how many of the newest are kept
+PROFILE_DIR = os.getenv(
+    'PROFILE_DIR', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'profiles')
+)
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '100'))
+
+# Leaf frames of threads that are parked, not working
+IDLE_FRAMES = {('threading.py', 'wait'), ('selectors.py', 'select'), ('queue.py', 'get')}
+
+
+class StackSampler:
+    """Samples the Python stack of every thread at a fixed interval.
+
+    Samples are kept folded (`thread;outer;...;inner count` per line), the
+    input format of flamegraph.pl and speedscope. Whole threads are sampled
+    rather than one request, so the event loop and the executor threads a
+    request hands work to are both covered; requests running at the same
+    time show up in each other's profiles.
+    """
+
+    def __init__(self, interval: float = PROFILE_INTERVAL_MS / 1000):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'StackSampler':
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+                if leaf in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(ident, str(ident)))
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+def profile_request() -> Optional[StackSampler]:
+    """Start sampling for a request if slow-request profiling is enabled."""
+    if PROFILE_SLOW_MS <= 0:
+        return None
+    return StackSampler().start()
+
+
+def finish_request(sampler: StackSampler, seconds: float, method: str, route: str) -> Optional[str]:
+    """Stop sampling; keep the profile if the request was slow. Returns its path."""
+    sampler.stop()
+    elapsed_ms = seconds * 1000
+    if elapsed_ms < PROFILE_SLOW_MS or not sampler.stacks:
+        return None
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        name = re.sub(r'[^A-Za-z0-9_.-]+', '_', f"{method}{route}").strip('_')
+        path = os.path.join(PROFILE_DIR, f"{datetime.now():%Y%m%dT%H%M%S%f}-{name}-{elapsed_ms:.0f}ms.folded")
+        with open(path, 'w') as f:
+            f.write(sampler.folded())
+        profiles = sorted(entry for entry in os.listdir(PROFILE_DIR) if entry.endswith('.folded'))
+        for old in profiles[:-PROFILE_KEEP]:
+            os.remove(os.path.join(PROFILE_DIR, old))
+        print(f"Slow request {method} {route} took {elapsed_ms:.0f}ms; profile saved to {path}")
+        return path
+    except OSError as e:
+        print(f"Failed to save profile: {str(e)}")
+        return None
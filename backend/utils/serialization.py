@@ -0,0 +1,148 @@
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # Falls back to the standard library encoder
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # MessagePack responses are only offered when it is installed
+    msgpack = None
+
+# Response formats by name: rows of objects (the default), and the columnar
+# layout as JSON or MessagePack
+MEDIA_TYPES = {
+    'json': 'application/json',
+    'columnar': 'application/vnd.stockgenie.columnar+json',
+    'msgpack': 'application/msgpack',
+}
+
+# Accept header media types mapped to formats
+_ACCEPTED = {
+    'application/json': 'json', 'application/*': 'json', '*/*': 'json',
+    'application/vnd.stockgenie.columnar+json': 'columnar',
+    'application/msgpack': 'msgpack', 'application/x-msgpack': 'msgpack',
+    'application/vnd.stockgenie.columnar+msgpack': 'msgpack',
+}
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def dumps(payload: Any) -> bytes:
+    """JSON bytes, taking NumPy scalars and arrays as they are."""
+    if orjson is not None:
+        return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY, default=_default)
+    return json.dumps(payload, default=_default, separators=(',', ':')).encode()
+
+
+def columnar(payload: Any) -> Any:
+    """Turn every list of flat objects in `payload` into `{count, columns: {field: [values]}}`.
+
+    Field names are sent once instead of once per row.
+    """
+    if isinstance(payload, list) and payload and all(isinstance(row, dict) for row in payload):
+        fields = list(dict.fromkeys(field for row in payload for field in row))
+        return {'count': len(payload), 'columns': {field: [row.get(field) for row in payload] for field in fields}}
+    if isinstance(payload, list) and not payload:
+        return {'count': 0, 'columns': {}}
+    if isinstance(payload, dict):
+        return {key: columnar(value) for key, value in payload.items()}
+    return payload
+
+
+def encode(payload: Any, fmt: str = 'json') -> bytes:
+    if fmt == 'columnar':
+        return dumps(columnar(payload))
+    if fmt == 'msgpack':
+        return msgpack.packb(columnar(payload), default=_default)
+    return dumps(payload)
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """Format for an Accept header: the supported media type with the highest q, JSON if none."""
+    candidates = []
+    for position, part in enumerate((accept or '').split(',')):
+        media_type, *params = [piece.strip() for piece in part.split(';')]
+        quality = 1.0
+        for param in params:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        fmt = _ACCEPTED.get(media_type.lower())
+        if fmt == 'msgpack' and msgpack is None:
+            continue
+        if fmt is not None and quality > 0:
+            candidates.append((-quality, position, fmt))
+    return min(candidates)[2] if candidates else 'json'
+
+
+def etag(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=8).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], current: str) -> bool:
+    """Whether an If-None-Match header names `current` (weak comparison, as for GET)."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or current in (tag[2:] if tag.startswith('W/') else tag for tag in tags)
+
+
+class EncodedBodies:
+    """Encoded bodies and ETags of payloads that are replaced rather than mutated, such as snapshots.
+
+    Entries are keyed by the caller's key (e.g. the route and its query)
+    and format, and remember the `source` object they were built from. As
+    long as the same source object is passed, its body and ETag are reused,
+    so a snapshot is serialized once per format however often it is polled,
+    and a poll with a current ETag costs no serialization at all.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[Tuple[Hashable, str], Tuple[Any, bytes, str]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def encode(self, key: Hashable, source: Any, fmt: str,
+               build: Optional[Callable[[], Any]] = None) -> Tuple[bytes, str]:
+        """(body, ETag) of `build()` (or `source` itself), encoded as `fmt`."""
+        entry_key = (key, fmt)
+        with self._lock:
+            entry = self._entries.get(entry_key)
+            if entry is not None and entry[0] is source:
+                self._entries.move_to_end(entry_key)
+                self.hits += 1
+                return entry[1], entry[2]
+            self.misses += 1
+        body = encode(build() if build is not None else source, fmt)
+        tag = etag(body)
+        with self._lock:
+            # Holding `source` keeps its id from being reused while the entry lives
+            self._entries[entry_key] = (source, body, tag)
+            self._entries.move_to_end(entry_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return body, tag
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "max_entries": self.max_entries,
+                "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,121 @@
+import time
+import asyncio
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+
+class SignalScheduler:
+    """Recompute the universe's predictions on every bar close in the background.
+
+    The latest predictions are kept as an in-memory snapshot that read
+    endpoints serve directly. Subscribers receive only the symbols whose
+    signal or confidence changed since the previous run, and the symbols
+    the new run no longer has.
+
+    Bar closes are found with `clock` (epoch seconds). A replay clock's
+    `speed` shortens the waits between them, so a replayed day runs its
+    refreshes at the same pace as its bars.
+    """
+
+    def __init__(self, compute: Callable[[], Awaitable[List[Dict[str, Any]]]],
+                 bar_seconds: int = 900, delay_seconds: float = 5.0,
+                 queue_size: int = 100, clock: Callable[[], float] = time.time):
+        self.compute = compute
+        self.bar_seconds = bar_seconds
+        self.delay_seconds = delay_seconds
+        self.queue_size = queue_size
+        self.clock = clock
+        self.speed = getattr(clock, 'speed', 1.0)
+        self.by_symbol: Dict[str, Dict[str, Any]] = {}
+        self.predictions: List[Dict[str, Any]] = []
+        self.version = 0
+        self.updated_at: Optional[str] = None
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.version > 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def seconds_until_next_bar(self, now: Optional[float] = None) -> float:
+        now = self.clock() if now is None else now
+        return self.bar_seconds - (now % self.bar_seconds) + self.delay_seconds
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Signal scheduler refresh failed: {str(e)}")
+            await asyncio.sleep(self.seconds_until_next_bar() / self.speed)
+
+    async def refresh(self) -> List[Dict[str, Any]]:
+        """Recompute predictions, swap the snapshot and publish the changes and removals."""
+        predictions = await self.compute()
+        changed = [
+            pred for pred in predictions
+            if self._changed(self.by_symbol.get(pred['symbol']), pred)
+        ]
+        current = {pred['symbol'] for pred in predictions}
+        # Dropped from the universe or failed this bar; subscribers must drop them too
+        removed = [symbol for symbol in self.by_symbol if symbol not in current]
+        # Replace whole objects so readers never see a half-updated snapshot
+        self.by_symbol = {pred['symbol']: pred for pred in predictions}
+        self.predictions = predictions
+        self.version += 1
+        self.updated_at = datetime.fromtimestamp(self.clock()).isoformat()
+        if changed:
+            self._publish({"event": "delta", "version": self.version, "data": changed})
+        if removed:
+            self._publish({"event": "removed", "version": self.version, "data": removed})
+        return changed
+
+    @staticmethod
+    def _changed(old: Optional[Dict[str, Any]], new: Dict[str, Any]) -> bool:
+        return old is None or old['signal'] != new['signal'] or old['confidence'] != new['confidence']
+
+    def _publish(self, message: Dict[str, Any]):
+        for queue in self._subscribers:
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # A slow client falls back to a fresh full snapshot
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(self.snapshot_message())
+
+    def snapshot_message(self) -> Dict[str, Any]:
+        return {"event": "snapshot", "version": self.version, "data": self.predictions}
+
+    def subscribe(self) -> asyncio.Queue:
+        """Register a subscriber queue primed with the current snapshot."""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        if self.ready:
+            queue.put_nowait(self.snapshot_message())
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "running": self._task is not None and not self._task.done(),
+            "version": self.version,
+            "updated_at": self.updated_at,
+            "symbols": len(self.predictions),
+            "subscribers": len(self._subscribers),
+        }
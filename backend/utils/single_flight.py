@@ -0,0 +1,40 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+def _retrieve(task: asyncio.Task):
+    # Every caller may have been cancelled; don't let a failure be logged as never retrieved
+    if not task.cancelled():
+        task.exception()
+
+
+class SingleFlight:
+    """Computations in flight by key, shared by every caller asking for the same key.
+
+    Each computation runs in a task owned by this object, so a caller that
+    is cancelled (e.g. a disconnected client) leaves it running for the
+    others waiting on it.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[Hashable, asyncio.Task] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._tasks
+
+    def __len__(self) -> int:
+        return len(self._tasks)
+
+    async def run(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        """Await `compute()`, or the computation already running for `key`."""
+        task = self._tasks.get(key)
+        if task is None:
+            task = self._tasks[key] = asyncio.ensure_future(self._run(key, compute))
+            task.add_done_callback(_retrieve)
+        return await asyncio.shield(task)
+
+    async def _run(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            return await compute()
+        finally:
+            del self._tasks[key]
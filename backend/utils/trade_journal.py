@@ -0,0 +1,265 @@
+import os
+import csv
+import sys
+import sqlite3
+import argparse
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+DEFAULT_JOURNAL_PATH = os.getenv(
+    'TRADE_JOURNAL_PATH', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'trade_journal.sqlite')
+)
+
+# How long a writer waits for another process holding the write lock
+BUSY_TIMEOUT_MS = int(os.getenv('TRADE_JOURNAL_BUSY_TIMEOUT_MS', '30000'))
+
+# Columns of the legacy CSV log, kept as the journal's record fields
+FIELDS = ['timestamp', 'symbol', 'action', 'quantity', 'price', 'signal_confidence']
+
+_IMPORT_BATCH = 10000
+
+_INSERT = ('INSERT INTO trades (timestamp, symbol, action, quantity, price, signal_confidence) '
+           'VALUES (?, ?, ?, ?, ?, ?)')
+
+_SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS trades ('
+    'id INTEGER PRIMARY KEY, timestamp TEXT NOT NULL, symbol TEXT NOT NULL, action TEXT NOT NULL, '
+    'quantity NUMERIC, price REAL, signal_confidence REAL)',
+    'CREATE INDEX IF NOT EXISTS trades_symbol ON trades (symbol, id)',
+    'CREATE INDEX IF NOT EXISTS trades_action ON trades (action, id)',
+    'CREATE INDEX IF NOT EXISTS trades_timestamp ON trades (timestamp)',
+    'CREATE TABLE IF NOT EXISTS imports ('
+    'path TEXT NOT NULL, size INTEGER NOT NULL, mtime REAL NOT NULL, rows INTEGER NOT NULL, '
+    'PRIMARY KEY (path, size, mtime))',
+]
+
+
+def _number(value):
+    """CSV cells and request values as numbers; blanks become NULL."""
+    if value is None or value == '':
+        return None
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+
+def _record(trade: Dict[str, Any]) -> tuple:
+    return (
+        str(trade['timestamp']), str(trade['symbol']).upper(), str(trade['action']).lower(),
+        _number(trade.get('quantity')), _number(trade.get('price')), _number(trade.get('signal_confidence')),
+    )
+
+
+class _Queued:
+    """Rows one append queued, and the outcome of the commit that took them."""
+    __slots__ = ('records', 'done', 'error')
+
+    def __init__(self, records: List[tuple]):
+        self.records = records
+        self.done = False
+        self.error: Optional[BaseException] = None
+
+
+class TradeJournal:
+    """Append-only trade journal in SQLite (WAL mode).
+
+    Rows are keyed by an increasing id, so the newest trades are read by
+    walking the primary key (or the symbol/action index) backwards: a tail
+    read costs O(limit) whatever the journal's size. Concurrent appends are
+    group-committed: whichever thread takes the write lock commits every
+    trade queued so far in one transaction, and a failed commit is raised
+    in every thread whose trades were in it. WAL and a busy timeout let
+    several uvicorn workers append to and read the same file.
+    """
+
+    def __init__(self, path: str = DEFAULT_JOURNAL_PATH):
+        self.path = path
+        self._pending: List[_Queued] = []
+        self._pending_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._writer: Optional[sqlite3.Connection] = None
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self.commits = 0
+        self.appended = 0
+
+    def _open(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        db = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                             isolation_level=None)
+        db.execute('PRAGMA journal_mode=WAL')
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.execute(f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}')
+        return db
+
+    def _connect(self) -> sqlite3.Connection:
+        """The write connection; creates the schema on first use."""
+        if self._writer is None:
+            db = self._open()
+            for statement in _SCHEMA:
+                db.execute(statement)
+            self._writer = db
+        return self._writer
+
+    def _reader(self) -> sqlite3.Connection:
+        """A per-thread read connection, so reads never wait on the write lock."""
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            with self._write_lock:
+                self._connect()
+            db = self._local.db = self._open()
+            db.row_factory = sqlite3.Row
+            with self._pending_lock:
+                self._readers.append(db)
+        return db
+
+    def append(self, trade: Dict[str, Any]):
+        """Durably record one trade; returns once it is committed."""
+        self.append_many([trade])
+
+    def append_many(self, trades: Iterable[Dict[str, Any]]):
+        records = [_record(trade) for trade in trades]
+        if not records:
+            return
+        queued = _Queued(records)
+        with self._pending_lock:
+            self._pending.append(queued)
+        with self._write_lock:
+            # Done when another thread already committed our rows in its batch
+            if not queued.done:
+                with self._pending_lock:
+                    batch, self._pending = self._pending, []
+                error = None
+                try:
+                    self._commit([record for entry in batch for record in entry.records])
+                except BaseException as e:
+                    error = e
+                finally:
+                    for entry in batch:
+                        entry.done, entry.error = True, error
+        if queued.error is not None:
+            raise queued.error
+
+    def _commit(self, batch: List[tuple]):
+        db = self._connect()
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.executemany(_INSERT, batch)
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        self.commits += 1
+        self.appended += len(batch)
+
+    def query(self, limit: int = 50, symbol: Optional[str] = None, action: Optional[str] = None,
+              start: Optional[str] = None, end: Optional[str] = None,
+              before_id: Optional[int] = None) -> List[Dict[str, Any]]:
+        """The newest `limit` trades matching the filters, oldest first.
+
+        `start`/`end` are ISO timestamps (inclusive); `before_id` pages back
+        from a previously returned id.
+        """
+        clauses, params = [], []
+        if symbol:
+            clauses.append('symbol = ?')
+            params.append(symbol.upper())
+        if action:
+            clauses.append('action = ?')
+            params.append(action.lower())
+        if start:
+            clauses.append('timestamp >= ?')
+            params.append(start)
+        if end:
+            clauses.append('timestamp <= ?')
+            params.append(end)
+        if before_id is not None:
+            clauses.append('id < ?')
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ''
+        rows = self._reader().execute(
+            f"SELECT id, {', '.join(FIELDS)} FROM trades {where}ORDER BY id DESC LIMIT ?",
+            params + [max(int(limit), 0)]
+        ).fetchall()
+        return [dict(row) for row in reversed(rows)]
+
+    def count(self) -> int:
+        return self._reader().execute('SELECT COUNT(*) FROM trades').fetchone()[0]
+
+    def import_csv(self, path: str) -> int:
+        """Copy a legacy `trade_log.csv` into the journal once.
+
+        The file's path, size and mtime are recorded in the same transaction
+        as its rows, so re-running (or several workers starting together)
+        does not import it twice. Returns the number of rows imported.
+        """
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime)
+        with self._write_lock:
+            db = self._connect()
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                if db.execute('SELECT 1 FROM imports WHERE path = ? AND size = ? AND mtime = ?', key).fetchone():
+                    db.execute('ROLLBACK')
+                    return 0
+                rows = 0
+                with open(path, newline='') as f:
+                    batch = []
+                    for trade in csv.DictReader(f):
+                        batch.append(_record(trade))
+                        if len(batch) == _IMPORT_BATCH:
+                            db.executemany(_INSERT, batch)
+                            rows += len(batch)
+                            batch = []
+                    db.executemany(_INSERT, batch)
+                    rows += len(batch)
+                db.execute('INSERT INTO imports (path, size, mtime, rows) VALUES (?, ?, ?, ?)', key + (rows,))
+                db.execute('COMMIT')
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+        print(f"Imported {rows} trades from {path} into {self.path}")
+        return rows
+
+    def stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "trades": self.count(), "appended": self.appended, "commits": self.commits}
+
+    def close(self):
+        with self._write_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+        with self._pending_lock:
+            for db in self._readers:
+                db.close()
+            self._readers = []
+        self._local = threading.local()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import or inspect the trade journal.')
+    parser.add_argument('--path', default=DEFAULT_JOURNAL_PATH, help='journal database file')
+    commands = parser.add_subparsers(dest='command', required=True)
+    importer = commands.add_parser('import', help='copy a CSV trade log into the journal (once)')
+    importer.add_argument('csv', nargs='+')
+    tail = commands.add_parser('tail', help='print the newest trades')
+    tail.add_argument('--limit', type=int, default=20)
+    tail.add_argument('--symbol')
+    tail.add_argument('--action')
+    args = parser.parse_args()
+
+    journal = TradeJournal(args.path)
+    try:
+        if args.command == 'import':
+            for path in args.csv:
+                if journal.import_csv(path) == 0:
+                    print(f"{path} was already imported")
+        else:
+            writer = csv.DictWriter(sys.stdout, fieldnames=['id'] + FIELDS)
+            writer.writeheader()
+            writer.writerows(journal.query(args.limit, symbol=args.symbol, action=args.action))
+    finally:
+        journal.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,6 @@
 "use client";
 
-import { useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Input } from '@/components/ui/input';
 import { Button } from '@/components/ui/button';
@@ -17,6 +17,10 @@ export default function AIChatPage() {
   ]);
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  const streamRef = useRef<AbortController | null>(null);
+
+  // Leaving the page closes the stream, which stops the upstream generation too
+  useEffect(() => () => streamRef.current?.abort(), []);
 
   const handleSendMessage = async () => {
     if (input.trim() === '') return;
@@ -26,31 +30,66 @@ export default function AIChatPage() {
     setInput('');
     setIsLoading(true);
 
+    streamRef.current?.abort();
+    const controller = new AbortController();
+    streamRef.current = controller;
+
     try {
       const apiBase = process.env.NEXT_PUBLIC_API_BASE || ''
-      const response = await fetch(`${apiBase}/api/ml/suggest`, {
+      const response = await fetch(`${apiBase}/api/ml/suggest/stream`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
         body: JSON.stringify({ prompt: input.trim() }),
+        signal: controller.signal,
       });
 
-      if (response.ok) {
-        const data = await response.json();
-        const aiMessage: Message = { sender: 'ai', text: data.suggestion || 'No suggestion found.' };
-        setMessages((prevMessages) => [...prevMessages, aiMessage]);
+      if (response.ok && response.body) {
+        // Relay tokens into one AI message as they arrive
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let text = '';
+        let started = false;
+        while (true) {
+          const { done, value } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          const events = buffer.split('\n\n');
+          buffer = events.pop() || '';
+          for (const event of events) {
+            const data = event.split('\n').find((line) => line.startsWith('data: '));
+            if (!event.startsWith('event: token') || !data) continue;
+            text += JSON.parse(data.slice(6)).text;
+            if (!started) {
+              started = true;
+              setMessages((prevMessages) => [...prevMessages, { sender: 'ai', text }]);
+            } else {
+              const current = text;
+              setMessages((prevMessages) => [...prevMessages.slice(0, -1), { sender: 'ai', text: current }]);
+            }
+          }
+        }
+        if (!started) {
+          setMessages((prevMessages) => [...prevMessages, { sender: 'ai', text: 'No suggestion found.' }]);
+        }
       } else {
         console.error('Failed to get AI suggestion:', response.statusText);
         const errorMessage: Message = { sender: 'ai', text: 'Error: Could not get a suggestion. Please try again.' };
         setMessages((prevMessages) => [...prevMessages, errorMessage]);
       }
     } catch (error) {
+      // Aborted on unmount; there is nothing left to update
+      if (controller.signal.aborted) return;
       console.error('Error sending message to AI:', error);
       const errorMessage: Message = { sender: 'ai', text: 'Error: Something went wrong. Please check your network.' };
       setMessages((prevMessages) => [...prevMessages, errorMessage]);
     } finally {
-      setIsLoading(false);
+      if (streamRef.current === controller) {
+        streamRef.current = null;
+        setIsLoading(false);
+      }
     }
   };
 
@@ -78,7 +117,7 @@ export default function AIChatPage() {
                 </span>
               </div>
             ))}
-            {isLoading && (
+            {isLoading && messages[messages.length - 1].sender === 'user' && (
               <div className="text-left mb-2">
                 <span className="inline-block p-2 rounded-lg bg-gray-200 text-gray-800 animate-pulse">
                   Typing...